@@ -0,0 +1,122 @@
+"""Render time of the related entity display snippet.
+
+The benchmark renders the list of related datasets the way the display snippet
+did before (searching all candidate datasets and matching them against the
+selected IDs) and the way it does now (fetching only selected datasets).
+
+Missing candidate datasets are created on the first run, so it may take a
+while. Use a dedicated portal, because the datasets are not removed afterwards:
+
+    python benchmarks/display_snippet.py -c /etc/ckan/default/ckan.ini
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any
+
+import ckan.plugins.toolkit as tk
+from ckan.cli import load_config
+from ckan.config.middleware import make_app
+
+PREFIX = "relationship-benchmark"
+
+SEARCH_ALL = """
+{% set selected = [] %}
+{% for entity in h.relationship_get_entity_list(field.related_entity, field.related_entity_type, field.related_entity_query) %}
+  {% for selected_id in selected_ids %}
+    {% if entity['id'] == selected_id %}
+      {% do selected.append((entity.get('name'), entity.get('title') or entity.get('name'))) %}
+    {% endif %}
+  {% endfor %}
+{% endfor %}
+{% set selected = selected|sort(case_sensitive=false, attribute=1) %}
+{% for name, title in selected %}
+  <a href="{{ h.url_for(field.related_entity_type + ".read", id=name, _external=True) }}">{{ title }}</a>
+{% endfor %}
+"""  # noqa: E501
+
+SELECTED_ONLY = """
+{% for entity in h.relationship_get_selected_entities(field.related_entity, field.related_entity_type, selected_ids) %}
+  <a href="{{ h.url_for(field.related_entity_type + ".read", id=entity.name, _external=True) }}">{{ entity.title }}</a>
+{% endfor %}
+"""  # noqa: E501
+
+
+def create_candidates(pkg_type: str, total: int) -> list[str]:
+    site_user = tk.get_action("get_site_user")({"ignore_auth": True}, {})
+    context: Any = {"user": site_user["name"], "ignore_auth": True}
+
+    try:
+        org = tk.get_action("organization_show")(context.copy(), {"id": PREFIX})
+    except tk.ObjectNotFound:
+        org = tk.get_action("organization_create")(context.copy(), {"name": PREFIX})
+
+    existing = tk.get_action("package_search")(
+        context.copy(),
+        {
+            "fq": f"+type:{pkg_type} +organization:{PREFIX}",
+            "fl": "id",
+            "rows": total,
+            "include_private": True,
+        },
+    )["results"]
+    ids = [pkg["id"] for pkg in existing]
+
+    for idx in range(len(ids), total):
+        if not idx % 500:
+            print(f"creating candidate datasets: {idx}/{total}")
+        pkg = tk.get_action("package_create")(
+            context.copy(),
+            {
+                "name": f"{PREFIX}-{idx}",
+                "title": f"Benchmark dataset {idx}",
+                "type": pkg_type,
+                "owner_org": org["id"],
+            },
+        )
+        ids.append(pkg["id"])
+
+    return ids
+
+
+def render(app: Any, source: str, repeat: int, **kwargs: Any) -> float:
+    template = app.jinja_env.from_string(source)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        template.render(h=tk.h, **kwargs)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--config", required=True, help="CKAN config file")
+    parser.add_argument("--type", default="dataset", help="Type of datasets")
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--selected", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    flask_app = make_app(load_config(args.config))._wsgi_app  # pyright: ignore
+
+    with flask_app.test_request_context():
+        ids = create_candidates(args.type, args.candidates)
+        field = {
+            "related_entity": "package",
+            "related_entity_type": args.type,
+            "related_entity_query": None,
+        }
+        params = {"field": field, "selected_ids": ids[: args.selected]}
+
+        search_all = render(flask_app, SEARCH_ALL, args.repeat, **params)
+        selected_only = render(flask_app, SELECTED_ONLY, args.repeat, **params)
+
+    print(f"candidates:    {len(ids)}")
+    print(f"selected:      {len(params['selected_ids'])}")
+    print(f"search all:    {search_all * 1000:.1f}ms per render")
+    print(f"selected only: {selected_only * 1000:.1f}ms per render")
+
+
+if __name__ == "__main__":
+    main()
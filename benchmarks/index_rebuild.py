@@ -0,0 +1,94 @@
+"""Time spent on relations by `before_dataset_index` during index rebuild.
+
+The benchmark runs the `before_dataset_index` hook of the plugin for datasets
+of the portal twice: querying relations field by field for every dataset, and
+reading them from relations prefetched for every batch of datasets with a
+single query. Solr is not involved, so the difference between two numbers is
+the time saved on relations by `ckan relationship rebuild-index`.
+
+Usage:
+
+    python benchmarks/index_rebuild.py -c /etc/ckan/default/ckan.ini --limit 5000
+
+Only datasets of types that have relation fields are used.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any
+
+from ckan import model
+from ckan.cli import load_config
+from ckan.config.middleware import make_app
+
+from ckanext.relationship import indexing, utils
+from ckanext.relationship.plugin import RelationshipPlugin
+
+
+def package_dicts(limit: int) -> list[dict[str, Any]]:
+    packages: list[dict[str, Any]] = []
+    types = [
+        pkg_type
+        for (pkg_type,) in model.Session.query(model.Package.type).distinct()
+        if utils.get_relations_info(pkg_type)
+    ]
+
+    q = (
+        model.Session.query(model.Package.id, model.Package.type)
+        .filter(model.Package.type.in_(types))
+        .limit(limit)
+    )
+    for pkg_id, pkg_type in q:
+        packages.append({"id": pkg_id, "type": pkg_type})
+    return packages
+
+
+def per_dataset(plugin: RelationshipPlugin, packages: list[dict[str, Any]]) -> float:
+    start = time.perf_counter()
+    for pkg_dict in packages:
+        plugin.before_dataset_index(dict(pkg_dict))
+    return time.perf_counter() - start
+
+
+def prefetched(
+    plugin: RelationshipPlugin,
+    packages: list[dict[str, Any]],
+    batch_size: int,
+) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(packages), batch_size):
+        batch = packages[offset : offset + batch_size]
+        with indexing.prefetch_relations(pkg["id"] for pkg in batch):
+            for pkg_dict in batch:
+                plugin.before_dataset_index(dict(pkg_dict))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--config", required=True, help="CKAN config file")
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app(load_config(args.config))
+    plugin = RelationshipPlugin()
+
+    with app._wsgi_app.test_request_context():  # pyright: ignore
+        packages = package_dicts(args.limit)
+        if not packages:
+            parser.error("there are no datasets with relation fields")
+
+        slow = per_dataset(plugin, packages)
+        fast = prefetched(plugin, packages, args.batch_size)
+
+    print(f"datasets:            {len(packages)}")
+    print(f"per dataset queries: {slow:.3f}s")
+    print(f"prefetched batches:  {fast:.3f}s")
+    print(f"speedup:             {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
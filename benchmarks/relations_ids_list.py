@@ -0,0 +1,111 @@
+"""Latency of `relationship_relations_ids_list` compared to the full relation list.
+
+The benchmark inserts synthetic relations of a single subject into the
+`relationship_relationship` table and times two ways of getting IDs of the
+related objects: building the full relation list with
+`relationship_relations_list` and collecting `object_id` of every relation, and
+calling `relationship_relations_ids_list`, which selects distinct object IDs.
+
+All relations are inserted within a transaction that is rolled back at the end,
+so the portal is left intact. The relation cache is disabled while the
+benchmark runs.
+
+Usage:
+
+    python benchmarks/relations_ids_list.py -c /etc/ckan/default/ckan.ini
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Any, Callable
+
+import sqlalchemy as sa
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.cli import load_config
+from ckan.config.middleware import make_app
+
+from ckanext.relationship import config
+
+SUBJECT = "relationship-benchmark-subject"
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def populate(size: int):
+    model.Session.execute(
+        sa.text(
+            """
+            DELETE FROM relationship_relationship WHERE subject_id = :subject;
+            INSERT INTO relationship_relationship
+                (id, subject_id, object_id, relation_type, created_at, extras)
+            SELECT
+                md5(:subject || n),
+                :subject,
+                md5('object' || n),
+                'related_to',
+                now(),
+                '{"source": "benchmark"}'
+            FROM generate_series(1, :size) AS n
+            """
+        ),
+        {"subject": SUBJECT, "size": size},
+    )
+
+
+def timed(func: Callable[[], Any], repeat: int) -> float:
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def full_list() -> set[str]:
+    relations = tk.get_action("relationship_relations_list")(
+        {"ignore_auth": True},
+        {"subject_id": SUBJECT, "relation_type": "related_to"},
+    )
+    return {rel["object_id"] for rel in relations}
+
+
+def ids_list() -> list[str]:
+    return tk.get_action("relationship_relations_ids_list")(
+        {"ignore_auth": True},
+        {"subject_id": SUBJECT, "relation_type": "related_to"},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--config", required=True, help="CKAN config file")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    flask_app = make_app(load_config(args.config))._wsgi_app  # pyright: ignore
+    tk.config[config.CONFIG_CACHE_BACKEND] = ""
+
+    print(f"{'relations':>10} {'full list':>12} {'ids list':>12} {'speedup':>8}")
+    with flask_app.test_request_context():
+        try:
+            for size in args.sizes:
+                populate(size)
+                assert full_list() == set(ids_list())
+
+                full = timed(full_list, args.repeat)
+                ids = timed(ids_list, args.repeat)
+                print(
+                    f"{size:>10} {full * 1000:>10.1f}ms {ids * 1000:>10.1f}ms"
+                    f" {full / ids:>7.1f}x"
+                )
+        finally:
+            model.Session.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Memory footprint and lookup latency of the in-memory snapshot of relations.
+
+The benchmark builds the snapshot from synthetic relations, without touching
+the database, and reports memory allocated by it, measured with tracemalloc,
+together with the median time of the lookups served by the snapshot. For
+comparison, memory of the same relations kept as dictionaries, the way they
+are returned by `Relationship.as_dict`, is measured on a sample and scaled.
+
+Usage:
+
+    python benchmarks/snapshot_memory.py --relations 2000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator
+
+from ckanext.relationship.snapshot import RELATION_TYPES, Snapshot
+
+SAMPLE_SIZE = 100_000
+
+
+def relations(count: int, fanout: int) -> Iterator[SimpleNamespace]:
+    """Yield relations grouped by subject, `fanout` relations per subject."""
+    # naive, like values of the created_at column
+    created_at = datetime(2024, 1, 1)  # noqa: DTZ001
+    nodes = max(count // fanout, 1)
+    for n in range(count):
+        yield SimpleNamespace(
+            id=str(uuid.uuid4()),
+            subject_id=f"subject-{n // fanout}",
+            object_id=f"subject-{random.randrange(nodes)}",
+            relation_type=RELATION_TYPES[n % len(RELATION_TYPES)],
+            created_at=created_at + timedelta(seconds=n),
+            extras={"source": "benchmark"} if n % 100 == 0 else {},
+        )
+
+
+def measure(build: Callable[[], Any]) -> tuple[Any, int]:
+    tracemalloc.start()
+    result = build()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def build_snapshot(count: int, fanout: int) -> Snapshot:
+    snapshot = Snapshot()
+    snapshot.extend(relations(count, fanout))
+    for n in range(max(count // fanout, 1)):
+        snapshot.add_entity("package", f"subject-{n}", f"subject-{n}", "dataset")
+    return snapshot
+
+
+def build_dicts(count: int, fanout: int) -> dict[str, list[dict[str, Any]]]:
+    result: dict[str, list[dict[str, Any]]] = {}
+    for rel in relations(count, fanout):
+        result.setdefault(rel.subject_id, []).append(
+            {
+                "id": rel.id,
+                "subject_id": rel.subject_id,
+                "object_id": rel.object_id,
+                "relation_type": rel.relation_type,
+                "created_at": rel.created_at.isoformat(),
+                "extras": rel.extras,
+            },
+        )
+    return result
+
+
+def timed(func: Callable[[], Any], repeat: int) -> float:
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--relations", type=int, default=2_000_000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    snapshot, size = measure(lambda: build_snapshot(args.relations, args.fanout))
+    sample = min(args.relations, SAMPLE_SIZE)
+    _dicts, dicts_size = measure(lambda: build_dicts(sample, args.fanout))
+    dicts_size = dicts_size * args.relations // sample
+
+    print(f"relations: {args.relations}, entities: {len(snapshot.names)}")
+    print(
+        f"snapshot: {size / 2**20:>10.1f}MiB"
+        f" {size / args.relations:>8.1f} bytes per relation"
+    )
+    print(
+        f"dicts:    {dicts_size / 2**20:>10.1f}MiB"
+        f" {dicts_size / args.relations:>8.1f} bytes per relation (estimated)"
+    )
+
+    subject = "subject-0"
+    for name, func in [
+        ("relations_list", lambda: snapshot.relations(subject)),
+        ("ids_list", lambda: snapshot.object_ids(subject)),
+        ("count", lambda: snapshot.counts(subject)),
+        ("traverse", lambda: snapshot.traverse(subject, ["child_of"], 3)),
+    ]:
+        print(f"{name:>15} {timed(func, args.repeat) * 1000:>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+/* A select module for the related entity field that loads choices page by
+ * page from the relationship_related_entity_choices action.
+ *
+ * source          - A url of the action.
+ * entity          - Related entity: package, organization or group.
+ * entityType      - Type of related entity.
+ * currentEntityId - ID of the edited entity, excluded from choices.
+ * updatableOnly   - Offer only entities that can be updated by the user.
+ * ownedOnly       - Offer only datasets created by the user.
+ * multiple        - Allow selection of multiple entities.
+ * required        - Do not allow to clear the selection.
+ * selected        - List of selected entities with id and title.
+ * limit           - Number of choices per page (default: 20).
+ * interval        - The interval between requests in milliseconds (default: 300).
+ *
+ * Examples
+ *
+ *   // <input type="hidden" name="related" data-module="relationship-choices"
+ *   //        data-module-source="/api/action/relationship_related_entity_choices" />
+ *
+ */
+this.ckan.module('relationship-choices', function (jQuery) {
+    return {
+        options: {
+            source: null,
+            entity: 'package',
+            entityType: 'dataset',
+            currentEntityId: null,
+            updatableOnly: false,
+            ownedOnly: false,
+            multiple: false,
+            required: false,
+            selected: [],
+            limit: 20,
+            interval: 300
+        },
+
+        initialize: function () {
+            jQuery.proxyAll(this, /_on/);
+
+            // cursors of pages, loaded for the current search term
+            this._cursors = {};
+
+            this.el.select2({
+                multiple: this.options.multiple,
+                allowClear: !this.options.required,
+                placeholder: ' ',
+                query: this._onQuery,
+                initSelection: this._onInitSelection
+            });
+        },
+
+        /* Builds selected choices from the data rendered by the server, so
+         * that no request is made until the dropdown is opened.
+         */
+        _onInitSelection: function (element, callback) {
+            var selected = jQuery.map(this.options.selected || [], function (item) {
+                return {id: item.id, text: item.title};
+            });
+
+            callback(this.options.multiple ? selected : selected[0] || null);
+        },
+
+        /* Callback triggered when select2 needs a page of choices. The first
+         * page of a term is debounced, next pages are loaded immediately
+         * when the dropdown is scrolled to the bottom.
+         */
+        _onQuery: function (query) {
+            var module = this;
+
+            clearTimeout(this._debounced);
+            if (query.page > 1) {
+                this._load(query);
+                return;
+            }
+
+            this._debounced = setTimeout(function () {
+                module._load(query);
+            }, this.options.interval);
+        },
+
+        _load: function (query) {
+            if (query.page === 1) {
+                this._cursors = {};
+            }
+
+            var params = {
+                entity: this.options.entity,
+                entity_type: this.options.entityType,
+                q: query.term,
+                limit: this.options.limit,
+                updatable_only: this.options.updatableOnly,
+                owned_only: this.options.ownedOnly
+            };
+
+            if (this.options.currentEntityId) {
+                params.current_entity_id = this.options.currentEntityId;
+            }
+
+            if (query.page > 1) {
+                params.after = this._cursors[query.page];
+            }
+
+            if (this._last && typeof this._last.abort == 'function') {
+                this._last.abort();
+            }
+
+            var cursors = this._cursors;
+            this._last = jQuery.getJSON(this.options.source, params).done(function (data) {
+                var page = data.result;
+                cursors[query.page + 1] = page.next;
+
+                query.callback({
+                    more: !!page.next,
+                    results: jQuery.map(page.results, function (item) {
+                        return {id: item.id, text: item.title};
+                    })
+                });
+            });
+        }
+    };
+});
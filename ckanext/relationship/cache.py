@@ -0,0 +1,234 @@
+"""Optional read-through cache of relations keyed by subject.
+
+Every entry belongs to a subject (an entity ID or name, exactly as it was passed
+to the lookup) and a variant, that describes the lookup parameters. Changing
+relations of an entity invalidates all variants of the entity at once.
+
+The cache is disabled unless `ckanext.relationship.cache.backend` is set.
+"""
+
+from __future__ import annotations
+
+import abc
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+import ckan.plugins.toolkit as tk
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.relationship import config
+
+
+class Backend(abc.ABC):
+    """Storage of cached values.
+
+    Values are stored as JSON, so callers always get a fresh copy.
+    """
+
+    @abc.abstractmethod
+    def get_many(self, subjects: list[str], variant: str) -> dict[str, str]:
+        """Return cached values of subjects. Missing subjects are skipped."""
+
+    @abc.abstractmethod
+    def set_many(self, values: dict[str, str], variant: str):
+        """Store values of subjects."""
+
+    @abc.abstractmethod
+    def invalidate(self, subjects: Iterable[str]):
+        """Drop all variants of subjects."""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Drop everything."""
+
+
+class MemoryBackend(Backend):
+    """Per-process LRU cache with TTL.
+
+    At most `max_size` subjects are kept; the least recently used one is
+    evicted first. Invalidation reaches only the current process, so other
+    processes may return stale values until they expire.
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, dict[str, tuple[float, str]]] = OrderedDict()
+
+    def get_many(self, subjects: list[str], variant: str) -> dict[str, str]:
+        now = time.monotonic()
+        result: dict[str, str] = {}
+
+        with self._lock:
+            for subject in subjects:
+                variants = self._data.get(subject)
+                if not variants or variant not in variants:
+                    continue
+
+                expires_at, value = variants[variant]
+                if expires_at <= now:
+                    del variants[variant]
+                    continue
+
+                self._data.move_to_end(subject)
+                result[subject] = value
+
+        return result
+
+    def set_many(self, values: dict[str, str], variant: str):
+        expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            for subject, value in values.items():
+                self._data.setdefault(subject, {})[variant] = (expires_at, value)
+                self._data.move_to_end(subject)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, subjects: Iterable[str]):
+        with self._lock:
+            for subject in subjects:
+                self._data.pop(subject, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend(Backend):
+    """Cache shared by all processes of the portal.
+
+    Every subject is stored as a hash with variants as fields, so invalidation
+    is a single DEL.
+    """
+
+    def __init__(self, ttl: int, conn: Any = None, namespace: str = "relationship"):
+        self.ttl = ttl
+        self.conn = conn or connect_to_redis()
+        self.prefix = "ckanext:{}:{}:".format(namespace, tk.config.get("ckan.site_id"))
+
+    def get_many(self, subjects: list[str], variant: str) -> dict[str, str]:
+        pipe = self.conn.pipeline()
+        for subject in subjects:
+            pipe.hget(self.prefix + subject, variant)
+
+        return {
+            subject: value.decode() if isinstance(value, bytes) else value
+            for subject, value in zip(subjects, pipe.execute())
+            if value is not None
+        }
+
+    def set_many(self, values: dict[str, str], variant: str):
+        pipe = self.conn.pipeline()
+        for subject, value in values.items():
+            pipe.hset(self.prefix + subject, variant, value)
+            pipe.expire(self.prefix + subject, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, subjects: Iterable[str]):
+        keys = [self.prefix + subject for subject in subjects]
+        if keys:
+            self.conn.delete(*keys)
+
+    def clear(self):
+        keys = list(self.conn.scan_iter(self.prefix + "*"))
+        if keys:
+            self.conn.delete(*keys)
+
+
+# settings -> backend, so that changed configuration gets a fresh backend
+_backends: dict[tuple[str, int, int], Backend] = {}
+
+
+def backend(ttl: int | None = None) -> Backend | None:
+    """Return the configured backend or None if the cache is disabled.
+
+    Args:
+        ttl: lifetime of values, if it differs from `ckanext.relationship.cache.ttl`.
+    """
+    settings = (
+        config.cache_backend(),
+        config.cache_ttl() if ttl is None else ttl,
+        config.cache_max_size(),
+    )
+    name, ttl, max_size = settings
+    if not name:
+        return None
+
+    if settings not in _backends:
+        _backends[settings] = (
+            RedisBackend(ttl) if name == "redis" else MemoryBackend(ttl, max_size)
+        )
+
+    return _backends[settings]
+
+
+def autocomplete_backend(ttl: int) -> Backend:
+    """Return the store of autocomplete responses.
+
+    Responses are kept apart from relations, so they never evict cached
+    relations. They are shared through Redis when it is the configured
+    backend, otherwise every process keeps them in memory, even if the cache
+    of relations is disabled.
+    """
+    name = "redis" if config.cache_backend() == "redis" else "memory"
+    settings = (f"autocomplete:{name}", ttl, config.cache_max_size())
+    if settings not in _backends:
+        _backends[settings] = (
+            RedisBackend(ttl, namespace="relationship-autocomplete")
+            if name == "redis"
+            else MemoryBackend(ttl, config.cache_max_size())
+        )
+
+    return _backends[settings]
+
+
+def variant_key(*parts: Any) -> str:
+    """Build variant name from lookup parameters."""
+    return json.dumps(parts)
+
+
+def get_or_set(
+    subjects: list[str],
+    variant: str,
+    compute: Callable[[list[str]], dict[str, Any]],
+) -> dict[str, Any]:
+    """Return values of subjects, computing and caching the missing ones.
+
+    Args:
+        subjects: subjects to look up.
+        variant: lookup parameters built with `variant_key`.
+        compute: function that receives subjects missing from the cache and
+            returns their JSON-serializable values.
+    """
+    cache = backend()
+    if cache is None:
+        return compute(subjects)
+
+    result = {
+        subject: json.loads(value)
+        for subject, value in cache.get_many(subjects, variant).items()
+    }
+
+    missing = [subject for subject in subjects if subject not in result]
+    if missing:
+        computed = compute(missing)
+        cache.set_many(
+            {subject: json.dumps(value) for subject, value in computed.items()},
+            variant,
+        )
+        result.update(computed)
+
+    return result
+
+
+def invalidate(subjects: Iterable[str]):
+    """Drop cached relations of subjects."""
+    cache = backend()
+    if cache is not None:
+        cache.invalidate(set(subjects))
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+import click
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+
+from ckanext.relationship import indexing, snapshot
+from ckanext.relationship.model import change_log, closure
+from ckanext.relationship.model.relationship import Relationship
+
+
+def get_commands():
+    return [relationship]
+
+
+@click.group(short_help="ckanext-relationship CLI commands.")
+def relationship():
+    pass
+
+
+@relationship.command("canonicalize-ids")
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of relations updated per transaction.",
+)
+def canonicalize_ids(batch_size: int):
+    """Replace entity names stored in the relationship table with entity IDs."""
+    total = 0
+    while True:
+        processed = Relationship.canonicalize(batch_size)
+        if not processed:
+            break
+
+        model.Session.commit()
+        total += processed
+        click.echo(f"Processed {total} relations")
+
+    click.secho(f"Done. {total} relations were processed", fg="green")
+
+
+@relationship.command("rebuild-index")
+@click.option(
+    "--batch-size",
+    default=500,
+    show_default=True,
+    help="Number of datasets whose relations are loaded with a single query.",
+)
+@click.option(
+    "-t",
+    "--type",
+    "package_types",
+    multiple=True,
+    help="Reindex only datasets of the given type. Can be repeated.",
+)
+def rebuild_index(batch_size: int, package_types: tuple[str, ...]):
+    """Rebuild search index of datasets, prefetching relations in batches."""
+    q = model.Session.query(model.Package.id)
+    if tk.asbool(tk.config.get("ckan.search.remove_deleted_packages")):
+        q = q.filter(model.Package.state != "deleted")
+    if package_types:
+        q = q.filter(model.Package.type.in_(package_types))
+
+    package_ids = [pkg.id for pkg in q]
+    with click.progressbar(length=len(package_ids), label="Indexing") as bar:
+        for start in range(0, len(package_ids), batch_size):
+            batch = package_ids[start : start + batch_size]
+            indexing.rebuild_entities(batch)
+            bar.update(len(batch))
+
+
+@relationship.command("rebuild-closure")
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of child entities processed per transaction.",
+)
+def rebuild_closure(batch_size: int):
+    """Recompute the closure table of child_of/parent_of relations."""
+    if not closure.enabled():
+        click.secho(
+            "Closure table is disabled. Enable ckanext.relationship.closure_table"
+            " to keep it up to date after the rebuild",
+            fg="yellow",
+        )
+
+    total = 0
+    for total in closure.rebuild(batch_size):
+        model.Session.commit()
+        click.echo(f"Processed {total} entities")
+
+    model.Session.commit()
+    click.secho(f"Done. {total} entities were processed", fg="green")
+
+
+@relationship.command("check-snapshot")
+@click.option(
+    "--wait",
+    default=0,
+    show_default=True,
+    help="Seconds to wait before refreshing the loaded snapshot.",
+)
+def check_snapshot(wait: int):
+    """Compare the in-memory snapshot of relations with the database.
+
+    With --wait, changes made by the portal meanwhile are applied from the
+    change log before the comparison, so the incremental refresh is checked.
+    """
+    if not change_log.installed():
+        tk.error_shout(
+            "Changes of relations are not logged. Run `ckan relationship"
+            " enable-change-log` first"
+        )
+        raise click.exceptions.Exit(1)
+
+    engine = snapshot.Snapshot.load()
+    model.Session.commit()
+    if wait:
+        time.sleep(wait)
+        engine.refresh()
+        model.Session.commit()
+
+    missing, unexpected = snapshot.check(engine)
+    for relation_id in missing:
+        click.echo(f"Missing from snapshot: {relation_id}")
+    for relation_id in unexpected:
+        click.echo(f"Not in database: {relation_id}")
+
+    if missing or unexpected:
+        tk.error_shout(
+            f"Snapshot differs: {len(missing)} missing, {len(unexpected)} unexpected"
+        )
+        raise click.exceptions.Exit(1)
+
+    click.secho("Done. Snapshot matches the database", fg="green")
+
+
+@relationship.command("enable-change-log")
+def enable_change_log():
+    """Log changes of relations, which is required by the snapshot."""
+    change_log.install()
+    model.Session.commit()
+    click.secho("Done. Changes of relations are logged", fg="green")
+
+
+@relationship.command("disable-change-log")
+def disable_change_log():
+    """Stop logging changes of relations and remove the log."""
+    change_log.uninstall()
+    change_log.prune(change_log.clock())
+    model.Session.commit()
+    click.secho("Done. Changes of relations are not logged", fg="green")
+
+
+@relationship.command("prune-change-log")
+@click.option(
+    "--days",
+    default=1,
+    show_default=True,
+    help="Keep changes logged within this number of days.",
+)
+def prune_change_log(days: int):
+    """Remove old entries of the change log used by the snapshot."""
+    removed = change_log.prune(change_log.clock() - timedelta(days=days))
+    model.Session.commit()
+    click.secho(f"Done. {removed} changes were removed", fg="green")
@@ -7,6 +7,38 @@ CONFIG_VIEWS_WITHOUT_RELATIONSHIPS = (
 )
 DEFAULT_VIEWS_WITHOUT_RELATIONSHIPS = ["search", "read"]
 
+CONFIG_REBUILD_MODE = "ckanext.relationship.search_rebuild_mode"
+DEFAULT_REBUILD_MODE = "batched"
+REBUILD_MODES = ("sync", "batched", "async")
+
+CONFIG_CANONICAL_IDS = "ckanext.relationship.canonical_ids"
+DEFAULT_CANONICAL_IDS = False
+
+CONFIG_CACHE_BACKEND = "ckanext.relationship.cache.backend"
+DEFAULT_CACHE_BACKEND = ""
+CACHE_BACKENDS = ("memory", "redis")
+
+CONFIG_CACHE_TTL = "ckanext.relationship.cache.ttl"
+DEFAULT_CACHE_TTL = 300
+
+CONFIG_CACHE_MAX_SIZE = "ckanext.relationship.cache.max_size"
+DEFAULT_CACHE_MAX_SIZE = 10000
+
+CONFIG_CLOSURE_TABLE = "ckanext.relationship.closure_table"
+DEFAULT_CLOSURE_TABLE = False
+
+CONFIG_INDEX_HIERARCHY_DEPTH = "ckanext.relationship.index_hierarchy_depth"
+DEFAULT_INDEX_HIERARCHY_DEPTH = 0
+
+CONFIG_SNAPSHOT = "ckanext.relationship.snapshot.enabled"
+DEFAULT_SNAPSHOT = False
+
+CONFIG_SNAPSHOT_REFRESH_INTERVAL = "ckanext.relationship.snapshot.refresh_interval"
+DEFAULT_SNAPSHOT_REFRESH_INTERVAL = 60
+
+CONFIG_AUTOCOMPLETE_CACHE_TTL = "ckanext.relationship.autocomplete.cache_ttl"
+DEFAULT_AUTOCOMPLETE_CACHE_TTL = 30
+
 
 def views_without_relationships_in_package_show() -> list[str]:
     return tk.aslist(
@@ -15,3 +47,57 @@ def views_without_relationships_in_package_show() -> list[str]:
             DEFAULT_VIEWS_WITHOUT_RELATIONSHIPS,
         ),
     )
+
+
+def canonical_ids() -> bool:
+    return tk.asbool(tk.config.get(CONFIG_CANONICAL_IDS, DEFAULT_CANONICAL_IDS))
+
+
+def closure_table() -> bool:
+    return tk.asbool(tk.config.get(CONFIG_CLOSURE_TABLE, DEFAULT_CLOSURE_TABLE))
+
+
+def snapshot() -> bool:
+    return tk.asbool(tk.config.get(CONFIG_SNAPSHOT, DEFAULT_SNAPSHOT))
+
+
+def snapshot_refresh_interval() -> int:
+    return tk.asint(
+        tk.config.get(
+            CONFIG_SNAPSHOT_REFRESH_INTERVAL,
+            DEFAULT_SNAPSHOT_REFRESH_INTERVAL,
+        ),
+    )
+
+
+def index_hierarchy_depth() -> int:
+    return max(
+        tk.asint(
+            tk.config.get(CONFIG_INDEX_HIERARCHY_DEPTH, DEFAULT_INDEX_HIERARCHY_DEPTH)
+        ),
+        0,
+    )
+
+
+def search_rebuild_mode() -> str:
+    mode = tk.config.get(CONFIG_REBUILD_MODE, DEFAULT_REBUILD_MODE)
+    return mode if mode in REBUILD_MODES else DEFAULT_REBUILD_MODE
+
+
+def cache_backend() -> str:
+    backend = tk.config.get(CONFIG_CACHE_BACKEND, DEFAULT_CACHE_BACKEND)
+    return backend if backend in CACHE_BACKENDS else DEFAULT_CACHE_BACKEND
+
+
+def cache_ttl() -> int:
+    return tk.asint(tk.config.get(CONFIG_CACHE_TTL, DEFAULT_CACHE_TTL))
+
+
+def cache_max_size() -> int:
+    return tk.asint(tk.config.get(CONFIG_CACHE_MAX_SIZE, DEFAULT_CACHE_MAX_SIZE))
+
+
+def autocomplete_cache_ttl() -> int:
+    return tk.asint(
+        tk.config.get(CONFIG_AUTOCOMPLETE_CACHE_TTL, DEFAULT_AUTOCOMPLETE_CACHE_TTL)
+    )
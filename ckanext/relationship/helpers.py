@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import json
-from typing import Any
+from typing import Any, cast
+
+import sqlalchemy as sa
 
 import ckan.plugins.toolkit as tk
-from ckan import authz
+from ckan import authz, model
 from ckan.lib.search.query import solr_literal
 
+from ckanext.relationship import utils
+from ckanext.relationship.model.relationship import Relationship
+
 
 def get_helpers():
     helper_functions = [
         relationship_get_entity_list,
+        relationship_get_selected_entities,
         relationship_get_current_relations_list,
+        relationship_relations_count,
+        relationship_relation_exists,
         relationship_get_selected_json,
         relationship_get_choices_for_related_entity_field,
         relationship_format_autocomplete,
@@ -58,76 +66,204 @@ def relationship_get_entity_list(
     return entity_list
 
 
+def relationship_get_selected_entities(
+    entity: str,
+    entity_type: str,
+    selected_ids: list[str] | str | None,
+) -> list[dict[str, str]]:
+    """Return id, name and title of selected entities (entity, entity_type)
+    sorted by title. Title falls back to the name of entity.
+
+    Only selected entities are fetched, using a single search for packages
+    and a single query for organizations and groups.
+    """
+    selected_ids = _unique_ids(selected_ids)
+    if not selected_ids:
+        return []
+
+    if entity == "package":
+        entity_list = _search_packages(selected_ids, entity_type)
+    else:
+        entity_list = [
+            {"id": id, "name": name, "title": title}
+            for id, name, title in tk.get_action("relationship_get_entity_list")(
+                {},
+                {"entity": entity, "entity_type": entity_type, "ids": selected_ids},
+            )
+        ]
+
+    selected = [
+        {
+            "id": item["id"],
+            "name": item["name"],
+            "title": item.get("title") or item["name"],
+        }
+        for item in entity_list
+    ]
+    selected.sort(key=lambda item: item["title"].lower())
+    return selected
+
+
 def relationship_get_current_relations_list(
     data: dict[str, Any], field: dict[str, Any]
 ) -> list[str]:
-    """Pull existing relations for form_snippet and display_snippet."""
-    subject_id = field.get("id")
-    subject_name = field.get("name")
-    if not subject_id and not subject_name:
+    """Pull existing relations for form_snippet and display_snippet.
+
+    Relations added to the entity by package_show are used as is. Otherwise
+    relations of all relation fields of the entity are fetched with a single
+    query and memoized until the end of the current transaction.
+    """
+    subject_id = field.get("id") or field.get("name")
+    if not subject_id:
         return []
-    related_entity = data["related_entity"]
-    related_entity_type = data["related_entity_type"]
-    relation_type = data["relation_type"]
 
-    current_relation_by_id: list[str] = []
-    current_relation_by_name: list[str] = []
+    value = field.get(data["field_name"])
+    if isinstance(value, list):
+        return cast("list[str]", value)
 
-    if subject_id:
-        current_relation_by_id = tk.get_action("relationship_relations_ids_list")(
+    key = _relation_key(
+        (data["related_entity"], data["related_entity_type"], data["relation_type"]),
+    )
+    memo: dict[tuple[str, utils.RelationKey], list[str]] = (
+        model.Session.info.setdefault(
+            _CURRENT_RELATIONS,
             {},
-            {
-                "subject_id": subject_id,
-                "object_entity": related_entity,
-                "object_type": related_entity_type,
-                "relation_type": relation_type,
-            },
         )
-    if subject_name:
-        current_relation_by_name = tk.get_action("relationship_relations_ids_list")(
+    )
+
+    if (subject_id, key) not in memo:
+        tk.check_access(
+            "relationship_relations_ids_list",
             {},
-            {
-                "subject_id": subject_name,
-                "object_entity": related_entity,
-                "object_type": related_entity_type,
-                "relation_type": relation_type,
-            },
+            {"subject_id": subject_id},
         )
-    return current_relation_by_id + current_relation_by_name
+
+        keys = {key}
+        if field.get("type"):
+            keys.update(map(_relation_key, utils.get_relation_fields(field["type"])))
+
+        relations = Relationship.by_subject_ids([subject_id], keys)[subject_id]
+        for relation_key in keys:
+            memo[(subject_id, relation_key)] = relations.get(relation_key, [])
+
+    return list(memo[(subject_id, key)])
+
+
+_CURRENT_RELATIONS = "relationship_current_relations"
 
 
-def relationship_get_selected_json(selected_ids: list[str] | None = None) -> str:
+def _relation_key(key: utils.RelationKey) -> utils.RelationKey:
+    """Use the table of organizations, `group`, as the related entity."""
+    related_entity, related_entity_type, relation_type = key
+    if related_entity == "organization":
+        related_entity = "group"
+    return related_entity, related_entity_type, relation_type
+
+
+@sa.event.listens_for(model.Session, "after_commit")
+@sa.event.listens_for(model.Session, "after_rollback")
+def _forget_current_relations(session: Any):
+    session.info.pop(_CURRENT_RELATIONS, None)
+
+
+def relationship_relations_count(
+    subject_id: str,
+    object_entity: str | None = None,
+    object_type: str | None = None,
+    relation_type: str | None = None,
+) -> int:
+    """Return number of relations of the entity (subject_id)."""
+    return tk.get_action("relationship_relations_count")(
+        {},
+        _relation_filters(
+            subject_id=subject_id,
+            object_entity=object_entity,
+            object_type=object_type,
+            relation_type=relation_type,
+        ),
+    )["count"]
+
+
+def relationship_relation_exists(
+    subject_id: str,
+    relation_type: str | None = None,
+    object_id: str | None = None,
+    object_entity: str | None = None,
+    object_type: str | None = None,
+) -> bool:
+    """Check whether the entity (subject_id) has any matching relation."""
+    return tk.get_action("relationship_relation_exists")(
+        {},
+        _relation_filters(
+            subject_id=subject_id,
+            relation_type=relation_type,
+            object_id=object_id,
+            object_entity=object_entity,
+            object_type=object_type,
+        ),
+    )
+
+
+def _relation_filters(**filters: str | None) -> dict[str, str]:
+    """Drop filters that were not provided."""
+    return {key: value for key, value in filters.items() if value}
+
+
+def relationship_get_selected_json(
+    selected_ids: list[str] | str | None = None,
+) -> str:
+    """Return selected datasets for the autocomplete widget as JSON.
+
+    Datasets are fetched with a single search and listed in the order of
+    selection. Every item keeps the selected value (ID or name) as `name`, so
+    that it matches the value of the input.
+    """
+    selected_ids = _unique_ids(selected_ids)
     if not selected_ids:
         return json.dumps([])
 
-    selected_pkgs = []
-    search = tk.get_action("package_search")
-    rows = 100
-    start = 0
-    fq = "id:({})".format(" OR ".join(map(solr_literal, selected_ids)))
-    while True:
-        result = search(
-            {},
+    packages: dict[str, dict[str, Any]] = {}
+    for pkg in _search_packages(selected_ids):
+        packages[pkg["id"]] = packages[pkg["name"]] = pkg
+
+    return json.dumps(
+        [
             {
-                "include_private": True,
-                "fq": fq,
-                "rows": rows,
-                "start": start,
-                "fl": "id,name,title",
-            },
-        )
-        selected_pkgs.extend(
-            [
-                {"name": pkg_dict["id"], "title": pkg_dict["title"]}
-                for pkg_dict in result["results"]
-            ]
-        )
+                "name": value,
+                "title": packages[value].get("title") or packages[value]["name"],
+            }
+            for value in selected_ids
+            if value in packages
+        ]
+    )
+
 
-        if not result["results"]:
-            break
-        start += rows
+def _unique_ids(selected_ids: list[str] | str | None) -> list[str]:
+    """Split comma-separated selection and drop empty and repeated values."""
+    if isinstance(selected_ids, str):
+        selected_ids = selected_ids.split(",")
+    return list(dict.fromkeys(filter(None, selected_ids or [])))
 
-    return json.dumps(selected_pkgs)
+
+def _search_packages(
+    ids: list[str],
+    entity_type: str | None = None,
+) -> list[dict[str, Any]]:
+    """Return id, name and title of packages with given IDs or names."""
+    values = " OR ".join(map(solr_literal, ids))
+    fq = f"+(id:({values}) OR name:({values}))"
+    if entity_type:
+        fq = f"+type:{solr_literal(entity_type)} {fq}"
+
+    return tk.get_action("package_search")(
+        {},
+        {
+            "fq": fq,
+            "fl": "id,name,title",
+            "rows": len(ids),
+            "include_private": True,
+        },
+    )["results"]
 
 
 def relationship_get_choices_for_related_entity_field(
@@ -142,14 +278,21 @@ def relationship_get_choices_for_related_entity_field(
 
     choices: list[tuple[str, str | None]] = []
 
+    updatable = (
+        utils.updatable_ids(
+            field["related_entity"],
+            tk.current_user.name,
+            [entity["id"] for entity in entities],
+        )
+        if field.get("updatable_only", False)
+        else None
+    )
+
     for entity in entities:
         if entity["id"] == current_entity_id:
             continue
 
-        if field.get("updatable_only", False) and not tk.h.check_access(
-            field["related_entity"] + "_update",
-            {"id": entity["id"]},
-        ):
+        if updatable is not None and entity["id"] not in updatable:
             continue
 
         if (
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+from typing import Any, Iterable, cast
+
+import sqlalchemy as sa
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.lib.search import index_for, rebuild
+from ckan.logic import NotFound
+from ckan.types import Context
+
+from ckanext.relationship.config import index_hierarchy_depth, search_rebuild_mode
+from ckanext.relationship.model import closure, graph
+from ckanext.relationship.model.relationship import (
+    Relationship,
+    entity_ids_by_names,
+)
+
+log = logging.getLogger(__name__)
+
+_QUEUE = "relationship_rebuild_queue"
+_COMMITTED = "relationship_rebuild_committed"
+_PREFETCHED = "relationship_prefetched_relations"
+_PREFETCHED_HIERARCHY = "relationship_prefetched_hierarchy"
+
+# relation type of a field -> index field with transitively related entities
+HIERARCHY_FIELDS = {
+    "child_of": "vocab_relationship_ancestors",
+    "parent_of": "vocab_relationship_descendants",
+}
+
+
+def rebuild_later(*entity_ids: str):
+    """Schedule search index rebuild of entities whose relations were changed.
+
+    Depending on `ckanext.relationship.search_rebuild_mode`, entities are either
+    reindexed immediately, or collected until the end of the current
+    transaction and reindexed once per transaction.
+    """
+    if search_rebuild_mode() == "sync":
+        for entity_id in entity_ids:
+            with contextlib.suppress(NotFound):
+                rebuild(entity_id)
+        return
+
+    queue: dict[str, None] = model.Session.info.setdefault(_QUEUE, {})
+    queue.update(dict.fromkeys(entity_ids))
+
+
+def hierarchy_changed(relations: Iterable[Relationship]):
+    """Schedule search index rebuild of the subtree around changed child_of and
+    parent_of relations.
+    """
+    children: list[str] = []
+    parents: list[str] = []
+    for rel in relations:
+        if rel.relation_type == "child_of":
+            children.append(rel.subject_id)
+            parents.append(rel.object_id)
+        elif rel.relation_type == "parent_of":
+            children.append(rel.object_id)
+            parents.append(rel.subject_id)
+
+    if children:
+        rebuild_hierarchy_later(children, parents)
+
+
+def rebuild_hierarchy_later(children: Iterable[str], parents: Iterable[str]):
+    """Schedule search index rebuild of the subtree around changed hierarchy
+    relations.
+
+    Ancestors of descendants of the child and descendants of ancestors of the
+    parent might change, so all of them are reindexed when transitive
+    relations are indexed, within `ckanext.relationship.index_hierarchy_depth`.
+    """
+    depth = index_hierarchy_depth()
+    if not depth:
+        return
+
+    children = list(dict.fromkeys(children))
+    parents = list(dict.fromkeys(parents))
+    affected = dict.fromkeys(children + parents)
+    for relatives in _reachable(children, "parent_of", depth).values():
+        affected.update(dict.fromkeys(relatives))
+    for relatives in _reachable(parents, "child_of", depth).values():
+        affected.update(dict.fromkeys(relatives))
+
+    rebuild_later(*affected)
+
+
+def hierarchy(package_ids: list[str]) -> dict[str, dict[str, list[str]]]:
+    """Return transitive ancestors (child_of) and descendants (parent_of) of
+    packages, using one query per direction.
+    """
+    depth = index_hierarchy_depth()
+    result: dict[str, dict[str, list[str]]] = {id: {} for id in package_ids}
+    if not depth:
+        return result
+
+    for relation_type in HIERARCHY_FIELDS:
+        for package_id, relatives in _reachable(
+            package_ids, relation_type, depth
+        ).items():
+            result[package_id][relation_type] = relatives
+
+    return result
+
+
+def _reachable(
+    entity_ids: list[str],
+    relation_type: str,
+    max_depth: int,
+) -> dict[str, list[str]]:
+    # the closure is refreshed only before commit
+    if closure.enabled() and not closure.pending():
+        return closure.reachable(entity_ids, relation_type, max_depth)
+    return graph.reachable(entity_ids, relation_type, max_depth)
+
+
+def rebuild_entities(entity_ids: Iterable[str]):
+    """Reindex packages and commit the search index once.
+
+    Relations of all packages are loaded with a single query. Entities that are
+    not packages are skipped.
+    """
+    entity_ids = list(entity_ids)
+    package_index = index_for(model.Package)
+
+    with prefetch_relations(entity_ids):
+        indexed = _index_packages(package_index, entity_ids)
+
+    if indexed:
+        package_index.commit()
+        log.debug("Reindexed %s related datasets", indexed)
+
+
+def _index_packages(package_index: Any, entity_ids: list[str]) -> int:
+    indexed = 0
+    for entity_id in entity_ids:
+        context = cast(
+            Context,
+            {
+                "model": model,
+                "ignore_auth": True,
+                "validate": False,
+                "use_cache": False,
+            },
+        )
+        try:
+            pkg_dict = tk.get_action("package_show")(context, {"id": entity_id})
+        except NotFound:
+            continue
+
+        package_index.update_dict(pkg_dict, defer_commit=True)
+        indexed += 1
+
+    return indexed
+
+
+@contextlib.contextmanager
+def prefetch_relations(package_ids: Iterable[str]):
+    """Load relations of packages that are about to be indexed.
+
+    Relations of all packages are fetched with a single query. While the context
+    manager is active, `package_show` and `before_dataset_index` read relations
+    of these packages from the prefetched map instead of querying them. The
+    same applies to transitive hierarchy relations, if they are indexed.
+    Packages may be given by names, but the map is keyed by their IDs as well.
+    """
+    package_ids = list(package_ids)
+    ids = entity_ids_by_names(package_ids)
+    _prefetch(_PREFETCHED, Relationship.by_subject_ids(package_ids), ids)
+    if index_hierarchy_depth():
+        _prefetch(_PREFETCHED_HIERARCHY, hierarchy(package_ids), ids)
+    try:
+        yield
+    finally:
+        model.Session.info.pop(_PREFETCHED, None)
+        model.Session.info.pop(_PREFETCHED_HIERARCHY, None)
+
+
+def _prefetch(key: str, values: dict[str, Any], ids: dict[str, str]):
+    prefetched: dict[str, Any] = model.Session.info.setdefault(key, {})
+    prefetched.update(values)
+    prefetched.update(
+        {
+            ids[identifier]: value
+            for identifier, value in values.items()
+            if identifier in ids
+        },
+    )
+
+
+def prefetched_relations(
+    package_id: str,
+) -> dict[tuple[str, str, str], list[str]] | None:
+    """Return prefetched relations of the package grouped by (object_entity,
+    object_type, relation_type), or None if they were not prefetched.
+    """
+    return model.Session.info.get(_PREFETCHED, {}).get(package_id)
+
+
+def hierarchy_of(package_id: str) -> dict[str, list[str]]:
+    """Return transitive hierarchy relations of the package, prefetched ones
+    if available.
+    """
+    prefetched = model.Session.info.get(_PREFETCHED_HIERARCHY, {})
+    if package_id in prefetched:
+        return prefetched[package_id]
+    return hierarchy([package_id])[package_id]
+
+
+@sa.event.listens_for(model.Session, "after_commit")
+def _rebuild_committed(session: Any):
+    mode = search_rebuild_mode()
+    if mode == "sync":
+        return
+
+    entity_ids = session.info.pop(_QUEUE, None)
+    if not entity_ids:
+        return
+
+    if mode == "async":
+        tk.enqueue_job(
+            rebuild_entities,
+            [list(entity_ids)],
+            title="Rebuild search index of related entities",
+        )
+    else:
+        session.info[_COMMITTED] = list(entity_ids)
+
+
+@sa.event.listens_for(model.Session, "after_transaction_end")
+def _rebuild_batch(session: Any, transaction: Any):
+    # SQL cannot be emitted while the committed transaction is still open, so
+    # the batch is reindexed once it is closed
+    if transaction.parent is not None:
+        return
+
+    entity_ids = session.info.pop(_COMMITTED, None)
+    if entity_ids:
+        rebuild_entities(entity_ids)
+
+
+@sa.event.listens_for(model.Session, "after_soft_rollback")
+def _forget_queued(session: Any, previous_transaction: Any):
+    if previous_transaction.parent is None:
+        session.info.pop(_QUEUE, None)
@@ -1,34 +1,63 @@
 from __future__ import annotations
 
-from typing import Any
+import base64
+import json
+from datetime import datetime
+from typing import Any, Iterator
 
+import sqlalchemy as sa
 from flask import jsonify
 from flask.wrappers import Response
-import sqlalchemy as sa
 
 import ckan.plugins.toolkit as tk
 from ckan import authz, logic
+from ckan.lib.search.query import solr_literal
 from ckan.logic import validate
 from ckan.types import Action, Context
 
-from ckanext.relationship import utils
+from ckanext.relationship import indexing, snapshot, utils
 from ckanext.relationship.config import views_without_relationships_in_package_show
 from ckanext.relationship.logic import schema
-from ckanext.relationship.model.relationship import Relationship
-from ckanext.relationship.utils import entity_name_by_id
+from ckanext.relationship.model import closure, graph
+from ckanext.relationship.model.relationship import (
+    Relationship,
+    entity_identifiers,
+    invalidate_cache,
+    relations_exist,
+    relations_page,
+    sort_key,
+)
 
 NotFound = logic.NotFound
 
+CHOICES_MAX_LIMIT = 100
+RELATIONS_MAX_LIMIT = 1000
+TRAVERSE_MAX_DEPTH = graph.MAX_DEPTH
+NEIGHBOURHOOD_MAX_NODES = 1000
+NEIGHBOURHOOD_MAX_EDGES = 5000
+
 
 def get_actions():
     return {
         "relationship_relation_create": relationship_relation_create,
         "relationship_relation_delete": relationship_relation_delete,
+        "relationship_relations_create_bulk": relationship_relations_create_bulk,
+        "relationship_relations_delete_bulk": relationship_relations_delete_bulk,
         "relationship_relations_list": relationship_relations_list,
         "relationship_relations_ids_list": relationship_relations_ids_list,
+        "relationship_relations_count": relationship_relations_count,
+        "relationship_relation_exists": relationship_relation_exists,
+        "relationship_traverse": relationship_traverse,
+        "relationship_hierarchy": relationship_hierarchy,
+        "relationship_path": relationship_path,
+        "relationship_neighbourhood": relationship_neighbourhood,
         "relationship_get_entity_list": relationship_get_entity_list,
+        "relationship_related_entity_choices": relationship_related_entity_choices,
         "relationship_autocomplete": relationship_autocomplete,
         "package_show": package_show,
+        "package_update": package_update,
+        "group_update": group_update,
+        "organization_update": organization_update,
     }
 
 
@@ -41,33 +70,21 @@ def relationship_relation_create(
     """
     tk.check_access("relationship_relation_create", context, data_dict)
 
-    subject_id = data_dict["subject_id"]
-    object_id = data_dict["object_id"]
-    relation_type = data_dict["relation_type"]
-    extras = data_dict.get("extras", {})
-
-    if Relationship.by_object_id(subject_id, object_id, relation_type):
-        return []
-
-    relation = Relationship(
-        subject_id=subject_id,
-        object_id=object_id,
-        relation_type=relation_type,
-        extras=extras,
+    relations = Relationship.create_bulk(
+        [
+            {
+                "subject_id": data_dict["subject_id"],
+                "object_id": data_dict["object_id"],
+                "relation_type": data_dict["relation_type"],
+                "extras": data_dict.get("extras", {}),
+            },
+        ],
     )
-
-    reverse_relation = Relationship(
-        subject_id=object_id,
-        object_id=subject_id,
-        relation_type=Relationship.reverse_relation_type[relation_type],
-        extras=extras,
-    )
-
-    context["session"].add(relation)
-    context["session"].add(reverse_relation)
+    closure.relations_changed(relations)
+    indexing.hierarchy_changed(relations)
     context["session"].commit()
 
-    return [rel.as_dict() for rel in (relation, reverse_relation)]
+    return [rel.as_dict() for rel in relations]
 
 
 @validate(schema.relation_delete)
@@ -79,24 +96,18 @@ def relationship_relation_delete(
     """
     tk.check_access("relationship_relation_delete", context, data_dict)
 
-    subject_id = data_dict["subject_id"]
-    subject_name = entity_name_by_id(data_dict["subject_id"])
-    object_id = data_dict["object_id"]
-    object_name = entity_name_by_id(data_dict["object_id"])
+    subject_identifiers, object_identifiers = entity_identifiers(
+        data_dict["subject_id"],
+        data_dict["object_id"],
+    )
     relation_type = data_dict.get("relation_type")
 
     relation = (
         context["session"]
         .query(Relationship)
         .filter(
-            sa.or_(
-                Relationship.subject_id == subject_id,
-                Relationship.subject_id == subject_name,
-            ),
-            sa.or_(
-                Relationship.object_id == object_id,
-                Relationship.object_id == object_name,
-            ),
+            Relationship.subject_id.in_(subject_identifiers),
+            Relationship.object_id.in_(object_identifiers),
         )
     )
 
@@ -109,14 +120,8 @@ def relationship_relation_delete(
         context["session"]
         .query(Relationship)
         .filter(
-            sa.or_(
-                Relationship.subject_id == object_id,
-                Relationship.subject_id == object_name,
-            ),
-            sa.or_(
-                Relationship.object_id == subject_id,
-                Relationship.object_id == subject_name,
-            ),
+            Relationship.subject_id.in_(object_identifiers),
+            Relationship.object_id.in_(subject_identifiers),
         )
     )
 
@@ -130,17 +135,71 @@ def relationship_relation_delete(
 
     [context["session"].delete(rel) for rel in relation]
     [context["session"].delete(rel) for rel in reverse_relation]
+    invalidate_cache(data_dict["subject_id"], data_dict["object_id"])
+    closure.relations_changed(relation + reverse_relation)
+    indexing.hierarchy_changed(relation + reverse_relation)
     context["session"].commit()
     return [rel[0].as_dict() for rel in (relation, reverse_relation) if len(rel) > 0]
 
 
+@validate(schema.relations_create_bulk)
+def relationship_relations_create_bulk(
+    context: Context, data_dict: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """Create multiple relations (relations) together with their reverse
+    relations in a single transaction. Already existing relations are skipped.
+
+    Each relation is a dictionary with subject_id, object_id, relation_type and
+    optional extras.
+    """
+    tk.check_access("relationship_relations_create_bulk", context, data_dict)
+
+    relations = Relationship.create_bulk(data_dict.get("relations", []))
+    closure.relations_changed(relations)
+    indexing.hierarchy_changed(relations)
+    if not context.get("defer_commit"):
+        context["session"].commit()
+
+    return [rel.as_dict() for rel in relations]
+
+
+@validate(schema.relations_delete_bulk)
+def relationship_relations_delete_bulk(
+    context: Context, data_dict: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """Delete multiple relations (relations) together with their reverse
+    relations in a single transaction.
+
+    Each relation is a dictionary with subject_id, object_id and optional
+    relation_type.
+    """
+    tk.check_access("relationship_relations_delete_bulk", context, data_dict)
+
+    relations = Relationship.delete_bulk(data_dict.get("relations", []))
+    closure.relations_changed(relations)
+    indexing.hierarchy_changed(relations)
+    if not context.get("defer_commit"):
+        context["session"].commit()
+
+    return [rel.as_dict() for rel in relations]
+
+
 @validate(schema.relations_list)
 def relationship_relations_list(
     context: Context, data_dict: dict[str, Any]
-) -> list[dict[str, str]]:
+) -> list[dict[str, str]] | dict[str, Any]:
     """Return a list of dictionaries representing the relations of a specified entity
     (object_entity, object_type) related to the specified type of relation
     (relation_type) with an entity specified by its id (subject_id).
+
+    If `limit` is provided, a single page of relations sorted by `order_by`
+    (created_at or object_id) is returned instead. The page starts after
+    `offset` relations or after the `cursor` returned with the previous page.
+
+    Returns:
+        List of relations or, if `limit` is provided, dictionary with `count`
+        of all relations, `results` of the page and `next` cursor, which is
+        None on the last page.
     """
     tk.check_access("relationship_relations_list", context, data_dict)
 
@@ -151,6 +210,49 @@ def relationship_relations_list(
     )
     object_type = data_dict.get("object_type")
     relation_type = data_dict.get("relation_type")
+    engine = snapshot.current()
+
+    if "limit" in data_dict:
+        limit = min(data_dict["limit"], RELATIONS_MAX_LIMIT)
+        order_by = data_dict["order_by"]
+        after = (
+            _decode_relations_cursor(data_dict["cursor"], order_by)
+            if data_dict.get("cursor")
+            else None
+        )
+        # one extra relation tells whether there is a next page
+        if engine is None:
+            rows, total = relations_page(
+                Relationship.subject_select(
+                    subject_id,
+                    object_entity,
+                    object_type,
+                    relation_type,
+                ),
+                limit + 1,
+                data_dict["offset"],
+                after,
+                order_by,
+            )
+        else:
+            rows, total = snapshot.page(
+                engine.relations(subject_id, object_entity, object_type, relation_type),
+                limit + 1,
+                data_dict["offset"],
+                after,
+                order_by,
+            )
+
+        return {
+            "count": total,
+            "results": rows[:limit],
+            "next": _encode_cursor(sort_key(rows[limit - 1], order_by))
+            if len(rows) > limit
+            else None,
+        }
+
+    if engine is not None:
+        return engine.relations(subject_id, object_entity, object_type, relation_type)
 
     relations = Relationship.by_subject_id(
         subject_id,
@@ -173,16 +275,224 @@ def relationship_relations_ids_list(
     """
     tk.check_access("relationship_relations_ids_list", context, data_dict)
 
-    rel_list = relationship_relations_list(context, data_dict)
+    object_entity = data_dict.get("object_entity")
+    engine = snapshot.current()
+    return (engine.object_ids if engine else Relationship.object_ids_by_subject_id)(
+        data_dict["subject_id"],
+        "group" if object_entity == "organization" else object_entity,
+        data_dict.get("object_type"),
+        data_dict.get("relation_type"),
+    )
+
+
+@tk.side_effect_free
+@validate(schema.relations_count)
+def relationship_relations_count(
+    context: Context, data_dict: dict[str, Any]
+) -> dict[str, Any]:
+    """Return number of relations of an entity specified by its id (subject_id)
+    with entities (object_entity, object_type) related with specified type of
+    relation (relation_type).
+
+    Returns:
+        Dictionary with total `count` and `counts` grouped by object_entity,
+        object_type and relation_type. Organizations are counted as `group`
+        object_entity.
+    """
+    tk.check_access("relationship_relations_count", context, data_dict)
+
+    object_entity = data_dict.get("object_entity")
+    engine = snapshot.current()
+    counts = (engine.counts if engine else Relationship.count_by_subject_id)(
+        data_dict["subject_id"],
+        "group" if object_entity == "organization" else object_entity,
+        data_dict.get("object_type"),
+        data_dict.get("relation_type"),
+    )
+
+    return {
+        "count": sum(counts.values()),
+        "counts": [
+            {
+                "object_entity": entity,
+                "object_type": entity_type,
+                "relation_type": relation_type,
+                "count": count,
+            }
+            for (entity, entity_type, relation_type), count in sorted(counts.items())
+        ],
+    }
+
+
+@tk.side_effect_free
+@validate(schema.relation_exists)
+def relationship_relation_exists(context: Context, data_dict: dict[str, Any]) -> bool:
+    """Check whether an entity specified by its id (subject_id) has at least one
+    relation matching the filters. If `object_id` is provided, only relations
+    with this entity are considered.
+    """
+    tk.check_access("relationship_relation_exists", context, data_dict)
 
-    return list({rel["object_id"] for rel in rel_list})
+    object_entity = data_dict.get("object_entity")
+    return relations_exist(
+        Relationship.subject_select(
+            data_dict["subject_id"],
+            "group" if object_entity == "organization" else object_entity,
+            data_dict.get("object_type"),
+            data_dict.get("relation_type"),
+        ),
+        data_dict.get("object_id"),
+    )
+
+
+@tk.side_effect_free
+@validate(schema.traverse)
+def relationship_traverse(
+    context: Context, data_dict: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """Return relations of the hierarchy around an entity (entity_id).
+
+    `ancestors` direction follows child_of relations, `descendants` follows
+    parent_of relations and `all` follows both. Paths are at most `max_depth`
+    relations long. The whole hierarchy is fetched with a single recursive
+    query, or walked in memory when the snapshot of relations is enabled.
+
+    Returns:
+        List of relations with the `depth` they were found at. Relations that
+        lead back to an entity already visited by the path have `cycle` flag.
+    """
+    tk.check_access("relationship_traverse", context, data_dict)
+
+    max_depth = min(data_dict["max_depth"], TRAVERSE_MAX_DEPTH)
+    if not max_depth:
+        return []
+
+    return _traverse(
+        data_dict["entity_id"],
+        graph.DIRECTIONS[data_dict["direction"]],
+        max_depth,
+    )
+
+
+def _traverse(
+    entity_id: str,
+    relation_types: list[str],
+    max_depth: int,
+) -> list[dict[str, Any]]:
+    """Walk the hierarchy in memory if the snapshot is enabled."""
+    engine = snapshot.current()
+    return (engine.traverse if engine else graph.traverse)(
+        entity_id,
+        relation_types,
+        max_depth,
+    )
+
+
+@tk.side_effect_free
+@validate(schema.hierarchy)
+def relationship_hierarchy(
+    context: Context, data_dict: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """Return IDs of ancestors or descendants (direction) of an entity
+    (entity_id) that are at most `max_depth` relations away from it.
+
+    When `ckanext.relationship.closure_table` is enabled, entities are read
+    from the closure table with a single index lookup. Otherwise they are
+    found by traversal of the hierarchy.
+
+    Returns:
+        List of entities with `id` and `depth` of the shortest path to them,
+        sorted by depth.
+    """
+    tk.check_access("relationship_hierarchy", context, data_dict)
+
+    direction = data_dict["direction"]
+    max_depth = data_dict.get("max_depth")
+    if max_depth == 0:
+        return []
+
+    if closure.enabled():
+        lookup = closure.ancestors if direction == "ancestors" else closure.descendants
+        return lookup(data_dict["entity_id"], max_depth)
+
+    entities: dict[str, dict[str, Any]] = {}
+    for rel in _traverse(
+        data_dict["entity_id"],
+        graph.DIRECTIONS[direction],
+        TRAVERSE_MAX_DEPTH if max_depth is None else min(max_depth, TRAVERSE_MAX_DEPTH),
+    ):
+        entities.setdefault(
+            rel["object_id"],
+            {"id": rel["object_id"], "depth": rel["depth"]},
+        )
+
+    start = Relationship.canonical_id(data_dict["entity_id"])
+    return [entity for entity in entities.values() if entity["id"] != start]
+
+
+@tk.side_effect_free
+@validate(schema.path)
+def relationship_path(
+    context: Context, data_dict: dict[str, Any]
+) -> list[dict[str, Any]] | None:
+    """Return the shortest chain of relations from one entity (subject_id) to
+    another (object_id).
+
+    Only relations of `relation_type` are followed if it is provided. The
+    chain is at most `max_depth` relations long. The search runs from both
+    entities at once and loads every level with a single query.
+
+    Returns:
+        List of relations from the subject to the object, empty if both are
+        the same entity, or None if they are not connected.
+    """
+    tk.check_access("relationship_path", context, data_dict)
+
+    relation_type = data_dict.get("relation_type")
+    return graph.shortest_path(
+        data_dict["subject_id"],
+        data_dict["object_id"],
+        [relation_type] if relation_type else None,
+        min(data_dict["max_depth"], TRAVERSE_MAX_DEPTH),
+    )
+
+
+@tk.side_effect_free
+@validate(schema.neighbourhood)
+def relationship_neighbourhood(
+    context: Context, data_dict: dict[str, Any]
+) -> dict[str, Any]:
+    """Return entities that are at most `max_depth` relations away from an
+    entity (entity_id) together with relations between them.
+
+    Only relations of `relation_type` are followed if it is provided. At most
+    `max_nodes` entities and `max_edges` relations are returned; the result
+    is marked as `truncated` when any of the limits was reached. Every level
+    is loaded with a single query.
+
+    Returns:
+        Dictionary with `nodes`, `edges` and `truncated` flag.
+    """
+    tk.check_access("relationship_neighbourhood", context, data_dict)
+
+    relation_type = data_dict.get("relation_type")
+    return graph.neighbourhood(
+        data_dict["entity_id"],
+        [relation_type] if relation_type else None,
+        min(data_dict["max_depth"], TRAVERSE_MAX_DEPTH),
+        min(data_dict["max_nodes"], NEIGHBOURHOOD_MAX_NODES),
+        min(data_dict["max_edges"], NEIGHBOURHOOD_MAX_EDGES),
+    )
 
 
 @validate(schema.get_entity_list)
 def relationship_get_entity_list(
     context: Context, data_dict: dict[str, Any]
 ) -> list[str]:
-    """Return ids list of specified entity (entity, entity_type)."""
+    """Return ids list of specified entity (entity, entity_type).
+
+    If `ids` are provided, only entities with these IDs or names are returned.
+    """
     tk.check_access("relationship_get_entity_list", context, data_dict)
 
     model = context["model"]
@@ -191,23 +501,226 @@ def relationship_get_entity_list(
     entity = entity if entity != "organization" else "group"
     entity_class = logic.model_name_to_class(model, entity)
 
-    return (
+    q = (
         context["session"]
         .query(entity_class.id, entity_class.name, entity_class.title)
         .filter(entity_class.state != "deleted")
         .filter(entity_class.type == data_dict["entity_type"])
-        .all()
     )
 
+    if "ids" in data_dict:
+        q = q.filter(
+            sa.or_(
+                entity_class.id.in_(data_dict["ids"]),
+                entity_class.name.in_(data_dict["ids"]),
+            ),
+        )
+
+    return q.all()
+
+
+@tk.side_effect_free
+@validate(schema.related_entity_choices)
+def relationship_related_entity_choices(
+    context: Context, data_dict: dict[str, Any]
+) -> dict[str, Any]:
+    """Return a page of entities (entity, entity_type) that can be selected in
+    the related entity field, sorted by title.
+
+    Entities whose title or name contains `q` are returned, except for the
+    entity `current_entity_id`. Private datasets are returned only if they are
+    visible to the current user. The next page is requested by passing the
+    `next` cursor of the current page as `after`.
+
+    Returns:
+        Dictionary with `results` (id, name and title of entities) and `next`
+        cursor, which is None on the last page.
+    """
+    tk.check_access("relationship_related_entity_choices", context, data_dict)
+
+    model = context["model"]
+    user = context.get("user")
+    limit = min(data_dict["limit"], CHOICES_MAX_LIMIT)
+
+    entity = "group" if data_dict["entity"] == "organization" else data_dict["entity"]
+    entity_class = logic.model_name_to_class(model, entity)
+
+    title = sa.func.coalesce(sa.func.nullif(entity_class.title, ""), entity_class.name)
+    sort_key = sa.func.lower(title)
+
+    q = (
+        context["session"]
+        .query(
+            entity_class.id,
+            entity_class.name,
+            title.label("title"),
+            sort_key.label("sort_key"),
+        )
+        .filter(entity_class.state == "active")
+        .filter(entity_class.type == data_dict["entity_type"])
+    )
+
+    if data_dict.get("current_entity_id"):
+        q = q.filter(
+            entity_class.id != data_dict["current_entity_id"],
+            entity_class.name != data_dict["current_entity_id"],
+        )
+
+    if data_dict.get("q"):
+        term = data_dict["q"].lower()
+        q = q.filter(
+            sa.or_(
+                sa.func.lower(entity_class.title).contains(term, autoescape=True),
+                sa.func.lower(entity_class.name).contains(term, autoescape=True),
+            ),
+        )
+
+    if entity == "package" and not authz.is_sysadmin(user):
+        q = _filter_visible_packages(q, context, data_dict["owned_only"])
+
+    check_each = False
+    if data_dict["updatable_only"]:
+        if utils.bulk_update_check_supported(data_dict["entity"]):
+            scope = utils.updatable_scope(user)
+            if scope is not None:
+                q = q.filter(utils.updatable_condition(entity, scope))
+        else:
+            check_each = True
+
+    after = _decode_cursor(data_dict["after"]) if data_dict.get("after") else None
+
+    rows: list[Any] = []
+    next_cursor = None
+    for row in _iter_keyset(q, sa.tuple_(sort_key, entity_class.id), after, limit + 1):
+        if check_each and not _can_update(data_dict["entity"], row.id, user):
+            continue
+
+        if len(rows) == limit:
+            next_cursor = _encode_cursor([rows[-1].sort_key, rows[-1].id])
+            break
+        rows.append(row)
+
+    return {
+        "results": [
+            {"id": row.id, "name": row.name, "title": row.title} for row in rows
+        ],
+        "next": next_cursor,
+    }
+
+
+def _filter_visible_packages(q: Any, context: Context, owned_only: bool) -> Any:
+    """Hide private packages of organizations the user is not a member of."""
+    model = context["model"]
+    user = context.get("user")
+    user_obj = model.User.get(user) if user else None
+    orgs = (
+        [
+            org["id"]
+            for org in tk.get_action("organization_list_for_user")(
+                {"user": user_obj.name},
+                {"permission": "read"},
+            )
+        ]
+        if user_obj
+        else []
+    )
+
+    q = q.filter(
+        sa.or_(
+            model.Package.private.is_(False),
+            model.Package.owner_org.in_(orgs),
+        ),
+    )
+
+    if owned_only:
+        q = q.filter(
+            model.Package.creator_user_id == (user_obj.id if user_obj else None),
+        )
+
+    return q
+
+
+def _can_update(entity: str, entity_id: str, user: str | None) -> bool:
+    try:
+        tk.check_access(f"{entity}_update", {"user": user}, {"id": entity_id})
+    except tk.NotAuthorized:
+        return False
+    return True
+
+
+def _iter_keyset(q: Any, key: Any, after: Any, batch_size: int) -> Iterator[Any]:
+    """Iterate over rows of the query ordered by `key` fetching them in batches.
+
+    Every batch starts right after the last row of the previous one, so rows
+    skipped by the caller do not require OFFSET scans.
+    """
+    while True:
+        batch_q = q if after is None else q.filter(key > sa.tuple_(*after))
+        rows = batch_q.order_by(*key.clauses).limit(batch_size).all()
+        yield from rows
+
+        if len(rows) < batch_size:
+            return
+        after = [rows[-1].sort_key, rows[-1].id]
+
+
+def _encode_cursor(values: list[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str, field: str = "after") -> list[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+
+    if (
+        not isinstance(values, list)
+        or len(values) != 2  # noqa: PLR2004
+        or not all(isinstance(value, str) for value in values)
+    ):
+        raise tk.ValidationError({field: [tk._("Invalid cursor")]})
+    return values
+
+
+def _decode_relations_cursor(cursor: str, order_by: str) -> list[Any]:
+    value, relation_id = _decode_cursor(cursor, "cursor")
+    if order_by == "created_at":
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError as e:
+            raise tk.ValidationError({"cursor": [tk._("Invalid cursor")]}) from e
+    return [value, relation_id]
+
 
 @validate(schema.autocomplete)
 def relationship_autocomplete(context: Context, data_dict: dict[str, Any]) -> Response:
-    fq = f"type:{data_dict['entity_type']} -id:{data_dict['current_entity_id']}"
+    """Return a page of datasets matching `incomplete` term.
+
+    Ownership and permission constraints are applied by the search itself, so
+    every page contains `limit` usable datasets, unless it is the last one.
+    """
+    fq = "+type:{} -id:{}".format(
+        solr_literal(data_dict["entity_type"]),
+        solr_literal(data_dict["current_entity_id"]),
+    )
 
     if data_dict.get("owned_only") and not (
         authz.is_sysadmin(tk.current_user.id) and not data_dict.get("check_sysadmin")
     ):
-        fq += f" creator_user_id:{tk.current_user.id}"
+        fq += f" +creator_user_id:{solr_literal(tk.current_user.id)}"
+
+    check_each = False
+    if data_dict.get("updatable_only"):
+        if utils.bulk_update_check_supported("package"):
+            scope = utils.updatable_scope(context.get("user"))
+            if scope is not None:
+                updatable_fq = utils.updatable_fq(scope)
+                if updatable_fq is None:
+                    return jsonify(_format_autocomplete(data_dict, []))
+                fq += f" {updatable_fq}"
+        else:
+            check_each = True
 
     packages = tk.get_action("package_search")(
         {},
@@ -215,26 +728,32 @@ def relationship_autocomplete(context: Context, data_dict: dict[str, Any]) -> Re
             "q": data_dict.get("incomplete", ""),
             "fq": fq,
             "fl": "id, title",
-            "rows": 100,
+            "rows": min(data_dict["limit"], CHOICES_MAX_LIMIT),
+            "start": data_dict["offset"],
             "include_private": True,
             "sort": "score desc",
         },
     )["results"]
 
-    if data_dict.get("updatable_only"):
+    if check_each:
         packages = [
             pkg
             for pkg in packages
             if tk.h.check_access("package_update", {"id": pkg["id"]})
         ]
 
+    return jsonify(_format_autocomplete(data_dict, packages))
+
+
+def _format_autocomplete(
+    data_dict: dict[str, Any], packages: list[dict[str, Any]]
+) -> Any:
     format_autocomplete_helper: Any = getattr(
         tk.h,
         data_dict.get("format_autocomplete_helper", "relationship_format_autocomplete"),
         tk.h.relationship_format_autocomplete,
     )
-
-    return jsonify(format_autocomplete_helper(packages))
+    return format_autocomplete_helper(packages)
 
 
 @tk.chained_action
@@ -248,48 +767,80 @@ def package_show(
     pkg_type = result["type"]
 
     views_without_relationships = views_without_relationships_in_package_show()
+    fields = utils.get_relation_fields(pkg_type)
 
     if (
         tk.get_endpoint()[1] in views_without_relationships
         and "with_relationships" not in data_dict
     ):
-        relations_info = utils.get_relations_info(pkg_type)
-        for (
-            related_entity,
-            related_entity_type,
-            relation_type,
-        ) in relations_info:
-            field = utils.get_relation_field(
-                pkg_type,
-                related_entity,
-                related_entity_type,
-                relation_type,
-            )
+        for field in fields.values():
             result.pop(field["field_name"], None)
         return result
 
-    relations_info = utils.get_relations_info(pkg_type)
-    for (
-        related_entity,
-        related_entity_type,
-        relation_type,
-    ) in relations_info:
-        field = utils.get_relation_field(
-            pkg_type,
+    if not fields:
+        return result
+
+    tk.check_access("relationship_relations_list", context, {"subject_id": pkg_id})
+
+    # relations of all fields are fetched at once and split between fields below
+    keys = {
+        (
+            "group" if related_entity == "organization" else related_entity,
+            related_entity_type,
+            relation_type,
+        ): field
+        for (
             related_entity,
             related_entity_type,
             relation_type,
-        )
-        result[field["field_name"]] = [
-            relation["object_id"]
-            for relation in tk.get_action("relationship_relations_list")(
-                context,
-                {
-                    "subject_id": pkg_id,
-                    "object_entity": related_entity,
-                    "object_type": related_entity_type,
-                    "relation_type": relation_type,
-                },
-            )
-        ]
+        ), field in fields.items()
+    }
+    # relations of packages reindexed in batch are already loaded
+    relations = indexing.prefetched_relations(pkg_id)
+    if relations is None:
+        relations = Relationship.by_subject_ids([pkg_id], keys)[pkg_id]
+
+    for key, field in keys.items():
+        result[field["field_name"]] = relations.get(key, [])
+    return result
+
+
+@tk.chained_action
+def package_update(next_: Action, context: Context, data_dict: dict[str, Any]) -> Any:
+    return _update_keeping_relations(next_, context, data_dict, "package")
+
+
+@tk.chained_action
+def group_update(next_: Action, context: Context, data_dict: dict[str, Any]) -> Any:
+    return _update_keeping_relations(next_, context, data_dict, "group")
+
+
+@tk.chained_action
+def organization_update(
+    next_: Action, context: Context, data_dict: dict[str, Any]
+) -> Any:
+    return _update_keeping_relations(next_, context, data_dict, "group")
+
+
+def _update_keeping_relations(
+    next_: Action,
+    context: Context,
+    data_dict: dict[str, Any],
+    entity: str,
+) -> Any:
+    """Call the update action and replace the old name of renamed entity with its
+    ID in relations, so they are not lost after the rename.
+    """
+    entity_class = logic.model_name_to_class(context["model"], entity)
+    obj = entity_class.get(data_dict.get("id") or data_dict.get("name"))
+    if obj is None:
+        return next_(context, data_dict)
+
+    old_name = obj.name
+    result = next_(context, data_dict)
+
+    if old_name != obj.name:
+        Relationship.rename_entity(old_name, obj.id)
+        context["session"].commit()
+
     return result
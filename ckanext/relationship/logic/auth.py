@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Any
 
-from ckan import types
+from ckan import authz, types
 from ckan.plugins import toolkit as tk
 
 
@@ -10,9 +10,18 @@ def get_auth_functions():
     auth_functions = [
         relationship_relation_create,
         relationship_relation_delete,
+        relationship_relations_create_bulk,
+        relationship_relations_delete_bulk,
         relationship_relations_list,
         relationship_relations_ids_list,
+        relationship_relations_count,
+        relationship_relation_exists,
+        relationship_traverse,
+        relationship_hierarchy,
+        relationship_path,
+        relationship_neighbourhood,
         relationship_get_entity_list,
+        relationship_related_entity_choices,
         relationship_relationship_autocomplete,
     ]
     return {f.__name__: f for f in auth_functions}
@@ -26,6 +35,28 @@ def relationship_relation_delete(context: types.Context, data_dict: dict[str, An
     return {"success": True}
 
 
+def relationship_relations_create_bulk(
+    context: types.Context,
+    data_dict: dict[str, Any],
+):
+    for relation in data_dict.get("relations", []):
+        result = authz.is_authorized("relationship_relation_create", context, relation)
+        if not result["success"]:
+            return result
+    return {"success": True}
+
+
+def relationship_relations_delete_bulk(
+    context: types.Context,
+    data_dict: dict[str, Any],
+):
+    for relation in data_dict.get("relations", []):
+        result = authz.is_authorized("relationship_relation_delete", context, relation)
+        if not result["success"]:
+            return result
+    return {"success": True}
+
+
 @tk.auth_allow_anonymous_access
 def relationship_relations_list(context: types.Context, data_dict: dict[str, Any]):
     return {"success": True}
@@ -36,11 +67,49 @@ def relationship_relations_ids_list(context: types.Context, data_dict: dict[str,
     return {"success": True}
 
 
+@tk.auth_allow_anonymous_access
+def relationship_relations_count(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def relationship_relation_exists(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def relationship_traverse(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def relationship_hierarchy(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def relationship_path(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def relationship_neighbourhood(context: types.Context, data_dict: dict[str, Any]):
+    return {"success": True}
+
+
 @tk.auth_allow_anonymous_access
 def relationship_get_entity_list(context: types.Context, data_dict: dict[str, Any]):
     return {"success": True}
 
 
+@tk.auth_allow_anonymous_access
+def relationship_related_entity_choices(
+    context: types.Context,
+    data_dict: dict[str, Any],
+):
+    return {"success": True}
+
+
 @tk.auth_allow_anonymous_access
 def relationship_relationship_autocomplete(
     context: types.Context,
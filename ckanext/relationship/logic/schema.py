@@ -44,9 +44,29 @@ def relation_delete(
     }
 
 
+@validator_args
+def relations_create_bulk() -> Schema:
+    return {
+        "relations": relation_create(),
+    }
+
+
+@validator_args
+def relations_delete_bulk() -> Schema:
+    return {
+        "relations": relation_delete(),
+    }
+
+
 @validator_args
 def relations_list(
-    not_empty: Validator, one_of: ValidatorFactory, ignore_missing: Validator
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    ignore_missing: Validator,
+    default: ValidatorFactory,
+    natural_number_validator: Validator,
+    is_positive_integer: Validator,
+    unicode_safe: Validator,
 ) -> Schema:
     return {
         "subject_id": [
@@ -63,6 +83,10 @@ def relations_list(
             ignore_missing,
             one_of(["related_to", "child_of", "parent_of"]),
         ],
+        "limit": [ignore_missing, is_positive_integer],
+        "offset": [default(0), natural_number_validator],
+        "cursor": [ignore_missing, unicode_safe],
+        "order_by": [default("created_at"), one_of(["created_at", "object_id"])],
     }
 
 
@@ -89,7 +113,150 @@ def relations_ids_list(
 
 
 @validator_args
-def get_entity_list(not_empty: Validator, one_of: ValidatorFactory) -> Schema:
+def relations_count(
+    not_empty: Validator, one_of: ValidatorFactory, ignore_missing: Validator
+) -> Schema:
+    return {
+        "subject_id": [
+            not_empty,
+        ],
+        "object_entity": [
+            ignore_missing,
+            one_of(["package", "organization", "group"]),
+        ],
+        "object_type": [
+            ignore_missing,
+        ],
+        "relation_type": [
+            ignore_missing,
+            one_of(["related_to", "child_of", "parent_of"]),
+        ],
+    }
+
+
+@validator_args
+def relation_exists(ignore_missing: Validator) -> Schema:
+    schema = relations_count()
+    schema["object_id"] = [ignore_missing]
+    return schema
+
+
+@validator_args
+def traverse(
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    default: ValidatorFactory,
+    natural_number_validator: Validator,
+) -> Schema:
+    return {
+        "entity_id": [
+            not_empty,
+        ],
+        "direction": [
+            default("descendants"),
+            one_of(["ancestors", "descendants", "all"]),
+        ],
+        "max_depth": [default(5), natural_number_validator],
+    }
+
+
+@validator_args
+def hierarchy(
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    default: ValidatorFactory,
+    ignore_missing: Validator,
+    natural_number_validator: Validator,
+) -> Schema:
+    return {
+        "entity_id": [
+            not_empty,
+        ],
+        "direction": [
+            default("descendants"),
+            one_of(["ancestors", "descendants"]),
+        ],
+        "max_depth": [ignore_missing, natural_number_validator],
+    }
+
+
+@validator_args
+def path(
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    default: ValidatorFactory,
+    ignore_missing: Validator,
+    natural_number_validator: Validator,
+) -> Schema:
+    return {
+        "subject_id": [
+            not_empty,
+        ],
+        "object_id": [
+            not_empty,
+        ],
+        "relation_type": [
+            ignore_missing,
+            one_of(["related_to", "child_of", "parent_of"]),
+        ],
+        "max_depth": [default(5), natural_number_validator],
+    }
+
+
+@validator_args
+def neighbourhood(
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    default: ValidatorFactory,
+    ignore_missing: Validator,
+    natural_number_validator: Validator,
+) -> Schema:
+    return {
+        "entity_id": [
+            not_empty,
+        ],
+        "relation_type": [
+            ignore_missing,
+            one_of(["related_to", "child_of", "parent_of"]),
+        ],
+        "max_depth": [default(2), natural_number_validator],
+        "max_nodes": [default(100), natural_number_validator],
+        "max_edges": [default(500), natural_number_validator],
+    }
+
+
+@validator_args
+def get_entity_list(
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    ignore_missing: Validator,
+    list_of_strings: Validator,
+) -> Schema:
+    return {
+        "entity": [
+            not_empty,
+            one_of(["package", "organization", "group"]),
+        ],
+        "entity_type": [
+            not_empty,
+        ],
+        "ids": [
+            ignore_missing,
+            list_of_strings,
+        ],
+    }
+
+
+@validator_args
+def related_entity_choices(
+    not_empty: Validator,
+    one_of: ValidatorFactory,
+    ignore_missing: Validator,
+    default: ValidatorFactory,
+    boolean_validator: Validator,
+    is_positive_integer: Validator,
+    unicode_safe: Validator,
+) -> Schema:
     return {
         "entity": [
             not_empty,
@@ -98,11 +265,21 @@ def get_entity_list(not_empty: Validator, one_of: ValidatorFactory) -> Schema:
         "entity_type": [
             not_empty,
         ],
+        "q": [ignore_missing, unicode_safe],
+        "current_entity_id": [ignore_missing, unicode_safe],
+        "updatable_only": [default(False), boolean_validator],
+        "owned_only": [default(False), boolean_validator],
+        "limit": [default(20), is_positive_integer],
+        "after": [ignore_missing, unicode_safe],
     }
 
 
 @validator_args
-def autocomplete(not_empty: Validator) -> Schema:
+def autocomplete(
+    not_empty: Validator,
+    default: ValidatorFactory,
+    natural_number_validator: Validator,
+) -> Schema:
     return {
         "incomplete": [],
         "current_entity_id": [
@@ -115,4 +292,6 @@ def autocomplete(not_empty: Validator) -> Schema:
         "owned_only": [],
         "check_sysadmin": [],
         "format_autocomplete_helper": [],
+        "limit": [default(100), natural_number_validator],
+        "offset": [default(0), natural_number_validator],
     }
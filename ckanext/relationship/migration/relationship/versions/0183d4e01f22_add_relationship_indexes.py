@@ -0,0 +1,65 @@
+"""Add indexes and unique constraint.
+
+Revision ID: 0183d4e01f22
+Revises: dd010e8e0680
+Create Date: 2026-10-17 10:12:41.503127
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0183d4e01f22"
+down_revision = "dd010e8e0680"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the unique constraint cannot be created while duplicated triples exist,
+    # so keep only one row (the lowest id) of each of them
+    op.execute(
+        sa.text(
+            """
+            DELETE FROM relationship_relationship a
+            USING relationship_relationship b
+            WHERE a.subject_id = b.subject_id
+                AND a.object_id = b.object_id
+                AND a.relation_type = b.relation_type
+                AND a.id > b.id
+            """
+        )
+    )
+
+    op.create_index(
+        "idx_relationship_subject_relation_object",
+        "relationship_relationship",
+        ["subject_id", "relation_type", "object_id"],
+    )
+    op.create_index(
+        "idx_relationship_object_relation",
+        "relationship_relationship",
+        ["object_id", "relation_type"],
+    )
+    op.create_unique_constraint(
+        "uq_relationship_subject_object_relation",
+        "relationship_relationship",
+        ["subject_id", "object_id", "relation_type"],
+    )
+
+
+def downgrade():
+    op.drop_constraint(
+        "uq_relationship_subject_object_relation",
+        "relationship_relationship",
+        type_="unique",
+    )
+    op.drop_index(
+        "idx_relationship_object_relation",
+        table_name="relationship_relationship",
+    )
+    op.drop_index(
+        "idx_relationship_subject_relation_object",
+        table_name="relationship_relationship",
+    )
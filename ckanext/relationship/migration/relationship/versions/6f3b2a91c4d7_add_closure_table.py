@@ -0,0 +1,38 @@
+"""Add closure table.
+
+Revision ID: 6f3b2a91c4d7
+Revises: 0183d4e01f22
+Create Date: 2026-10-17 16:05:12.318274
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6f3b2a91c4d7"
+down_revision = "0183d4e01f22"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "relationship_closure",
+        sa.Column("ancestor_id", sa.Text, primary_key=True),
+        sa.Column("descendant_id", sa.Text, primary_key=True),
+        sa.Column("depth", sa.Integer, nullable=False),
+    )
+    op.create_index(
+        "idx_relationship_closure_descendant",
+        "relationship_closure",
+        ["descendant_id", "depth"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "idx_relationship_closure_descendant",
+        table_name="relationship_closure",
+    )
+    op.drop_table("relationship_closure")
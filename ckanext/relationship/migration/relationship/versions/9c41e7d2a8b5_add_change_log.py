@@ -0,0 +1,112 @@
+"""Add change log of relations.
+
+Revision ID: 9c41e7d2a8b5
+Revises: 6f3b2a91c4d7
+Create Date: 2026-10-17 19:42:37.106518
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+# revision identifiers, used by Alembic.
+revision = "9c41e7d2a8b5"
+down_revision = "6f3b2a91c4d7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "relationship_change_log",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("operation", sa.Text, nullable=False),
+        sa.Column("relation_id", sa.Text, nullable=False),
+        sa.Column("subject_id", sa.Text, nullable=False),
+        sa.Column("object_id", sa.Text, nullable=False),
+        sa.Column("relation_type", sa.Text, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("extras", JSONB),
+        sa.Column(
+            "changed_at",
+            sa.DateTime,
+            nullable=False,
+            server_default=sa.text("timezone('utc', now())"),
+        ),
+        sa.Column(
+            "txid",
+            sa.BigInteger,
+            nullable=False,
+            server_default=sa.text("txid_current()"),
+        ),
+    )
+    op.create_index(
+        "idx_relationship_change_log_changed_at",
+        "relationship_change_log",
+        ["changed_at"],
+    )
+    op.create_index(
+        "idx_relationship_change_log_txid",
+        "relationship_change_log",
+        ["txid"],
+    )
+
+    # the trigger that calls the function is created only for portals that
+    # use the snapshot, by `ckan relationship enable-change-log`
+    op.execute(
+        """
+        CREATE FUNCTION relationship_log_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE'
+                AND (NEW.id, NEW.subject_id, NEW.object_id, NEW.relation_type)
+                    = (OLD.id, OLD.subject_id, OLD.object_id, OLD.relation_type)
+            THEN
+                INSERT INTO relationship_change_log (
+                    operation, relation_id, subject_id, object_id,
+                    relation_type, created_at, extras
+                ) VALUES (
+                    'update', NEW.id, NEW.subject_id, NEW.object_id,
+                    NEW.relation_type, NEW.created_at, NEW.extras
+                );
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                INSERT INTO relationship_change_log (
+                    operation, relation_id, subject_id, object_id,
+                    relation_type, created_at, extras
+                ) VALUES (
+                    'delete', OLD.id, OLD.subject_id, OLD.object_id,
+                    OLD.relation_type, OLD.created_at, OLD.extras
+                );
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO relationship_change_log (
+                    operation, relation_id, subject_id, object_id,
+                    relation_type, created_at, extras
+                ) VALUES (
+                    'insert', NEW.id, NEW.subject_id, NEW.object_id,
+                    NEW.relation_type, NEW.created_at, NEW.extras
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER IF EXISTS relationship_change_log ON relationship_relationship",
+    )
+    op.execute("DROP FUNCTION relationship_log_change()")
+    op.drop_index(
+        "idx_relationship_change_log_txid",
+        table_name="relationship_change_log",
+    )
+    op.drop_index(
+        "idx_relationship_change_log_changed_at",
+        table_name="relationship_change_log",
+    )
+    op.drop_table("relationship_change_log")
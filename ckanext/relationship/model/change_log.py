@@ -0,0 +1,142 @@
+"""Log of changes of the relationship table.
+
+Rows are written by a database trigger whenever a relation is inserted,
+updated or deleted, so the log is complete no matter which code changed the
+table. An update that keeps the subject, object and type of the relation is
+logged as such, other updates are logged as deletion of the old row followed
+by insertion of the new one. The log is read by the in-memory snapshot of
+relations to refresh it incrementally.
+
+Every change records the transaction that made it. Readers remember the
+oldest transaction that was still running when they read the log, and read
+again changes of it and of all later transactions next time, so changes of
+long transactions are not missed however late they are committed.
+
+The trigger is installed only on portals that use the snapshot, so that
+other portals do not pay for logging.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped
+
+from ckan import model
+
+from .base import Base
+
+TRIGGER = "relationship_change_log"
+
+
+class ChangeLog(Base):
+    __table__: sa.Table = sa.Table(
+        "relationship_change_log",
+        Base.metadata,
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("operation", sa.Text, nullable=False),
+        sa.Column("relation_id", sa.Text, nullable=False),
+        sa.Column("subject_id", sa.Text, nullable=False),
+        sa.Column("object_id", sa.Text, nullable=False),
+        sa.Column("relation_type", sa.Text, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("extras", JSONB),
+        sa.Column(
+            "changed_at",
+            sa.DateTime,
+            nullable=False,
+            server_default=sa.text("timezone('utc', now())"),
+        ),
+        sa.Column(
+            "txid",
+            sa.BigInteger,
+            nullable=False,
+            server_default=sa.text("txid_current()"),
+        ),
+        sa.Index("idx_relationship_change_log_changed_at", "changed_at"),
+        sa.Index("idx_relationship_change_log_txid", "txid"),
+    )
+
+    id: Mapped[int]
+    operation: Mapped[str]
+    relation_id: Mapped[str]
+    subject_id: Mapped[str]
+    object_id: Mapped[str]
+    relation_type: Mapped[str]
+    created_at: Mapped[datetime]
+    extras: Mapped[dict[str, Any]]
+    changed_at: Mapped[datetime]
+    txid: Mapped[int]
+
+
+def since(txid: int) -> Any:
+    """Return changes of the transaction and all later ones, in the order they
+    were made.
+    """
+    table = ChangeLog.__table__
+    return model.Session.execute(
+        sa.select(*table.c).where(table.c.txid >= txid).order_by(table.c.id),
+    )
+
+
+def horizon() -> int:
+    """Return the oldest transaction that is still running.
+
+    Changes of all earlier transactions are already committed or rolled back,
+    so they are visible to the statements that follow.
+    """
+    return model.Session.execute(
+        sa.select(sa.func.txid_snapshot_xmin(sa.func.txid_current_snapshot())),
+    ).scalar_one()
+
+
+def prune(before: datetime) -> int:
+    """Remove changes logged before the given time.
+
+    Returns:
+        Number of removed changes.
+    """
+    table = ChangeLog.__table__
+    return model.Session.execute(
+        sa.delete(table).where(table.c.changed_at < before),
+    ).rowcount
+
+
+def clock() -> datetime:
+    """Return the current time of the database, in UTC like the log."""
+    return model.Session.execute(
+        sa.select(sa.func.timezone("utc", sa.func.now())),
+    ).scalar_one()
+
+
+def install():
+    """Start logging changes of relations."""
+    uninstall()
+    model.Session.execute(
+        sa.text(
+            f"CREATE TRIGGER {TRIGGER}"
+            " AFTER INSERT OR UPDATE OR DELETE ON relationship_relationship"
+            " FOR EACH ROW EXECUTE PROCEDURE relationship_log_change()",
+        ),
+    )
+
+
+def uninstall():
+    """Stop logging changes of relations."""
+    model.Session.execute(
+        sa.text(f"DROP TRIGGER IF EXISTS {TRIGGER} ON relationship_relationship"),
+    )
+
+
+def installed() -> bool:
+    """Check whether changes of relations are logged."""
+    return model.Session.execute(
+        sa.text(
+            "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = :name"
+            " AND tgrelid = 'relationship_relationship'::regclass)",
+        ),
+        {"name": TRIGGER},
+    ).scalar_one()
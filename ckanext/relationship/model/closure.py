@@ -0,0 +1,234 @@
+"""Optional transitive closure of child_of relations.
+
+Every row of the closure table connects an entity with one of its ancestors at
+most `graph.MAX_DEPTH` relations away, the same limit as for traversal, so
+ancestors and descendants of an entity are read with a single index lookup
+instead of a recursive query. Entities are stored by their IDs.
+
+The table is maintained only when `ckanext.relationship.closure_table` is
+enabled. Entities whose child_of relations changed are collected until the
+end of the transaction, then rows of these entities and all their descendants
+are recomputed right before the commit.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Mapped
+
+from ckan import model
+
+from ckanext.relationship.config import closure_table
+
+from .base import Base
+from .graph import MAX_DEPTH, walk_cte, walk_starts
+from .relationship import Relationship, entity_ids_by_names
+
+_QUEUE = "relationship_closure_queue"
+
+
+class Closure(Base):
+    __table__: sa.Table = sa.Table(
+        "relationship_closure",
+        Base.metadata,
+        sa.Column("ancestor_id", sa.Text, primary_key=True),
+        sa.Column("descendant_id", sa.Text, primary_key=True),
+        sa.Column("depth", sa.Integer, nullable=False),
+        sa.Index("idx_relationship_closure_descendant", "descendant_id", "depth"),
+    )
+
+    ancestor_id: Mapped[str]
+    descendant_id: Mapped[str]
+    depth: Mapped[int]
+
+
+def enabled() -> bool:
+    return closure_table()
+
+
+def pending() -> bool:
+    """Check whether the closure is waiting for recomputation before commit."""
+    return bool(model.Session.info.get(_QUEUE))
+
+
+def ancestors(entity_id: str, max_depth: int | None = None) -> list[dict[str, Any]]:
+    """Return IDs of ancestors of the entity with their distance from it."""
+    return _lookup(entity_id, max_depth, ancestors=True)
+
+
+def descendants(entity_id: str, max_depth: int | None = None) -> list[dict[str, Any]]:
+    """Return IDs of descendants of the entity with their distance from it."""
+    return _lookup(entity_id, max_depth, ancestors=False)
+
+
+def _lookup(
+    entity_id: str,
+    max_depth: int | None,
+    ancestors: bool,
+) -> list[dict[str, Any]]:
+    table = Closure.__table__
+    own, other = (
+        (table.c.descendant_id, table.c.ancestor_id)
+        if ancestors
+        else (table.c.ancestor_id, table.c.descendant_id)
+    )
+
+    stmt = (
+        sa.select(other, table.c.depth)
+        .where(own == Relationship.canonical_id(entity_id))
+        .order_by(table.c.depth, other)
+    )
+    if max_depth is not None:
+        stmt = stmt.where(table.c.depth <= max_depth)
+
+    return [{"id": id, "depth": depth} for id, depth in model.Session.execute(stmt)]
+
+
+def reachable(
+    entity_ids: list[str],
+    relation_type: str,
+    max_depth: int,
+) -> dict[str, list[str]]:
+    """Return ancestors (child_of) or descendants (parent_of) of many entities.
+
+    The closure counterpart of `graph.reachable`, read with a single query.
+    """
+    if not entity_ids:
+        return {}
+
+    table = Closure.__table__
+    own, other = (
+        (table.c.descendant_id, table.c.ancestor_id)
+        if relation_type == "child_of"
+        else (table.c.ancestor_id, table.c.descendant_id)
+    )
+
+    resolved = entity_ids_by_names(entity_ids)
+    ids = [resolved.get(entity_id, entity_id) for entity_id in entity_ids]
+    stmt = (
+        sa.select(own, other)
+        .where(own.in_(ids), table.c.depth <= max_depth)
+        .order_by(own, table.c.depth, other)
+    )
+
+    result: dict[str, list[str]] = defaultdict(list)
+    for own_id, other_id in model.Session.execute(stmt):
+        result[own_id].append(other_id)
+
+    return {entity_id: result.get(id, []) for entity_id, id in zip(entity_ids, ids)}
+
+
+def relations_changed(relations: Iterable[Relationship]):
+    """Schedule recomputation of the closure for changed relations.
+
+    Only the child entity of every hierarchy relation is collected, because
+    ancestors of its descendants are the only ones that might change.
+    """
+    if not enabled():
+        return
+
+    children = set()
+    for rel in relations:
+        if rel.relation_type == "child_of":
+            children.add(rel.subject_id)
+        elif rel.relation_type == "parent_of":
+            children.add(rel.object_id)
+
+    if children:
+        model.Session.info.setdefault(_QUEUE, set()).update(children)
+
+
+def refresh(entity_ids: Iterable[str]):
+    """Recompute ancestors of entities and of all their descendants."""
+    table = Closure.__table__
+    resolved = entity_ids_by_names(entity_ids)
+    ids = {resolved.get(entity_id, entity_id) for entity_id in entity_ids}
+
+    affected = ids | set(
+        model.Session.execute(
+            sa.select(table.c.descendant_id).where(table.c.ancestor_id.in_(ids)),
+        ).scalars(),
+    )
+
+    model.Session.execute(
+        sa.delete(table).where(table.c.descendant_id.in_(affected)),
+    )
+    _insert_ancestors(list(affected))
+
+
+def rebuild(batch_size: int) -> Iterable[int]:
+    """Recompute the whole closure table, `batch_size` children at a time.
+
+    The table is cleared first. The caller commits after every batch, so
+    the rebuild does not hold a long transaction, but lookups return
+    incomplete results until the rebuild is finished.
+
+    Yields:
+        Number of processed children after every batch.
+    """
+    table = Closure.__table__
+    model.Session.execute(sa.delete(table))
+
+    processed = 0
+    after = None
+    while True:
+        stmt = (
+            sa.select(Relationship.subject_id)
+            .where(Relationship.relation_type == "child_of")
+            .distinct()
+            .order_by(Relationship.subject_id)
+            .limit(batch_size)
+        )
+        if after is not None:
+            stmt = stmt.where(Relationship.subject_id > after)
+
+        children = list(model.Session.execute(stmt).scalars())
+        if not children:
+            return
+
+        ids = entity_ids_by_names(children)
+        _insert_ancestors(list({ids.get(child, child) for child in children}))
+
+        processed += len(children)
+        after = children[-1]
+        yield processed
+
+
+def _insert_ancestors(entity_ids: list[str]):
+    """Store ancestors of entities, computed with a single recursive query."""
+    if not entity_ids:
+        return
+
+    walk = walk_cte(walk_starts(entity_ids), ["child_of"], MAX_DEPTH)
+
+    stmt = insert(Closure.__table__).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        sa.select(walk.c.node_id, walk.c.origin, sa.func.min(walk.c.depth))
+        .where(walk.c.node_id != walk.c.origin)
+        .group_by(walk.c.node_id, walk.c.origin),
+    )
+    # the same entity may be reached by name and by ID in different batches
+    model.Session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["ancestor_id", "descendant_id"],
+            set_={"depth": sa.func.least(Closure.depth, stmt.excluded.depth)},
+        ),
+    )
+
+
+@sa.event.listens_for(model.Session, "before_commit")
+def _refresh_queued(session: Any):
+    entity_ids = session.info.pop(_QUEUE, None)
+    if entity_ids:
+        session.flush()
+        refresh(entity_ids)
+
+
+@sa.event.listens_for(model.Session, "after_soft_rollback")
+def _forget_queued(session: Any, previous_transaction: Any):
+    if previous_transaction.parent is None:
+        session.info.pop(_QUEUE, None)
@@ -0,0 +1,537 @@
+"""Queries that walk the graph of relations.
+
+Relations may reference entities either by ID or by name, so every object is
+resolved to the ID of the package or group it references before its own
+relations are followed. Objects that match no entity are kept as they are.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Callable, Iterable
+
+import sqlalchemy as sa
+
+from ckan import model
+
+from ckanext.relationship.config import canonical_ids
+
+from .relationship import Relationship, entity_identifiers, entity_ids_by_names
+
+# longest path followed by traversal, protects against runaway recursion
+MAX_DEPTH = 20
+
+# direction of traversal -> relation types that lead in this direction
+DIRECTIONS = {
+    "ancestors": ["child_of"],
+    "descendants": ["parent_of"],
+    "all": ["child_of", "parent_of"],
+}
+
+
+def traverse(
+    entity_id: str,
+    relation_types: list[str],
+    max_depth: int,
+) -> list[dict[str, Any]]:
+    """Return relations reachable from the entity using one recursive query.
+
+    Every path follows relations of a single type, so ancestors of ancestors
+    are returned, but not their descendants. Relations are visited
+    breadth-first, and a relation that leads back to an entity of the
+    shortest path to it is returned with `cycle` flag.
+
+    Args:
+        entity_id: ID or name of the starting entity.
+        relation_types: types of relations to follow.
+        max_depth: maximum number of relations in a path.
+
+    Returns:
+        Relations between resolved IDs of entities with the depth of the
+        shortest path they were reached by, sorted by depth.
+    """
+    start = entity_ids_by_names([entity_id]).get(entity_id, entity_id)
+    [start_identifiers] = entity_identifiers(entity_id)
+    walk = walk_cte(
+        dict.fromkeys(start_identifiers, start),
+        relation_types,
+        max_depth,
+    )
+
+    rel = Relationship.__table__
+    edges, node_id, _node_name = _resolved_edges()
+    stmt = sa.union(
+        sa.select(walk.c.origin, walk.c.node_id, walk.c.relation_type).where(
+            walk.c.depth == 1,
+        ),
+        sa.select(walk.c.node_id, node_id, rel.c.relation_type)
+        .select_from(
+            sa.join(
+                walk,
+                edges,
+                sa.and_(
+                    rel.c.subject_id.in_([walk.c.node_id, walk.c.node_name]),
+                    rel.c.relation_type == walk.c.relation_type,
+                ),
+            ),
+        )
+        .where(walk.c.depth < max_depth),
+    )
+
+    objects: dict[tuple[str, str], set[str]] = defaultdict(set)
+    for parent_id, object_id, relation_type in model.Session.execute(stmt):
+        objects[(parent_id, relation_type)].add(object_id)
+
+    found = breadth_first(
+        start,
+        relation_types,
+        max_depth,
+        lambda node, relation_type: sorted(objects[(node, relation_type)]),
+    )
+    return [
+        {
+            "subject_id": parent_id,
+            "object_id": object_id,
+            "relation_type": relation_type,
+            "depth": depth,
+            "cycle": cycle,
+        }
+        for (parent_id, object_id, relation_type), (depth, cycle) in sorted(
+            found.items(),
+            key=lambda item: (*item[1], item[0][2], item[0][1]),
+        )
+    ]
+
+
+def breadth_first(
+    start: Any,
+    relation_types: list[str],
+    max_depth: int,
+    objects: Callable[[Any, str], Iterable[Any]],
+) -> dict[tuple[Any, Any, str], tuple[int, bool]]:
+    """Visit relations of every type breadth-first, starting from the entity.
+
+    Args:
+        start: the starting entity.
+        relation_types: types of relations to follow, one at a time.
+        max_depth: maximum number of relations in a path.
+        objects: returns objects of relations of the given type of an entity.
+
+    Returns:
+        Mapping of (subject, object, relation_type) of every visited relation
+        to the depth of the shortest path to it and the flag that tells
+        whether the relation leads back to an entity of this path. Such
+        relations are not followed.
+    """
+    found: dict[tuple[Any, Any, str], tuple[int, bool]] = {}
+    for relation_type in relation_types:
+        parents: dict[Any, Any] = {start: None}
+        frontier = [start]
+        for depth in range(1, max_depth + 1):
+            next_frontier: list[Any] = []
+            for node in frontier:
+                path = _path(node, parents)
+                for target in objects(node, relation_type):
+                    cycle = target in path
+                    found.setdefault((node, target, relation_type), (depth, cycle))
+                    if not cycle and target not in parents:
+                        parents[target] = node
+                        next_frontier.append(target)
+
+            frontier = next_frontier
+
+    return found
+
+
+def _path(node: Any, parents: dict[Any, Any]) -> set[Any]:
+    """Return entities on the path from the start of traversal to the node."""
+    path = set()
+    while node is not None:
+        path.add(node)
+        node = parents[node]
+    return path
+
+
+def shortest_path(
+    subject_id: str,
+    object_id: str,
+    relation_types: list[str] | None,
+    max_depth: int,
+) -> list[dict[str, Any]] | None:
+    """Return the shortest chain of relations between two entities.
+
+    The search expands the smaller of two frontiers, one from each end, and
+    stops as soon as they meet. Every relation has a reverse one, so the
+    frontier around the object follows reverse relations. Every level of the
+    search is loaded with a single query.
+
+    Args:
+        subject_id: ID or name of the first entity.
+        object_id: ID or name of the last entity.
+        relation_types: types of relations to follow, all if empty.
+        max_depth: maximum number of relations in the chain.
+
+    Returns:
+        Relations between resolved IDs of entities, from the subject to the
+        object, or None if the entities are not connected within `max_depth`.
+    """
+    starts = walk_starts([subject_id, object_id])
+    start = Relationship.canonical_id(subject_id)
+    goal = Relationship.canonical_id(object_id)
+    if start == goal:
+        return []
+
+    reverse_types = relation_types and [
+        Relationship.reverse_relation_type[relation_type]
+        for relation_type in relation_types
+    ]
+
+    # visited entity -> (neighbour on the way to the start/goal, relation type)
+    forward: dict[str, tuple[str, str] | None] = {start: None}
+    backward: dict[str, tuple[str, str] | None] = {goal: None}
+    forward_frontier = {
+        identifier: id for identifier, id in starts.items() if id == start
+    }
+    backward_frontier = {
+        identifier: id for identifier, id in starts.items() if id == goal
+    }
+
+    for _depth in range(max_depth):
+        if not forward_frontier or not backward_frontier:
+            return None
+
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier, reached = _expand(
+                forward_frontier,
+                forward,
+                relation_types,
+                reverse=False,
+            )
+        else:
+            backward_frontier, reached = _expand(
+                backward_frontier,
+                backward,
+                reverse_types,
+                reverse=True,
+            )
+
+        chains = [
+            _chain(node, forward, backward)
+            for node in reached
+            if node in forward and node in backward
+        ]
+        if chains:
+            return min(chains, key=len)
+
+    return None
+
+
+def neighbourhood(
+    entity_id: str,
+    relation_types: list[str] | None,
+    max_depth: int,
+    max_nodes: int,
+    max_edges: int,
+) -> dict[str, Any]:
+    """Return entities at most `max_depth` relations away from the entity and
+    relations between them.
+
+    Every level is loaded with a single query. The search stops when the
+    number of entities or relations reaches its limit; in this case the
+    result is marked as `truncated`. Relations are reported in one direction
+    only, as their reverse relations connect the same entities.
+
+    Returns:
+        Dictionary with `nodes` (`id` and `depth`, the starting entity at
+        depth 0), `edges` and `truncated` flag.
+    """
+    start = Relationship.canonical_id(entity_id)
+    nodes = {start: 0}
+    edges: dict[tuple[str, str, str], dict[str, Any]] = {}
+    frontier = {
+        identifier: id
+        for identifier, id in walk_starts([entity_id]).items()
+        if id == start
+    }
+    truncated = False
+
+    for depth in range(1, max_depth + 1):
+        if not frontier or truncated:
+            break
+
+        next_frontier: dict[str, str] = {}
+        for subject, node_id, node_name, relation_type in frontier_edges(
+            frontier,
+            relation_types,
+        ):
+            if node_id not in nodes:
+                if len(nodes) >= max_nodes:
+                    truncated = True
+                    continue
+                nodes[node_id] = depth
+                next_frontier.update({node_id: node_id, node_name: node_id})
+
+            reverse = (
+                node_id,
+                subject,
+                Relationship.reverse_relation_type[relation_type],
+            )
+            if reverse in edges or (subject, node_id, relation_type) in edges:
+                continue
+            if len(edges) >= max_edges:
+                truncated = True
+                continue
+
+            edges[(subject, node_id, relation_type)] = {
+                "subject_id": subject,
+                "object_id": node_id,
+                "relation_type": relation_type,
+                "depth": depth,
+            }
+
+        frontier = next_frontier
+
+    return {
+        "nodes": [{"id": id, "depth": depth} for id, depth in nodes.items()],
+        "edges": list(edges.values()),
+        "truncated": truncated,
+    }
+
+
+def frontier_edges(
+    frontier: dict[str, str],
+    relation_types: list[str] | None,
+) -> list[tuple[str, str, str, str]]:
+    """Return relations of all entities of the frontier using a single query.
+
+    Args:
+        frontier: mapping of every identifier (ID or name) of entities to
+            their resolved ID.
+        relation_types: types of relations to follow, all if empty.
+
+    Returns:
+        Tuples of the resolved subject ID, resolved object ID, object name
+        and relation type.
+    """
+    rel = Relationship.__table__
+    edges, node_id, node_name = _resolved_edges()
+    stmt = (
+        sa.select(rel.c.subject_id, node_id, node_name, rel.c.relation_type)
+        .select_from(edges)
+        .where(rel.c.subject_id.in_(list(frontier)))
+        .order_by(rel.c.subject_id, rel.c.relation_type, node_id)
+    )
+    if relation_types:
+        stmt = stmt.where(rel.c.relation_type.in_(relation_types))
+
+    return [
+        (frontier[subject], id, name, relation_type)
+        for subject, id, name, relation_type in model.Session.execute(stmt)
+    ]
+
+
+def _expand(
+    frontier: dict[str, str],
+    visited: dict[str, tuple[str, str] | None],
+    relation_types: list[str] | None,
+    reverse: bool,
+) -> tuple[dict[str, str], list[str]]:
+    """Visit neighbours of the frontier and return the next frontier together
+    with all entities reached from it, including already visited ones.
+    """
+    next_frontier: dict[str, str] = {}
+    reached: list[str] = []
+    for subject, node_id, node_name, relation_type in frontier_edges(
+        frontier,
+        relation_types,
+    ):
+        reached.append(node_id)
+        if node_id in visited:
+            continue
+
+        visited[node_id] = (
+            subject,
+            Relationship.reverse_relation_type[relation_type]
+            if reverse
+            else relation_type,
+        )
+        next_frontier.update({node_id: node_id, node_name: node_id})
+
+    return next_frontier, reached
+
+
+def _chain(
+    meeting: str,
+    forward: dict[str, tuple[str, str] | None],
+    backward: dict[str, tuple[str, str] | None],
+) -> list[dict[str, Any]]:
+    """Join paths from the start and to the goal at the meeting entity."""
+    chain: list[dict[str, Any]] = []
+
+    node = meeting
+    while (step := forward[node]) is not None:
+        previous, relation_type = step
+        chain.append(
+            {"subject_id": previous, "object_id": node, "relation_type": relation_type}
+        )
+        node = previous
+    chain.reverse()
+
+    node = meeting
+    while (step := backward[node]) is not None:
+        following, relation_type = step
+        chain.append(
+            {"subject_id": node, "object_id": following, "relation_type": relation_type}
+        )
+        node = following
+
+    return chain
+
+
+def reachable(
+    entity_ids: list[str],
+    relation_type: str,
+    max_depth: int,
+) -> dict[str, list[str]]:
+    """Return entities reachable from every entity using one recursive query.
+
+    Args:
+        entity_ids: IDs or names of the starting entities.
+        relation_type: type of relations to follow.
+        max_depth: maximum number of relations in a path.
+
+    Returns:
+        Mapping of every starting entity to resolved IDs of reachable
+        entities, sorted by distance. The starting entity is not included.
+    """
+    if not entity_ids:
+        return {}
+
+    starts = walk_starts(entity_ids)
+    walk = walk_cte(starts, [relation_type], max_depth)
+    stmt = (
+        sa.select(walk.c.origin, walk.c.node_id)
+        .where(walk.c.node_id != walk.c.origin)
+        .group_by(walk.c.origin, walk.c.node_id)
+        .order_by(walk.c.origin, sa.func.min(walk.c.depth), walk.c.node_id)
+    )
+
+    result: dict[str, list[str]] = defaultdict(list)
+    for origin, node_id in model.Session.execute(stmt):
+        result[origin].append(node_id)
+
+    resolved = entity_ids_by_names(entity_ids)
+    return {
+        entity_id: result.get(resolved.get(entity_id, entity_id), [])
+        for entity_id in entity_ids
+    }
+
+
+def walk_starts(entity_ids: list[str]) -> dict[str, str]:
+    """Map every identifier of entities to their resolved ID for `walk_cte`."""
+    resolved = entity_ids_by_names(entity_ids)
+    return {
+        identifier: resolved.get(entity_id, entity_id)
+        for entity_id, identifiers in zip(
+            entity_ids,
+            entity_identifiers(*entity_ids),
+        )
+        for identifier in identifiers
+    }
+
+
+def walk_cte(
+    starts: dict[str, str],
+    relation_types: list[str],
+    max_depth: int,
+) -> Any:
+    """Return recursive CTE that walks relations from many entities at once.
+
+    Every row of the CTE is an entity reached from the `origin` entity by
+    relations of `relation_type`, where `node_id` is the resolved ID of the
+    entity and `node_name` is its name. The walk does not keep paths, so every
+    entity is listed once per depth it is reached at and shared parts of the
+    hierarchy are not walked again for every path that leads to them.
+
+    Args:
+        starts: mapping of every identifier (ID or name) of starting entities
+            to the resolved ID of the entity.
+        relation_types: types of relations to follow.
+        max_depth: maximum number of relations in a path.
+    """
+    rel = Relationship.__table__
+    edges, node_id, node_name = _resolved_edges()
+    origins = sa.values(
+        sa.column("identifier", sa.Text),
+        sa.column("origin", sa.Text),
+        name="origins",
+    ).data(list(starts.items()))
+
+    walk = (
+        sa.select(
+            origins.c.origin,
+            node_id.label("node_id"),
+            node_name.label("node_name"),
+            rel.c.relation_type,
+            sa.literal_column("1").label("depth"),
+        )
+        .select_from(
+            sa.join(edges, origins, rel.c.subject_id == origins.c.identifier),
+        )
+        .where(rel.c.relation_type.in_(relation_types))
+        .cte("walk", recursive=True)
+    )
+
+    # UNION drops rows that were already produced, unlike UNION ALL
+    return walk.union(
+        sa.select(
+            walk.c.origin,
+            node_id,
+            node_name,
+            rel.c.relation_type,
+            walk.c.depth + 1,
+        )
+        .select_from(
+            sa.join(
+                walk,
+                edges,
+                sa.and_(
+                    rel.c.subject_id.in_([walk.c.node_id, walk.c.node_name]),
+                    rel.c.relation_type == walk.c.relation_type,
+                ),
+            ),
+        )
+        .where(walk.c.depth < max_depth),
+    )
+
+
+def _resolved_edges() -> tuple[Any, Any, Any]:
+    """Return relation table joined with entities referenced by objects.
+
+    Returns:
+        Tuple of the join, resolved object ID and object name. The name
+        is used to follow relations stored with the name of the subject.
+    """
+    rel = Relationship.__table__
+    if canonical_ids():
+        return rel, rel.c.object_id, rel.c.object_id
+
+    edges: Any = rel
+    ids: list[Any] = []
+    names: list[Any] = []
+    # packages take precedence over groups, as in `entity_ids_by_names`
+    for table in (model.package_table, model.group_table):
+        by_id = table.alias()
+        by_name = table.alias()
+        edges = edges.outerjoin(by_id, by_id.c.id == rel.c.object_id).outerjoin(
+            by_name,
+            by_name.c.name == rel.c.object_id,
+        )
+        ids.extend([by_id.c.id, by_name.c.id])
+        names.extend([by_id.c.name, by_name.c.name])
+
+    return (
+        edges,
+        sa.func.coalesce(*ids, rel.c.object_id),
+        sa.func.coalesce(*names, rel.c.object_id),
+    )
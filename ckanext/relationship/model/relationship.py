@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import sqlalchemy as sa
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.orm import Mapped
 from typing_extensions import override
 
 from ckan import logic, model
 from ckan.model.types import make_uuid
 
+from ckanext.relationship import cache
+from ckanext.relationship.config import canonical_ids
+
 from .base import Base
 
 
@@ -24,6 +27,19 @@ class Relationship(Base):
         sa.Column("relation_type", sa.Text, nullable=False),
         sa.Column("created_at", sa.DateTime, nullable=False, default=datetime.utcnow),  # pyright: ignore[reportDeprecated]
         sa.Column("extras", JSONB, nullable=False, default=dict),
+        sa.Index(
+            "idx_relationship_subject_relation_object",
+            "subject_id",
+            "relation_type",
+            "object_id",
+        ),
+        sa.Index("idx_relationship_object_relation", "object_id", "relation_type"),
+        sa.UniqueConstraint(
+            "subject_id",
+            "object_id",
+            "relation_type",
+            name="uq_relationship_subject_object_relation",
+        ),
     )
 
     id: Mapped[str]
@@ -63,15 +79,10 @@ class Relationship(Base):
 
     @classmethod
     def by_object_id(cls, subject_id: str, object_id: str, relation_type: str):
-        subject_name = _entity_name_by_id(subject_id)
-        subject_identifiers = [subject_id]
-        if subject_name is not None:
-            subject_identifiers.append(subject_name)
-
-        object_name = _entity_name_by_id(object_id)
-        object_identifiers = [object_id]
-        if object_name is not None:
-            object_identifiers.append(object_name)
+        subject_identifiers, object_identifiers = entity_identifiers(
+            subject_id,
+            object_id,
+        )
 
         return (
             model.Session.query(cls)
@@ -83,6 +94,17 @@ class Relationship(Base):
             .one_or_none()
         )
 
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Relationship:
+        """Build transient relation from the output of `as_dict`."""
+        created_at = data.get("created_at")
+        return cls(
+            **dict(
+                data,
+                created_at=datetime.fromisoformat(created_at) if created_at else None,
+            ),
+        )
+
     @classmethod
     def by_subject_id(
         cls,
@@ -90,52 +112,837 @@ class Relationship(Base):
         object_entity: str | None = None,
         object_type: str | None = None,
         relation_type: str | None = None,
-    ):
-        subject_name = _entity_name_by_id(subject_id)
-        subject_identifiers = [subject_id]
-        if subject_name is not None:
-            subject_identifiers.append(subject_name)
+    ) -> list[Relationship]:
+        """Return relations of the subject.
+
+        When relationship cache is enabled, transient relations built from
+        cached data are returned.
+        """
+        if cache.backend() is None:
+            return cls._by_subject_id(
+                subject_id,
+                object_entity,
+                object_type,
+                relation_type,
+            )
+
+        relations = cache.get_or_set(
+            [subject_id],
+            cache.variant_key(
+                "by_subject_id",
+                object_entity,
+                object_type,
+                relation_type,
+            ),
+            lambda subjects: {
+                subject: [
+                    rel.as_dict()
+                    for rel in cls._by_subject_id(
+                        subject,
+                        object_entity,
+                        object_type,
+                        relation_type,
+                    )
+                ]
+                for subject in subjects
+            },
+        )[subject_id]
+        return [cls.from_dict(rel) for rel in relations]
+
+    @classmethod
+    def _by_subject_id(
+        cls,
+        subject_id: str,
+        object_entity: str | None,
+        object_type: str | None,
+        relation_type: str | None,
+    ) -> list[Relationship]:
+        stmt = cls.subject_select(subject_id, object_entity, object_type, relation_type)
+        return list(
+            model.Session.execute(
+                sa.select(cls).from_statement(stmt),
+            ).scalars(),
+        )
+
+    @classmethod
+    def object_ids_by_subject_id(
+        cls,
+        subject_id: str,
+        object_entity: str | None = None,
+        object_type: str | None = None,
+        relation_type: str | None = None,
+    ) -> list[str]:
+        """Return distinct IDs of objects related to the subject.
+
+        Only the object_id column is read, so relations are not loaded.
+        """
+        return cache.get_or_set(
+            [subject_id],
+            cache.variant_key(
+                "object_ids_by_subject_id",
+                object_entity,
+                object_type,
+                relation_type,
+            ),
+            lambda subjects: {
+                subject: list(
+                    model.Session.execute(
+                        cls.subject_select(
+                            subject,
+                            object_entity,
+                            object_type,
+                            relation_type,
+                        )
+                        .with_only_columns(cls.object_id)
+                        .distinct()
+                        .order_by(cls.object_id),
+                    ).scalars(),
+                )
+                for subject in subjects
+            },
+        )[subject_id]
+
+    @classmethod
+    def count_by_subject_id(
+        cls,
+        subject_id: str,
+        object_entity: str | None = None,
+        object_type: str | None = None,
+        relation_type: str | None = None,
+    ) -> dict[tuple[str, str, str], int]:
+        """Return number of the subject's relations using a single query.
+
+        Returns:
+            Mapping of (object_entity, object_type, relation_type) to number of
+            relations, where object_entity is either package or group.
+        """
+        [subject_identifiers] = entity_identifiers(subject_id)
+
+        selects = []
+        for entity, object_class in (
+            ("package", model.Package),
+            ("group", model.Group),
+        ):
+            if object_entity and object_entity != entity:
+                continue
+
+            select = (
+                sa.select(
+                    sa.literal(entity).label("object_entity"),
+                    object_class.type,
+                    cls.relation_type,
+                    sa.func.count().label("count"),
+                )
+                .select_from(
+                    sa.join(cls, object_class, _object_join_condition(object_class)),
+                )
+                .where(cls.subject_id.in_(subject_identifiers))
+                .group_by(object_class.type, cls.relation_type)
+            )
+            if object_type:
+                select = select.where(object_class.type == object_type)
+            if relation_type:
+                select = select.where(cls.relation_type == relation_type)
+
+            selects.append(select)
+
+        return {
+            (entity, entity_type, relation): count
+            for entity, entity_type, relation, count in model.Session.execute(
+                sa.union_all(*selects),
+            )
+        }
+
+    @classmethod
+    def subject_select(
+        cls,
+        subject_id: str,
+        object_entity: str | None = None,
+        object_type: str | None = None,
+        relation_type: str | None = None,
+    ) -> Any:
+        """Return SELECT of all columns of the subject's relations."""
+        [subject_identifiers] = entity_identifiers(subject_id)
 
-        q = model.Session.query(cls).filter(
+        stmt = sa.select(*cls.__table__.c).where(
             cls.subject_id.in_(subject_identifiers),
         )
 
         if object_entity:
             object_class = logic.model_name_to_class(model, object_entity)
-            q = q.join(
-                object_class,
+            stmt = stmt.join(object_class, _object_join_condition(object_class))
+
+            if object_type:
+                stmt = stmt.where(object_class.type == object_type)
+
+        if relation_type:
+            stmt = stmt.where(cls.relation_type == relation_type)
+
+        return stmt
+
+    @classmethod
+    def by_subject_ids(
+        cls,
+        subject_ids: Iterable[str],
+        keys: Iterable[tuple[str, str, str]] | None = None,
+    ) -> dict[str, dict[tuple[str, str, str], list[str]]]:
+        """Return IDs of objects related to many subjects using a single query.
+
+        Args:
+            subject_ids: IDs of subjects.
+            keys: if provided, only relations matching one of these
+                (object_entity, object_type, relation_type) tuples are fetched.
+
+        Returns:
+            Mapping of subject ID to a mapping of (object_entity, object_type,
+            relation_type) to object IDs, where object_entity is either package
+            or group.
+        """
+        subject_ids = list(subject_ids)
+        if not subject_ids:
+            return {}
+
+        wanted = None if keys is None else sorted(set(keys))
+        if cache.backend() is None:
+            return cls._by_subject_ids(subject_ids, wanted)
+
+        cached = cache.get_or_set(
+            subject_ids,
+            cache.variant_key("by_subject_ids", wanted),
+            lambda subjects: {
+                subject: [[*key, objects] for key, objects in relations.items()]
+                for subject, relations in cls._by_subject_ids(subjects, wanted).items()
+            },
+        )
+        return {
+            subject_id: {
+                (object_entity, object_type, relation_type): objects
+                for object_entity, object_type, relation_type, objects in cached[
+                    subject_id
+                ]
+            }
+            for subject_id in subject_ids
+        }
+
+    @classmethod
+    def _by_subject_ids(
+        cls,
+        subject_ids: list[str],
+        keys: list[tuple[str, str, str]] | None,
+    ) -> dict[str, dict[tuple[str, str, str], list[str]]]:
+        owners = {
+            identifier: subject_id
+            for subject_id, identifiers in zip(
+                subject_ids,
+                entity_identifiers(*subject_ids),
+            )
+            for identifier in identifiers
+        }
+
+        selects = []
+        for object_entity, object_class in (
+            ("package", model.Package),
+            ("group", model.Group),
+        ):
+            select = (
+                sa.select(
+                    cls.subject_id,
+                    cls.object_id,
+                    cls.relation_type,
+                    sa.literal(object_entity).label("object_entity"),
+                    object_class.type,
+                )
+                .select_from(
+                    sa.join(cls, object_class, _object_join_condition(object_class)),
+                )
+                .where(cls.subject_id.in_(list(owners)))
+            )
+
+            if keys is not None:
+                pairs = [
+                    (object_type, relation_type)
+                    for entity, object_type, relation_type in keys
+                    if entity == object_entity
+                ]
+                if not pairs:
+                    continue
+                select = select.where(
+                    sa.tuple_(object_class.type, cls.relation_type).in_(pairs),
+                )
+
+            selects.append(select)
+
+        if not selects:
+            return {subject_id: {} for subject_id in subject_ids}
+
+        stmt = sa.union_all(*selects)
+        grouped: dict[str, dict[tuple[str, str, str], dict[str, None]]] = {
+            subject_id: {} for subject_id in subject_ids
+        }
+        for (
+            subject,
+            object_id,
+            relation_type,
+            object_entity,
+            object_type,
+        ) in model.Session.execute(stmt):
+            grouped[owners[subject]].setdefault(
+                (object_entity, object_type, relation_type),
+                {},
+            )[object_id] = None
+
+        return {
+            subject_id: {key: list(objects) for key, objects in relations.items()}
+            for subject_id, relations in grouped.items()
+        }
+
+    @classmethod
+    def create_bulk(cls, relations: list[dict[str, Any]]) -> list[Relationship]:
+        """Create relations together with their reverse relations.
+
+        Relations that already exist are skipped. All new rows are inserted with
+        a single INSERT ... ON CONFLICT DO NOTHING statement. The transaction is
+        not committed.
+
+        Args:
+            relations: dictionaries with subject_id, object_id, relation_type
+                and optional extras.
+
+        Returns:
+            Created relations in the order of `relations`, each one followed by
+            its reverse relation.
+        """
+        if not relations:
+            return []
+
+        identifiers = _identifiers_map(relations)
+        if canonical_ids():
+            relations = [
+                dict(
+                    rel,
+                    subject_id=identifiers[rel["subject_id"]][0],
+                    object_id=identifiers[rel["object_id"]][0],
+                )
+                for rel in relations
+            ]
+
+        existing = cls._existing_triples(
+            {
+                (subject_id, object_id, rel["relation_type"])
+                for rel in relations
+                for subject_id in identifiers[rel["subject_id"]]
+                for object_id in identifiers[rel["object_id"]]
+            },
+        )
+
+        rows: dict[tuple[str, str, str], dict[str, Any]] = {}
+        for rel in relations:
+            if any(
+                (subject_id, object_id, rel["relation_type"]) in existing
+                for subject_id in identifiers[rel["subject_id"]]
+                for object_id in identifiers[rel["object_id"]]
+            ):
+                continue
+
+            extras = rel.get("extras") or {}
+            for subject_id, object_id, relation_type in (
+                (rel["subject_id"], rel["object_id"], rel["relation_type"]),
+                (
+                    rel["object_id"],
+                    rel["subject_id"],
+                    cls.reverse_relation_type[rel["relation_type"]],
+                ),
+            ):
+                rows.setdefault(
+                    (subject_id, object_id, relation_type),
+                    {
+                        "id": make_uuid(),
+                        "subject_id": subject_id,
+                        "object_id": object_id,
+                        "relation_type": relation_type,
+                        "extras": extras,
+                    },
+                )
+
+        if not rows:
+            return []
+
+        stmt = (
+            insert(cls.__table__)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(
+                constraint="uq_relationship_subject_object_relation",
+            )
+            .returning(*cls.__table__.c)
+        )
+        created = {
+            (rel.subject_id, rel.object_id, rel.relation_type): rel
+            for rel in (cls(**row._mapping) for row in model.Session.execute(stmt))
+        }
+        invalidate_cache(*{rel.subject_id for rel in created.values()})
+
+        return [created[key] for key in rows if key in created]
+
+    @classmethod
+    def delete_bulk(cls, relations: list[dict[str, Any]]) -> list[Relationship]:
+        """Delete relations together with their reverse relations using a single
+        DELETE statement. The transaction is not committed.
+
+        Args:
+            relations: dictionaries with subject_id, object_id and optional
+                relation_type. Relations of all types between the entities are
+                removed when relation_type is not specified.
+
+        Returns:
+            Deleted relations.
+        """
+        if not relations:
+            return []
+
+        identifiers = _identifiers_map(relations)
+        triples: set[tuple[str, str, str]] = set()
+        pairs: set[tuple[str, str]] = set()
+
+        for rel in relations:
+            relation_type = rel.get("relation_type")
+            for subject_id in identifiers[rel["subject_id"]]:
+                for object_id in identifiers[rel["object_id"]]:
+                    if relation_type:
+                        triples.add((subject_id, object_id, relation_type))
+                        triples.add(
+                            (
+                                object_id,
+                                subject_id,
+                                cls.reverse_relation_type[relation_type],
+                            ),
+                        )
+                    else:
+                        pairs.add((subject_id, object_id))
+                        pairs.add((object_id, subject_id))
+
+        conditions: list[Any] = []
+        if triples:
+            conditions.append(
+                sa.tuple_(cls.subject_id, cls.object_id, cls.relation_type).in_(
+                    list(triples),
+                ),
+            )
+        if pairs:
+            conditions.append(
+                sa.tuple_(cls.subject_id, cls.object_id).in_(list(pairs)),
+            )
+
+        stmt = (
+            sa.delete(cls.__table__)
+            .where(sa.or_(*conditions))
+            .returning(*cls.__table__.c)
+        )
+        deleted = [cls(**row._mapping) for row in model.Session.execute(stmt)]
+        invalidate_cache(*{rel.subject_id for rel in deleted})
+        return deleted
+
+    @classmethod
+    def _existing_triples(
+        cls,
+        triples: set[tuple[str, str, str]],
+    ) -> set[tuple[str, str, str]]:
+        """Return triples (subject_id, object_id, relation_type) that are already
+        stored in the table.
+        """
+        if not triples:
+            return set()
+
+        return {
+            tuple(row)
+            for row in model.Session.query(
+                cls.subject_id,
+                cls.object_id,
+                cls.relation_type,
+            ).filter(
+                sa.tuple_(cls.subject_id, cls.object_id, cls.relation_type).in_(
+                    list(triples),
+                ),
+            )
+        }
+
+    @classmethod
+    def canonical_id(cls, entity_id: str) -> str:
+        """Return the ID of an entity (package or group) given its ID or name.
+
+        Unknown identifiers are returned unchanged.
+        """
+        return entity_ids_by_names([entity_id]).get(entity_id, entity_id)
+
+    @classmethod
+    def canonicalize(cls, limit: int) -> int:
+        """Replace entity names stored in the table with entity IDs.
+
+        At most `limit` relations are processed, so the method must be called
+        until it returns 0 in order to convert the whole table. Both columns
+        of every processed relation are converted at once. Values that are IDs
+        of any entity are kept, even if they are names of entities as well, so
+        every processed relation is changed.
+
+        Returns:
+            Number of processed relations.
+        """
+        ids = sa.union(sa.select(model.Package.id), sa.select(model.Group.id))
+        names = sa.union(
+            sa.select(model.Package.name).where(model.Package.name.notin_(ids)),
+            sa.select(model.Group.name).where(model.Group.name.notin_(ids)),
+        )
+        relations = (
+            model.Session.query(cls)
+            .filter(
                 sa.or_(
-                    cls.object_id == object_class.id,
-                    cls.object_id == object_class.name,
+                    cls.subject_id.in_(names),
+                    cls.object_id.in_(names),
                 ),
             )
+            .limit(limit)
+            .all()
+        )
 
-            if object_type:
-                q = q.filter(object_class.type == object_type)
+        values = {rel.subject_id for rel in relations} | {
+            rel.object_id for rel in relations
+        }
+        known_ids = entity_names_by_ids(values)
+        resolved = entity_ids_by_names(values)
+        changes: list[tuple[Relationship, str, str]] = [
+            (rel, key, resolved[value])
+            for rel in relations
+            for key, value in (
+                ("subject_id", rel.subject_id),
+                ("object_id", rel.object_id),
+            )
+            if value in resolved and value not in known_ids
+        ]
 
-        if relation_type:
-            q = q.filter(cls.relation_type == relation_type)
+        _apply_identifier_changes(changes)
+        return len(relations)
+
+    @classmethod
+    def rename_entity(cls, old_name: str, entity_id: str):
+        """Replace the old name of renamed entity with its ID."""
+        changes: list[tuple[Relationship, str, str]] = []
+
+        for column in (cls.subject_id, cls.object_id):
+            changes.extend(
+                (rel, column.key, entity_id)
+                for rel in model.Session.query(cls).filter(column == old_name)
+            )
+
+        _apply_identifier_changes(changes)
+
+
+def _apply_identifier_changes(changes: list[tuple[Relationship, str, str]]):
+    """Set new values of identifier columns. Relations that would duplicate
+    already existing ones are removed instead.
+    """
+    if not changes:
+        return
+
+    relations: dict[str, Relationship] = {}
+    targets: dict[str, tuple[str, str, str]] = {}
+    for rel, key, value in changes:
+        relations[rel.id] = rel
+        subject_id, object_id, relation_type = targets.get(
+            rel.id,
+            (rel.subject_id, rel.object_id, rel.relation_type),
+        )
+        if key == "subject_id":
+            subject_id = value
+        else:
+            object_id = value
+        targets[rel.id] = (subject_id, object_id, relation_type)
+
+    existing = {
+        tuple(row)
+        for row in model.Session.query(
+            Relationship.subject_id,
+            Relationship.object_id,
+            Relationship.relation_type,
+        ).filter(
+            sa.tuple_(
+                Relationship.subject_id,
+                Relationship.object_id,
+                Relationship.relation_type,
+            ).in_(list(set(targets.values()))),
+            Relationship.id.notin_(list(targets)),
+        )
+    }
+
+    invalidate_cache(
+        *{rel.subject_id for rel in relations.values()},
+        *{subject_id for subject_id, _object_id, _type in targets.values()},
+    )
+
+    with model.Session.no_autoflush:
+        for rel_id, triple in targets.items():
+            rel = relations[rel_id]
+            if triple in existing:
+                model.Session.delete(rel)
+                continue
+
+            existing.add(triple)
+            rel.subject_id, rel.object_id, _relation_type = triple
+
+
+RELATIONS_ORDER = ("created_at", "object_id")
+
+
+def sort_key(relation: dict[str, Any], order_by: str) -> list[Any]:
+    """Return JSON-serializable sort key of the relation."""
+    return [relation[order_by], relation["id"]]
+
+
+def relations_page(
+    stmt: Any,
+    limit: int,
+    offset: int = 0,
+    after: list[Any] | None = None,
+    order_by: str = "created_at",
+) -> tuple[list[dict[str, Any]], int]:
+    """Return a page of relations and their total number.
+
+    Relations are sorted by `order_by` column, one of `RELATIONS_ORDER`, and
+    ID. Rows are read without building ORM entities.
+
+    Args:
+        stmt: SELECT of relations, built by `Relationship.subject_select`.
+        limit: maximum number of relations.
+        offset: number of relations to skip.
+        after: sort key of the relation that precedes the page, as returned
+            by `sort_key`.
+        order_by: sort column.
+    """
+    total = model.Session.execute(
+        sa.select(sa.func.count()).select_from(stmt.subquery()),
+    ).scalar_one()
+
+    page = _order_after(stmt, order_by, after).offset(offset).limit(limit)
+    return [_row_as_dict(row) for row in model.Session.execute(page)], total
+
+
+def relations_exist(stmt: Any, object_id: str | None = None) -> bool:
+    """Check whether `stmt` selects at least one relation.
+
+    Args:
+        stmt: SELECT of relations, built by `Relationship.subject_select`.
+        object_id: ID or name of the object that must be related.
+    """
+    if object_id:
+        [object_identifiers] = entity_identifiers(object_id)
+        stmt = stmt.where(Relationship.object_id.in_(object_identifiers))
 
-        return q.all()
+    return model.Session.execute(
+        sa.select(stmt.with_only_columns(Relationship.id).exists()),
+    ).scalar_one()
 
 
-def _entity_name_by_id(entity_id: str) -> str | None:
-    """Returns the name of an entity (package or group) given its ID."""
-    if not entity_id:
-        return None
+def iter_relations(
+    stmt: Any,
+    order_by: str = "created_at",
+    batch_size: int = 1000,
+) -> Iterator[dict[str, Any]]:
+    """Yield all relations selected by `stmt` sorted by `order_by` and ID.
 
-    pkg = (
-        model.Session.query(model.Package)
-        .filter(model.Package.id == entity_id)
-        .one_or_none()
+    Relations are fetched in batches, every batch starts after the last
+    relation of the previous one, so memory usage does not depend on the
+    number of relations.
+    """
+    after = None
+    while True:
+        rows = [
+            _row_as_dict(row)
+            for row in model.Session.execute(
+                _order_after(stmt, order_by, after).limit(batch_size),
+            )
+        ]
+        yield from rows
+
+        if len(rows) < batch_size:
+            return
+        after = sort_key(rows[-1], order_by)
+
+
+def _order_after(stmt: Any, order_by: str, after: list[Any] | None) -> Any:
+    """Sort relations by `order_by` column and ID, starting after `after` key."""
+    column = Relationship.__table__.c[order_by]
+    if after is not None:
+        value, relation_id = after
+        if order_by == "created_at" and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        stmt = stmt.where(
+            sa.tuple_(column, Relationship.id) > sa.tuple_(value, relation_id),
+        )
+
+    return stmt.order_by(column, Relationship.id)
+
+
+def _row_as_dict(row: Any) -> dict[str, Any]:
+    """Serialize row of relation table the same way as `Relationship.as_dict`."""
+    return {
+        "id": row.id,
+        "subject_id": row.subject_id,
+        "object_id": row.object_id,
+        "relation_type": row.relation_type,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "extras": row.extras,
+    }
+
+
+_INVALIDATED = "relationship_invalidated_subjects"
+
+# flag of the session, set when relations were changed within the transaction
+RELATIONS_CHANGED = "relationship_relations_changed"
+
+
+def invalidate_cache(*entity_ids: str):
+    """Drop cached relations of entities.
+
+    Entities may be referenced either by ID or by name, and cached relations
+    are dropped for both. Entries are dropped once again when the transaction
+    ends, so that relations cached by concurrent requests before the commit
+    are not kept. The session is flagged with `RELATIONS_CHANGED`, so that the
+    in-memory snapshot of relations is not used until the transaction ends.
+    """
+    if entity_ids:
+        model.Session.info[RELATIONS_CHANGED] = True
+
+    if cache.backend() is None or not entity_ids:
+        return
+
+    ids = entity_ids_by_names(entity_ids)
+    subjects = {
+        *entity_ids,
+        *ids.values(),
+        *entity_names_by_ids(ids.values()).values(),
+    }
+    cache.invalidate(subjects)
+    model.Session.info.setdefault(_INVALIDATED, set()).update(subjects)
+
+
+@sa.event.listens_for(model.Session, "after_commit")
+def _invalidate_queued(session: Any):
+    subjects = session.info.pop(_INVALIDATED, None)
+    if subjects:
+        cache.invalidate(subjects)
+
+
+@sa.event.listens_for(model.Session, "after_soft_rollback")
+def _invalidate_rolled_back(session: Any, previous_transaction: Any):
+    # relations read within the transaction could be cached before rollback
+    if previous_transaction.parent is None:
+        _invalidate_queued(session)
+
+
+def _object_join_condition(object_class: Any) -> Any:
+    """Return condition joining relation objects with the entity table."""
+    if canonical_ids():
+        return Relationship.object_id == object_class.id
+
+    return sa.or_(
+        Relationship.object_id == object_class.id,
+        Relationship.object_id == object_class.name,
+    )
+
+
+def _identifiers_map(relations: list[dict[str, Any]]) -> dict[str, list[str]]:
+    """Return identifiers of all subjects and objects of relations."""
+    entity_ids = list(
+        {rel[key] for rel in relations for key in ("subject_id", "object_id")},
     )
-    if pkg:
-        return pkg.name
+    return dict(zip(entity_ids, entity_identifiers(*entity_ids)))
+
+
+def entity_identifiers(*entity_ids: str) -> list[list[str]]:
+    """Return values that may reference each of the entities in the relationship
+    table.
+
+    All entities are resolved with a single query.
+    """
+    if canonical_ids():
+        ids = entity_ids_by_names(entity_ids)
+        return [[ids.get(entity_id, entity_id)] for entity_id in entity_ids]
+
+    names = entity_names_by_ids(entity_ids)
+    return [
+        [entity_id, names[entity_id]] if entity_id in names else [entity_id]
+        for entity_id in entity_ids
+    ]
+
+
+def entity_names_by_ids(entity_ids: Iterable[str]) -> dict[str, str]:
+    """Return names of packages and groups given their IDs.
+
+    Results are memoized until the end of the current transaction.
+
+    Returns:
+        Mapping of entity ID to entity name. Unknown IDs are not included.
+    """
+    return _resolve_entities(entity_ids, by_name=False)
+
+
+def entity_ids_by_names(identifiers: Iterable[str]) -> dict[str, str]:
+    """Return IDs of packages and groups given their IDs or names.
+
+    Results are memoized until the end of the current transaction.
 
-    group = (
-        model.Session.query(model.Group)
-        .filter(model.Group.id == entity_id)
-        .one_or_none()
+    Returns:
+        Mapping of identifier to entity ID. Unknown identifiers are not
+        included.
+    """
+    return _resolve_entities(identifiers, by_name=True)
+
+
+_ENTITY_NAMES = "relationship_entity_names"
+_ENTITY_IDS = "relationship_entity_ids"
+
+
+def _resolve_entities(values: Iterable[str], by_name: bool) -> dict[str, str]:
+    """Resolve values against package and group tables using one UNION query.
+
+    Packages take precedence over groups when both match the same value.
+    """
+    values = [value for value in values if value]
+    memo: dict[str, str] = model.Session.info.setdefault(
+        _ENTITY_IDS if by_name else _ENTITY_NAMES,
+        {},
     )
-    if group:
-        return group.name
+
+    missing = {value for value in values if value not in memo}
+    if missing:
+        missing_values = list(missing)
+        selects: list[Any] = []
+        for priority, entity_class in enumerate((model.Group, model.Package)):
+            condition = entity_class.id.in_(missing_values)
+            if by_name:
+                condition = sa.or_(condition, entity_class.name.in_(missing_values))
+
+            selects.append(
+                sa.select(
+                    entity_class.id,
+                    entity_class.name,
+                    sa.literal_column(str(priority)).label("priority"),
+                ).where(condition),
+            )
+
+        stmt = sa.union_all(*selects).order_by("priority")
+        for entity_id, name, _priority in model.Session.execute(stmt):
+            if not by_name:
+                memo[entity_id] = name
+                continue
+
+            for value in (entity_id, name):
+                if value in missing:
+                    memo[value] = entity_id
+
+    return {value: memo[value] for value in values if value in memo}
+
+
+@sa.event.listens_for(model.Session, "after_commit")
+@sa.event.listens_for(model.Session, "after_rollback")
+def _forget_entities(session: Any):
+    session.info.pop(_ENTITY_NAMES, None)
+    session.info.pop(_ENTITY_IDS, None)
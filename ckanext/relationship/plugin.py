@@ -1,19 +1,15 @@
 from __future__ import annotations
 
-import contextlib
-from typing import Any, cast
+from typing import Any
 
 import ckan.plugins.toolkit as tk
 from ckan import plugins as p
 from ckan.common import CKANConfig
-from ckan.lib.search import rebuild
-from ckan.logic import NotFound
 from ckan.types import Context
 
-import ckanext.scheming.helpers as sch
-
-from ckanext.relationship import helpers, utils, views
+from ckanext.relationship import cli, helpers, indexing, utils, views
 from ckanext.relationship.logic import action, auth, validators
+from ckanext.relationship.model.relationship import invalidate_cache
 
 
 class RelationshipPlugin(p.SingletonPlugin):
@@ -24,12 +20,14 @@ class RelationshipPlugin(p.SingletonPlugin):
     p.implements(p.ITemplateHelpers)
     p.implements(p.IBlueprint)
     p.implements(p.IPackageController, inherit=True)
+    p.implements(p.IClick)
 
     # IConfigurer
     def update_config(self, config_: CKANConfig):
         tk.add_template_directory(config_, "templates")
         tk.add_public_directory(config_, "public")
         tk.add_resource("assets", "relationship")
+        utils.clear_relation_fields()
 
     # IActions
     def get_actions(self):
@@ -51,6 +49,10 @@ class RelationshipPlugin(p.SingletonPlugin):
     def get_blueprint(self):
         return views.get_blueprints()
 
+    # IClick
+    def get_commands(self):
+        return cli.get_commands()
+
     # IPackageController
     def after_dataset_create(self, context: Context, pkg_dict: dict[str, Any]):
         context = context.copy()
@@ -67,6 +69,8 @@ class RelationshipPlugin(p.SingletonPlugin):
         context.pop("__auth_audit", None)
 
         subject_id = pkg_dict["id"]
+        # the subtree must be collected while relations still exist
+        indexing.rebuild_hierarchy_later([subject_id], [subject_id])
 
         relations_ids_list = tk.get_action("relationship_relations_ids_list")(
             context,
@@ -79,46 +83,48 @@ class RelationshipPlugin(p.SingletonPlugin):
                 {"subject_id": subject_id, "object_id": object_id},
             )
 
-            with contextlib.suppress(NotFound):
-                rebuild(object_id)
-        rebuild(subject_id)
+        invalidate_cache(subject_id)
+        indexing.rebuild_later(*relations_ids_list, subject_id)
 
     def before_dataset_index(self, pkg_dict: dict[str, Any]):
         pkg_id = pkg_dict["id"]
-        pkg_type = pkg_dict["type"]
-        schema = cast(
-            "dict[str, Any] | None", sch.scheming_get_schema("dataset", pkg_type)
-        )
-        if not schema:
+        fields = utils.get_relation_fields(pkg_dict["type"])
+        if not fields:
             return pkg_dict
-        relations_info = utils.get_relations_info(pkg_type)
+
+        prefetched = indexing.prefetched_relations(pkg_id)
         for (
             related_entity,
             related_entity_type,
             relation_type,
-        ) in relations_info:
-            relations_ids = tk.get_action("relationship_relations_ids_list")(
-                {},
-                {
-                    "subject_id": pkg_id,
-                    "object_entity": related_entity,
-                    "object_type": related_entity_type,
-                    "relation_type": relation_type,
-                },
-            )
+        ), field in fields.items():
+            if prefetched is None:
+                relations_ids = tk.get_action("relationship_relations_ids_list")(
+                    {},
+                    {
+                        "subject_id": pkg_id,
+                        "object_entity": related_entity,
+                        "object_type": related_entity_type,
+                        "relation_type": relation_type,
+                    },
+                )
+            else:
+                relations_ids = prefetched.get(
+                    (
+                        "group" if related_entity == "organization" else related_entity,
+                        related_entity_type,
+                        relation_type,
+                    ),
+                    [],
+                )
 
             if not relations_ids:
                 continue
-            field = utils.get_relation_field(
-                pkg_type,
-                related_entity,
-                related_entity_type,
-                relation_type,
-            )
             pkg_dict[f"vocab_{field['field_name']}"] = relations_ids
 
             pkg_dict.pop(field["field_name"], None)
 
+        _index_hierarchy(pkg_dict, {relation_type for _, _, relation_type in fields})
         return pkg_dict
 
     # CKAN < 2.10 hooks
@@ -145,27 +151,50 @@ def _update_relations(context: Context, pkg_dict: dict[str, Any]):
     del_relations = pkg_dict.get("del_relations", [])
     if not add_relations and not del_relations:
         return pkg_dict
-    for object_id, relation_type in del_relations + add_relations:
-        if (object_id, relation_type) in add_relations:
-            tk.get_action("relationship_relation_create")(
-                context,
+
+    delete_context = context.copy()
+    delete_context["defer_commit"] = True
+    tk.get_action("relationship_relations_delete_bulk")(
+        delete_context,
+        {
+            "relations": [
                 {
                     "subject_id": subject_id,
                     "object_id": object_id,
                     "relation_type": relation_type,
-                },
-            )
-        else:
-            tk.get_action("relationship_relation_delete")(
-                context,
+                }
+                for object_id, relation_type in del_relations
+                if (object_id, relation_type) not in add_relations
+            ],
+        },
+    )
+    tk.get_action("relationship_relations_create_bulk")(
+        context,
+        {
+            "relations": [
                 {
                     "subject_id": subject_id,
                     "object_id": object_id,
                     "relation_type": relation_type,
-                },
-            )
-
-        with contextlib.suppress(NotFound):
-            rebuild(object_id)
-    rebuild(subject_id)
+                }
+                for object_id, relation_type in add_relations
+            ],
+        },
+    )
+
+    indexing.rebuild_later(
+        *[object_id for object_id, _relation_type in del_relations + add_relations],
+        subject_id,
+    )
     return pkg_dict
+
+
+def _index_hierarchy(pkg_dict: dict[str, Any], relation_types: set[str]):
+    """Add transitive ancestors and descendants of the dataset."""
+    if not relation_types & indexing.HIERARCHY_FIELDS.keys():
+        return
+
+    relatives = indexing.hierarchy_of(pkg_dict["id"])
+    for relation_type, index_field in indexing.HIERARCHY_FIELDS.items():
+        if relation_type in relation_types and relatives.get(relation_type):
+            pkg_dict[index_field] = relatives[relation_type]
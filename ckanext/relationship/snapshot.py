@@ -0,0 +1,718 @@
+"""Optional in-memory snapshot of all relations.
+
+Relations are kept in a compressed sparse row layout. Identifiers of entities
+are interned into integer nodes and relations of every subject occupy a
+contiguous range of flat arrays with objects, relation types and creation
+times. IDs of relations are packed into 16 bytes each and only non-empty
+extras are kept, in a separate mapping.
+
+The snapshot is enabled by `ckanext.relationship.snapshot.enabled` and
+requires the change log, enabled by `ckan relationship enable-change-log`.
+Every process loads it on first use and then applies changes from the change
+log at most every `ckanext.relationship.snapshot.refresh_interval` seconds. Applied
+changes are kept aside of the arrays; when there are too many of them, the
+snapshot is loaded from scratch.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Tuple, Union
+
+import sqlalchemy as sa
+
+from ckan import model
+
+from ckanext.relationship import config
+from ckanext.relationship.model import change_log
+from ckanext.relationship.model.graph import breadth_first
+from ckanext.relationship.model.relationship import (
+    RELATIONS_CHANGED,
+    Relationship,
+)
+
+log = logging.getLogger(__name__)
+
+RELATION_TYPES = ("related_to", "child_of", "parent_of")
+ENTITIES = ("", "package", "group")
+
+# share of changed relations that makes the snapshot load from scratch
+RELOAD_RATIO = 0.1
+
+BATCH_SIZE = 10000
+
+_KINDS = {relation_type: kind for kind, relation_type in enumerate(RELATION_TYPES)}
+# naive, like values of the created_at column
+_EPOCH = datetime(1970, 1, 1)  # noqa: DTZ001
+_MICROSECOND = timedelta(microseconds=1)
+
+# position of a loaded relation or dictionary of a relation added later
+Ref = Union[int, Dict[str, Any]]
+# (ID, object node, relation type) of a relation, unique for its subject
+Key = Tuple[str, int, int]
+
+
+class Overlay(NamedTuple):
+    """Relations changed after the snapshot was loaded, by the subject node."""
+
+    added: dict[int, dict[Key, dict[str, Any]]]
+    removed: dict[int, set[Key]]
+
+
+class RelationIds:
+    """IDs of relations packed into 16 bytes each.
+
+    IDs that are not UUIDs in their canonical form are kept as they are.
+    """
+
+    def __init__(self):
+        self.packed = bytearray()
+        self.other: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.packed) // 16
+
+    def __getitem__(self, position: int) -> str:
+        if position in self.other:
+            return self.other[position]
+
+        start = position * 16
+        return str(uuid.UUID(bytes=bytes(self.packed[start : start + 16])))
+
+    def append(self, relation_id: str):
+        try:
+            packed = uuid.UUID(relation_id).bytes
+        except ValueError:
+            packed = None
+
+        if packed is None or str(uuid.UUID(bytes=packed)) != relation_id:
+            self.other[len(self)] = relation_id
+            packed = bytes(16)
+
+        self.packed += packed
+
+
+class Snapshot:
+    """Relations of all entities.
+
+    Relations of the node `n` are stored at positions from `starts[n]` up to
+    `ends[n]` of `objects`, `kinds`, `created` and `ids`. Relations created
+    or removed after the snapshot was loaded are kept in `overlay`.
+
+    Refresh runs while other threads read the snapshot. It replaces `overlay`
+    as a whole instead of changing it, and readers take it once for relations
+    of every subject. Nodes of new identifiers are appended in place, which
+    is safe because every append is atomic under the GIL and a new node is
+    published in `nodes` only after it has a slot in every array. The node is
+    described before the new overlay makes relations that reference it
+    visible.
+    """
+
+    def __init__(self):
+        # interned identifiers of entities
+        self.names: list[str] = []
+        self.nodes: dict[str, int] = {}
+
+        # the entity referenced by every node: index of ENTITIES, index of its
+        # type in `types` and the node of the entity ID
+        self.entities = array("b")
+        self.entity_types = array("i")
+        self.canonical = array("i")
+        self.types: list[str] = []
+        # nodes of entities referenced both by ID and by name
+        self.aliases: dict[int, list[int]] = {}
+
+        self.starts = array("i")
+        self.ends = array("i")
+        self.objects = array("i")
+        self.kinds = array("b")
+        self.created = array("q")
+        self.ids = RelationIds()
+        self.extras: dict[int, dict[str, Any]] = {}
+
+        self.overlay = Overlay({}, {})
+
+        # changes of this transaction and later ones may be not applied yet,
+        # they are applied again on refresh
+        self.since = 0
+        self.refreshed_at = time.monotonic()
+
+    @classmethod
+    def load(cls) -> Snapshot:
+        """Read the whole relationship table, streaming it in batches."""
+        snapshot = cls()
+        snapshot.since = change_log.horizon()
+
+        table = Relationship.__table__
+        snapshot.extend(
+            model.Session.execute(
+                sa.select(*table.c)
+                .order_by(table.c.subject_id)
+                .execution_options(stream_results=True, max_row_buffer=BATCH_SIZE),
+            ),
+        )
+        snapshot.describe()
+
+        log.info(
+            "Loaded snapshot of %s relations between %s entities",
+            len(snapshot.objects),
+            len(snapshot.names),
+        )
+        return snapshot
+
+    def extend(self, rows: Iterable[Any]):
+        """Store relations. Relations of every subject must be adjacent."""
+        subject = None
+        node = 0
+        for row in rows:
+            if row.subject_id != subject:
+                if subject is not None:
+                    self.ends[node] = len(self.objects)
+                subject = row.subject_id
+                node = self._intern(subject)
+                self.starts[node] = len(self.objects)
+
+            if row.extras:
+                self.extras[len(self.objects)] = row.extras
+            self.objects.append(self._intern(row.object_id))
+            self.kinds.append(_KINDS[row.relation_type])
+            self.created.append((row.created_at - _EPOCH) // _MICROSECOND)
+            self.ids.append(row.id)
+
+        if subject is not None:
+            self.ends[node] = len(self.objects)
+
+    def describe(self, identifiers: list[str] | None = None):
+        """Find entities referenced by identifiers with a single query.
+
+        All identifiers of the relationship table are described if
+        `identifiers` are not provided.
+        """
+        values: Any = identifiers
+        if values is None:
+            rel = Relationship.__table__
+            identifiers_cte = sa.union(
+                sa.select(rel.c.subject_id.label("identifier")),
+                sa.select(rel.c.object_id),
+            ).cte("identifiers")
+            values = sa.select(identifiers_cte.c.identifier)
+        elif not values:
+            return
+
+        stmt = sa.union_all(
+            *[
+                sa.select(
+                    sa.literal(entity).label("entity"),
+                    table.c.id,
+                    table.c.name,
+                    table.c.type,
+                ).where(sa.or_(table.c.id.in_(values), table.c.name.in_(values)))
+                for entity, table in (
+                    ("group", model.group_table),
+                    ("package", model.package_table),
+                )
+            ],
+        ).order_by("entity")
+
+        # packages take precedence over groups, as in `entity_ids_by_names`
+        for entity, entity_id, name, entity_type in model.Session.execute(stmt):
+            self.add_entity(entity, entity_id, name, entity_type)
+
+    def add_entity(
+        self,
+        entity: str,
+        entity_id: str,
+        name: str,
+        entity_type: str | None,
+    ):
+        """Describe the entity referenced by its ID or name."""
+        canonical = self._intern(entity_id)
+        nodes = [canonical]
+        if name in self.nodes and self.nodes[name] != canonical:
+            nodes.append(self.nodes[name])
+            self.aliases[canonical] = nodes
+
+        if entity_type is None:
+            type_index = -1
+        elif entity_type in self.types:
+            type_index = self.types.index(entity_type)
+        else:
+            type_index = len(self.types)
+            self.types.append(entity_type)
+
+        for node in nodes:
+            self.entities[node] = ENTITIES.index(entity)
+            self.entity_types[node] = type_index
+            self.canonical[node] = canonical
+
+    def _intern(self, identifier: str) -> int:
+        node = self.nodes.get(identifier)
+        if node is not None:
+            return node
+
+        # readers may use the node as soon as it is in `names` or `nodes`
+        node = len(self.names)
+        self.entities.append(0)
+        self.entity_types.append(-1)
+        self.canonical.append(node)
+        self.starts.append(0)
+        self.ends.append(0)
+        self.names.append(identifier)
+        self.nodes[identifier] = node
+        return node
+
+    def node(self, entity_id: str) -> int | None:
+        """Return the node of the entity ID, given its ID or name."""
+        node = self.nodes.get(entity_id)
+        if node is None:
+            node = self.nodes.get(Relationship.canonical_id(entity_id))
+
+        return None if node is None else self.canonical[node]
+
+    def relations(
+        self,
+        subject_id: str,
+        object_entity: str | None = None,
+        object_type: str | None = None,
+        relation_type: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Return relations of the subject like `Relationship.by_subject_id`,
+        sorted by creation time and ID.
+        """
+        relations = [
+            self._as_dict(subject, obj, kind, ref)
+            for subject, obj, kind, ref in self._filtered(
+                subject_id,
+                object_entity,
+                object_type,
+                relation_type,
+            )
+        ]
+        relations.sort(key=lambda rel: _order_key(rel, "created_at"))
+        return relations
+
+    def object_ids(
+        self,
+        subject_id: str,
+        object_entity: str | None = None,
+        object_type: str | None = None,
+        relation_type: str | None = None,
+    ) -> list[str]:
+        """Return distinct IDs of objects related to the subject, sorted."""
+        return sorted(
+            {
+                self.names[obj]
+                for _subject, obj, _kind, _ref in self._filtered(
+                    subject_id,
+                    object_entity,
+                    object_type,
+                    relation_type,
+                )
+            },
+        )
+
+    def counts(
+        self,
+        subject_id: str,
+        object_entity: str | None = None,
+        object_type: str | None = None,
+        relation_type: str | None = None,
+    ) -> dict[tuple[str, str, str], int]:
+        """Return number of relations like `Relationship.count_by_subject_id`."""
+        node = self.node(subject_id)
+        if node is None:
+            return {}
+
+        counts: Counter[tuple[str, str, str]] = Counter()
+        for _subject, obj, kind, _ref in self._edges(node, relation_type):
+            entity = ENTITIES[self.entities[obj]]
+            entity_type = self._type(obj)
+            if not entity or object_entity and entity != object_entity:
+                continue
+            if object_type and entity_type != object_type:
+                continue
+
+            counts[(entity, entity_type, RELATION_TYPES[kind])] += 1
+
+        return dict(counts)
+
+    def traverse(
+        self,
+        entity_id: str,
+        relation_types: list[str],
+        max_depth: int,
+    ) -> list[dict[str, Any]]:
+        """Return relations reachable from the entity like `graph.traverse`.
+
+        Entities are visited breadth-first, so every relation is reported at
+        the depth of the shortest path to it, and it is a `cycle` if it leads
+        back to an entity of this path.
+        """
+        start = self.node(entity_id)
+        if start is None:
+            return []
+
+        found = breadth_first(
+            start,
+            relation_types,
+            max_depth,
+            lambda node, relation_type: sorted(
+                {
+                    self.canonical[obj]
+                    for _subject, obj, _kind, _ref in self._edges(node, relation_type)
+                },
+                key=self.names.__getitem__,
+            ),
+        )
+        return [
+            {
+                "subject_id": self.names[node],
+                "object_id": self.names[target],
+                "relation_type": relation_type,
+                "depth": depth,
+                "cycle": cycle,
+            }
+            for (node, target, relation_type), (depth, cycle) in sorted(
+                found.items(),
+                key=lambda item: (*item[1], item[0][2], self.names[item[0][1]]),
+            )
+        ]
+
+    def iter_relations(self) -> Iterator[tuple[str, str, str, str]]:
+        """Yield subject, ID, object and type of every relation, sorted by
+        subject and ID.
+        """
+        subjects = {
+            node
+            for node in range(len(self.names))
+            if self.ends[node] > self.starts[node]
+        }
+        subjects.update(self.overlay.added)
+
+        for subject in sorted(subjects, key=self.names.__getitem__):
+            relations = sorted(
+                (
+                    self.ids[ref] if isinstance(ref, int) else ref["id"],
+                    self.names[obj],
+                    RELATION_TYPES[kind],
+                )
+                for _subject, obj, kind, ref in self._stored_edges(subject, None)
+            )
+            for relation_id, object_id, relation_type in relations:
+                yield self.names[subject], relation_id, object_id, relation_type
+
+    def refresh(self):
+        """Apply changes logged since the previous refresh."""
+        horizon = change_log.horizon()
+        overlay = self.overlay
+        added = {
+            subject: dict(relations) for subject, relations in overlay.added.items()
+        }
+        removed = {subject: set(keys) for subject, keys in overlay.removed.items()}
+        known = len(self.names)
+
+        for change in change_log.since(self.since):
+            subject = self._intern(change.subject_id)
+            key = (
+                change.relation_id,
+                self._intern(change.object_id),
+                _KINDS[change.relation_type],
+            )
+
+            relation = {
+                "id": change.relation_id,
+                "subject_id": change.subject_id,
+                "object_id": change.object_id,
+                "relation_type": change.relation_type,
+                "created_at": change.created_at.isoformat()
+                if change.created_at
+                else None,
+                "extras": change.extras or {},
+            }
+            if change.operation in ("insert", "update"):
+                loaded = self._loaded(subject, key)
+                # updated relations replace loaded ones, values and all
+                if change.operation == "update" and loaded:
+                    removed.setdefault(subject, set()).add(key)
+                if not loaded or key in removed.get(subject, ()):
+                    added.setdefault(subject, {})[key] = relation
+            elif key in added.get(subject, {}):
+                del added[subject][key]
+            elif self._loaded(subject, key):
+                removed.setdefault(subject, set()).add(key)
+
+        self.describe(self.names[known:])
+        self.overlay = Overlay(added, removed)
+        self.since = horizon
+        self.refreshed_at = time.monotonic()
+
+    def changes(self) -> int:
+        """Return number of relations changed since the snapshot was loaded."""
+        overlay = self.overlay
+        return sum(map(len, overlay.added.values())) + sum(
+            map(len, overlay.removed.values()),
+        )
+
+    def outdated(self) -> bool:
+        return (
+            time.monotonic() - self.refreshed_at >= config.snapshot_refresh_interval()
+        )
+
+    def expire(self):
+        """Refresh the snapshot on the next use."""
+        self.refreshed_at = float("-inf")
+
+    def _type(self, node: int) -> str | None:
+        type_index = self.entity_types[node]
+        return self.types[type_index] if type_index >= 0 else None
+
+    def _filtered(
+        self,
+        subject_id: str,
+        object_entity: str | None,
+        object_type: str | None,
+        relation_type: str | None,
+    ) -> Iterator[tuple[int, int, int, Ref]]:
+        """Yield relations of the subject with the same filters as
+        `Relationship.subject_select`.
+        """
+        node = self.node(subject_id)
+        if node is None:
+            return
+
+        for edge in self._edges(node, relation_type):
+            obj = edge[1]
+            if object_entity and ENTITIES[self.entities[obj]] != object_entity:
+                continue
+            if object_entity and object_type and self._type(obj) != object_type:
+                continue
+            yield edge
+
+    def _edges(
+        self,
+        node: int,
+        relation_type: str | None,
+    ) -> Iterator[tuple[int, int, int, Ref]]:
+        """Yield relations stored under every identifier of the entity."""
+        for subject in self.aliases.get(node, [node]):
+            yield from self._stored_edges(subject, relation_type)
+
+    def _stored_edges(
+        self,
+        subject: int,
+        relation_type: str | None,
+    ) -> Iterator[tuple[int, int, int, Ref]]:
+        """Yield subject, object, type and reference of relations stored under
+        the identifier.
+        """
+        kind_filter = None if relation_type is None else _KINDS[relation_type]
+        overlay = self.overlay
+        removed = overlay.removed.get(subject)
+
+        for position in range(self.starts[subject], self.ends[subject]):
+            kind = self.kinds[position]
+            if kind_filter is not None and kind != kind_filter:
+                continue
+
+            obj = self.objects[position]
+            if removed and (self.ids[position], obj, kind) in removed:
+                continue
+            yield subject, obj, kind, position
+
+        for (_id, obj, kind), relation in overlay.added.get(subject, {}).items():
+            if kind_filter is None or kind == kind_filter:
+                yield subject, obj, kind, relation
+
+    def _loaded(self, subject: int, key: Key) -> bool:
+        """Check whether the relation is stored in the arrays."""
+        relation_id, obj, kind = key
+        return any(
+            self.objects[position] == obj
+            and self.kinds[position] == kind
+            and self.ids[position] == relation_id
+            for position in range(self.starts[subject], self.ends[subject])
+        )
+
+    def _as_dict(self, subject: int, obj: int, kind: int, ref: Ref) -> dict[str, Any]:
+        """Serialize relation the same way as `Relationship.as_dict`."""
+        if not isinstance(ref, int):
+            return dict(ref)
+
+        return {
+            "id": self.ids[ref],
+            "subject_id": self.names[subject],
+            "object_id": self.names[obj],
+            "relation_type": RELATION_TYPES[kind],
+            "created_at": (_EPOCH + self.created[ref] * _MICROSECOND).isoformat(),
+            "extras": dict(self.extras.get(ref, {})),
+        }
+
+
+def _order_key(relation: dict[str, Any], order_by: str) -> tuple[Any, str]:
+    value = relation[order_by]
+    if order_by == "created_at" and isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value, relation["id"]
+
+
+def page(
+    relations: list[dict[str, Any]],
+    limit: int,
+    offset: int = 0,
+    after: list[Any] | None = None,
+    order_by: str = "created_at",
+) -> tuple[list[dict[str, Any]], int]:
+    """Return a page of relations and their total number like
+    `relations_page` does for the table.
+    """
+    ordered = sorted(relations, key=lambda rel: _order_key(rel, order_by))
+    if after is not None:
+        value, relation_id = after
+        after_key = _order_key({order_by: value, "id": relation_id}, order_by)
+        ordered = [rel for rel in ordered if _order_key(rel, order_by) > after_key]
+
+    return ordered[offset : offset + limit], len(relations)
+
+
+def check(snapshot: Snapshot) -> tuple[list[str], list[str]]:
+    """Compare the snapshot with the relationship table.
+
+    The table is streamed in the same order as relations of the snapshot, so
+    it is never loaded into memory as a whole.
+
+    Returns:
+        IDs of relations that are missing from the snapshot and IDs of
+        relations that are only in the snapshot. A relation whose subject,
+        object or type differs is reported in both lists.
+    """
+    table = Relationship.__table__
+    stored = (
+        tuple(row)
+        for row in model.Session.execute(
+            sa.select(
+                table.c.subject_id,
+                table.c.id,
+                table.c.object_id,
+                table.c.relation_type,
+            )
+            # byte order of strings, the same as the order of Python strings
+            .order_by(table.c.subject_id.collate("C"), table.c.id.collate("C"))
+            .execution_options(stream_results=True, max_row_buffer=BATCH_SIZE),
+        )
+    )
+    loaded = snapshot.iter_relations()
+
+    missing: list[str] = []
+    unexpected: list[str] = []
+    row = next(stored, None)
+    relation = next(loaded, None)
+    while row is not None or relation is not None:
+        if relation is None or row is not None and row[:2] < relation[:2]:
+            missing.append(row[1])  # pyright: ignore[reportOptionalSubscript]
+            row = next(stored, None)
+        elif row is None or relation[:2] < row[:2]:
+            unexpected.append(relation[1])
+            relation = next(loaded, None)
+        else:
+            if row != relation:
+                missing.append(row[1])
+                unexpected.append(relation[1])
+            row = next(stored, None)
+            relation = next(loaded, None)
+
+    return missing, unexpected
+
+
+_lock = threading.Lock()
+_snapshot: Snapshot | None = None
+# the last time the snapshot was not loaded because the change log is disabled
+_unlogged_at = float("-inf")
+
+
+def enabled() -> bool:
+    return config.snapshot()
+
+
+def current() -> Snapshot | None:
+    """Return the snapshot of relations, loading or refreshing it if needed.
+
+    None is returned when the snapshot is disabled, when changes of relations
+    are not logged, when relations were changed within the current
+    transaction and while the snapshot is being loaded by another thread.
+    """
+    global _snapshot  # noqa: PLW0603
+
+    if not enabled() or model.Session.info.get(RELATIONS_CHANGED):
+        return None
+
+    if _snapshot is not None and not _snapshot.outdated():
+        return _snapshot
+
+    # the log may have been disabled since the snapshot was loaded, then its
+    # changes would never reach the snapshot
+    if not _logged():
+        _snapshot = None
+        return None
+
+    # other threads keep using the previous state while it is refreshed
+    if not _lock.acquire(blocking=False):
+        return _snapshot
+
+    try:
+        if _snapshot is not None:
+            _snapshot.refresh()
+
+        if (
+            _snapshot is None
+            or _snapshot.changes() > len(_snapshot.objects) * RELOAD_RATIO
+        ):
+            _snapshot = Snapshot.load()
+    finally:
+        _lock.release()
+
+    return _snapshot
+
+
+def _logged() -> bool:
+    """Check that changes of relations are logged, at most once per refresh
+    interval while they are not.
+    """
+    global _unlogged_at  # noqa: PLW0603
+
+    if time.monotonic() - _unlogged_at < config.snapshot_refresh_interval():
+        return False
+
+    if change_log.installed():
+        return True
+
+    _unlogged_at = time.monotonic()
+    log.warning(
+        "Snapshot of relations is not used, because changes of relations are"
+        " not logged. Enable the log with `ckan relationship enable-change-log`",
+    )
+    return False
+
+
+def reset():
+    """Forget the snapshot, so that it is loaded again on the next use."""
+    global _snapshot, _unlogged_at  # noqa: PLW0603
+    _snapshot = None
+    _unlogged_at = float("-inf")
+
+
+@sa.event.listens_for(model.Session, "after_commit")
+def _expire_changed(session: Any):
+    if session.info.pop(RELATIONS_CHANGED, None) and _snapshot is not None:
+        _snapshot.expire()
+
+
+@sa.event.listens_for(model.Session, "after_soft_rollback")
+def _forget_changed(session: Any, previous_transaction: Any):
+    if previous_transaction.parent is None:
+        session.info.pop(RELATIONS_CHANGED, None)
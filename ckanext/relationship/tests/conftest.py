@@ -1,7 +1,23 @@
 import pytest
+import sqlalchemy as sa
+
+from ckan import model
 
 
 @pytest.fixture
 def clean_db(reset_db, migrate_db_for, with_plugins):
     reset_db()
     migrate_db_for("relationship")
+
+
+@pytest.fixture
+def sql_statements():
+    """Collect SQL statements executed while the fixture is active."""
+    statements: list[str] = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa.event.listen(model.meta.engine, "before_cursor_execute", collect)
+    yield statements
+    sa.event.remove(model.meta.engine, "before_cursor_execute", collect)
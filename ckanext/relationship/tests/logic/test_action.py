@@ -1,9 +1,16 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any
+
 import pytest
 
 import ckan.plugins.toolkit as tk
 from ckan.tests import factories
 from ckan.tests.helpers import call_action
 
+from ckanext.relationship import cache
 from ckanext.relationship.model.relationship import Relationship
 
 
@@ -391,6 +398,199 @@ class TestRelationDelete:
         assert not relation_straight
         assert not relation_reverse
 
+    def test_relation_delete_sql_statements(self, sql_statements):
+        """Deletion doesn't serialize datasets to resolve entity names."""
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        call_action(
+            "relationship_relation_create",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["id"],
+            object_id=object_dataset["id"],
+            relation_type="related_to",
+        )
+
+        sql_statements.clear()
+        call_action(
+            "relationship_relation_delete",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["id"],
+            object_id=object_dataset["id"],
+            relation_type="related_to",
+        )
+
+        # name resolution, forward and reverse lookups and the deletion
+        assert len(sql_statements) <= 5, sql_statements
+        assert not [stmt for stmt in sql_statements if "FROM resource" in stmt]
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRelationsCreateBulk:
+    def test_create_relations(self):
+        subject_dataset = factories.Dataset()
+        object1_dataset = factories.Dataset()
+        object2_dataset = factories.Dataset()
+
+        result = call_action(
+            "relationship_relations_create_bulk",
+            {"ignore_auth": True},
+            relations=[
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object1_dataset["id"],
+                    "relation_type": "related_to",
+                },
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object2_dataset["id"],
+                    "relation_type": "parent_of",
+                    "extras": {"key": "value"},
+                },
+            ],
+        )
+
+        assert [
+            (rel["subject_id"], rel["object_id"], rel["relation_type"])
+            for rel in result
+        ] == [
+            (subject_dataset["id"], object1_dataset["id"], "related_to"),
+            (object1_dataset["id"], subject_dataset["id"], "related_to"),
+            (subject_dataset["id"], object2_dataset["id"], "parent_of"),
+            (object2_dataset["id"], subject_dataset["id"], "child_of"),
+        ]
+        assert result[2]["extras"] == {"key": "value"}
+        assert result[3]["extras"] == {"key": "value"}
+
+        assert Relationship.by_object_id(
+            object2_dataset["id"], subject_dataset["id"], "child_of"
+        )
+
+    def test_existing_relations_are_skipped(self):
+        subject_dataset = factories.Dataset()
+        object1_dataset = factories.Dataset()
+        object2_dataset = factories.Dataset()
+
+        call_action(
+            "relationship_relation_create",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["name"],
+            object_id=object1_dataset["name"],
+            relation_type="related_to",
+        )
+
+        result = call_action(
+            "relationship_relations_create_bulk",
+            {"ignore_auth": True},
+            relations=[
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object1_dataset["id"],
+                    "relation_type": "related_to",
+                },
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object2_dataset["id"],
+                    "relation_type": "related_to",
+                },
+                {
+                    "subject_id": object2_dataset["id"],
+                    "object_id": subject_dataset["id"],
+                    "relation_type": "related_to",
+                },
+            ],
+        )
+
+        assert len(result) == 2
+        assert len(Relationship.by_subject_id(subject_dataset["id"])) == 2
+
+    def test_invalid_relation_type(self):
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_relations_create_bulk",
+                {"ignore_auth": True},
+                relations=[
+                    {
+                        "subject_id": "subject",
+                        "object_id": "object",
+                        "relation_type": "unknown",
+                    },
+                ],
+            )
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRelationsDeleteBulk:
+    def test_delete_relations(self):
+        subject_dataset = factories.Dataset()
+        object1_dataset = factories.Dataset()
+        object2_dataset = factories.Dataset()
+
+        for object_dataset, relation_type in [
+            (object1_dataset, "related_to"),
+            (object2_dataset, "child_of"),
+        ]:
+            call_action(
+                "relationship_relation_create",
+                {"ignore_auth": True},
+                subject_id=subject_dataset["id"],
+                object_id=object_dataset["id"],
+                relation_type=relation_type,
+            )
+
+        result = call_action(
+            "relationship_relations_delete_bulk",
+            {"ignore_auth": True},
+            relations=[
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object1_dataset["id"],
+                    "relation_type": "related_to",
+                },
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object2_dataset["id"],
+                },
+            ],
+        )
+
+        assert len(result) == 4
+        assert not Relationship.by_subject_id(subject_dataset["id"])
+        assert not Relationship.by_subject_id(object1_dataset["id"])
+        assert not Relationship.by_subject_id(object2_dataset["id"])
+
+    def test_other_relation_types_are_kept(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        for relation_type in ["related_to", "child_of"]:
+            call_action(
+                "relationship_relation_create",
+                {"ignore_auth": True},
+                subject_id=subject_dataset["id"],
+                object_id=object_dataset["id"],
+                relation_type=relation_type,
+            )
+
+        call_action(
+            "relationship_relations_delete_bulk",
+            {"ignore_auth": True},
+            relations=[
+                {
+                    "subject_id": subject_dataset["id"],
+                    "object_id": object_dataset["id"],
+                    "relation_type": "related_to",
+                },
+            ],
+        )
+
+        assert Relationship.by_object_id(
+            subject_dataset["id"], object_dataset["id"], "child_of"
+        )
+        assert Relationship.by_object_id(
+            object_dataset["id"], subject_dataset["id"], "parent_of"
+        )
+
 
 @pytest.mark.usefixtures("clean_db")
 class TestRelationList:
@@ -495,6 +695,169 @@ class TestRelationList:
         assert result == []
 
 
+@pytest.mark.usefixtures("clean_db")
+class TestRelationListPages:
+    @pytest.fixture()
+    def subject(self):
+        subject = factories.Dataset()
+        call_action(
+            "relationship_relations_create_bulk",
+            {"ignore_auth": True},
+            relations=[
+                {
+                    "subject_id": subject["id"],
+                    "object_id": factories.Dataset()["id"],
+                    "relation_type": "related_to",
+                }
+                for _ in range(5)
+            ],
+        )
+        return subject
+
+    def test_cursor(self, subject):
+        expected = sorted(
+            rel["object_id"]
+            for rel in call_action(
+                "relationship_relations_list", subject_id=subject["id"]
+            )
+        )
+
+        object_ids = []
+        cursor = None
+        while True:
+            page = call_action(
+                "relationship_relations_list",
+                subject_id=subject["id"],
+                order_by="object_id",
+                limit=2,
+                **({"cursor": cursor} if cursor else {}),
+            )
+            assert page["count"] == 5
+            object_ids.extend(rel["object_id"] for rel in page["results"])
+            cursor = page["next"]
+            if not cursor:
+                break
+
+        assert object_ids == expected
+
+    def test_offset(self, subject):
+        first = call_action(
+            "relationship_relations_list", subject_id=subject["id"], limit=3
+        )
+        last = call_action(
+            "relationship_relations_list",
+            subject_id=subject["id"],
+            limit=3,
+            offset=3,
+        )
+
+        assert len(first["results"]) == 3
+        assert first["next"]
+        assert len(last["results"]) == 2
+        assert last["next"] is None
+        assert not {rel["id"] for rel in first["results"]} & {
+            rel["id"] for rel in last["results"]
+        }
+
+    def test_invalid_cursor(self, subject):
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_relations_list",
+                subject_id=subject["id"],
+                limit=2,
+                cursor="invalid",
+            )
+
+    @pytest.mark.parametrize(
+        ("order_by", "values"),
+        [
+            ("created_at", [1, 2]),
+            ("created_at", [{}, "x"]),
+            ("object_id", [1, 2]),
+            ("object_id", ["x", None]),
+        ],
+    )
+    def test_cursor_values_must_be_strings(
+        self, subject, order_by: str, values: list[Any]
+    ):
+        cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_relations_list",
+                subject_id=subject["id"],
+                limit=2,
+                order_by=order_by,
+                cursor=cursor,
+            )
+
+    def test_limit_must_be_positive(self, subject):
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_relations_list",
+                subject_id=subject["id"],
+                limit=0,
+            )
+
+    def test_export(self, app, subject):
+        resp = app.get(
+            "/api/2/util/relationships/export",
+            query_string={"subject_id": subject["id"], "order_by": "object_id"},
+        )
+
+        assert resp.mimetype == "application/x-ndjson"
+        object_ids = [
+            json.loads(line)["object_id"]
+            for line in resp.get_data(as_text=True).splitlines()
+        ]
+        assert len(object_ids) == 5
+        assert object_ids == sorted(object_ids)
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestPackageShow:
+    def test_relations_are_split_between_fields(self):
+        organization = factories.Organization()
+        subject_dataset = factories.Dataset(
+            type="package-with-relationship", owner_org=organization["id"]
+        )
+        object_dataset = factories.Dataset(
+            type="package-with-relationship", owner_org=organization["id"]
+        )
+        group = factories.Group()
+
+        for object_id, relation_type in [
+            (object_dataset["id"], "related_to"),
+            (group["id"], "child_of"),
+            (factories.Dataset()["id"], "related_to"),
+        ]:
+            call_action(
+                "relationship_relation_create",
+                {"ignore_auth": True},
+                subject_id=subject_dataset["id"],
+                object_id=object_id,
+                relation_type=relation_type,
+            )
+
+        result = call_action("package_show", id=subject_dataset["id"])
+
+        assert result["related_packages"] == [object_dataset["id"]]
+        assert result["parent_groups"] == [group["id"]]
+
+    def test_relations_are_fetched_with_single_query(self, sql_statements):
+        organization = factories.Organization()
+        dataset = factories.Dataset(
+            type="package-with-relationship", owner_org=organization["id"]
+        )
+
+        sql_statements.clear()
+        call_action("package_show", id=dataset["id"])
+
+        relation_queries = [
+            stmt for stmt in sql_statements if "FROM relationship_relationship" in stmt
+        ]
+        assert len(relation_queries) == 1, sql_statements
+
+
 @pytest.mark.usefixtures("clean_db")
 class TestRelationsIdsList:
     def test_relations_ids_list(self):
@@ -535,6 +898,397 @@ class TestRelationsIdsList:
         assert object1_id in result
         assert object2_id in result
 
+    def test_only_object_ids_are_selected(self, sql_statements):
+        subject = factories.Dataset()
+        organization = factories.Organization()
+        call_action(
+            "relationship_relation_create",
+            subject_id=subject["id"],
+            object_id=organization["id"],
+            relation_type="child_of",
+        )
+
+        sql_statements.clear()
+        result = call_action(
+            "relationship_relations_ids_list",
+            subject_id=subject["id"],
+            object_entity="organization",
+            object_type="organization",
+        )
+
+        assert result == [organization["id"]]
+        [query] = [
+            stmt for stmt in sql_statements if "FROM relationship_relationship" in stmt
+        ]
+        assert "DISTINCT relationship_relationship.object_id" in query
+        assert "extras" not in query
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRelationsCount:
+    def test_counts_are_grouped(self):
+        subject = factories.Dataset()
+        group = factories.Group()
+        relations = [
+            (factories.Dataset()["id"], "related_to"),
+            (factories.Dataset()["name"], "related_to"),
+            (factories.Organization()["id"], "child_of"),
+            (group["id"], "child_of"),
+            (group["id"], "related_to"),
+        ]
+        for object_id, relation_type in relations:
+            call_action(
+                "relationship_relation_create",
+                subject_id=subject["id"],
+                object_id=object_id,
+                relation_type=relation_type,
+            )
+
+        result = call_action("relationship_relations_count", subject_id=subject["id"])
+
+        assert result == {
+            "count": 5,
+            "counts": [
+                {
+                    "object_entity": "group",
+                    "object_type": "group",
+                    "relation_type": "child_of",
+                    "count": 1,
+                },
+                {
+                    "object_entity": "group",
+                    "object_type": "group",
+                    "relation_type": "related_to",
+                    "count": 1,
+                },
+                {
+                    "object_entity": "group",
+                    "object_type": "organization",
+                    "relation_type": "child_of",
+                    "count": 1,
+                },
+                {
+                    "object_entity": "package",
+                    "object_type": "dataset",
+                    "relation_type": "related_to",
+                    "count": 2,
+                },
+            ],
+        }
+
+        assert (
+            call_action(
+                "relationship_relations_count",
+                subject_id=subject["name"],
+                object_entity="organization",
+                relation_type="child_of",
+            )["count"]
+            == 2
+        )
+
+    def test_no_relations(self):
+        assert call_action(
+            "relationship_relations_count", subject_id=factories.Dataset()["id"]
+        ) == {"count": 0, "counts": []}
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRelationExists:
+    def test_exists(self):
+        subject = factories.Dataset()
+        parent = factories.Group()
+        call_action(
+            "relationship_relation_create",
+            subject_id=subject["id"],
+            object_id=parent["id"],
+            relation_type="child_of",
+        )
+
+        assert call_action(
+            "relationship_relation_exists",
+            subject_id=subject["id"],
+            relation_type="child_of",
+        )
+        assert call_action(
+            "relationship_relation_exists",
+            subject_id=subject["id"],
+            object_id=parent["name"],
+        )
+        assert call_action(
+            "relationship_relation_exists",
+            subject_id=parent["id"],
+            relation_type="parent_of",
+        )
+        assert not call_action(
+            "relationship_relation_exists",
+            subject_id=subject["id"],
+            relation_type="parent_of",
+        )
+        assert not call_action(
+            "relationship_relation_exists",
+            subject_id=subject["id"],
+            object_entity="package",
+        )
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestTraverse:
+    def _link(self, child: str, parent: str):
+        call_action(
+            "relationship_relation_create",
+            subject_id=child,
+            object_id=parent,
+            relation_type="child_of",
+        )
+
+    def test_deep(self):
+        chain = [factories.Dataset() for _ in range(10)]
+        for child, parent in zip(chain, chain[1:]):
+            # relations stored by name are followed as well
+            self._link(child["id"], parent["name"])
+
+        ancestors = call_action(
+            "relationship_traverse",
+            entity_id=chain[0]["id"],
+            direction="ancestors",
+            max_depth=9,
+        )
+        assert [(rel["object_id"], rel["depth"]) for rel in ancestors] == [
+            (dataset["id"], depth) for depth, dataset in enumerate(chain[1:], 1)
+        ]
+        assert not any(rel["cycle"] for rel in ancestors)
+
+        descendants = call_action(
+            "relationship_traverse",
+            entity_id=chain[-1]["name"],
+            direction="descendants",
+            max_depth=3,
+        )
+        assert [rel["object_id"] for rel in descendants] == [
+            dataset["id"] for dataset in reversed(chain[-4:-1])
+        ]
+
+    def test_wide(self):
+        root = factories.Group()
+        children = [factories.Dataset() for _ in range(30)]
+        for child in children:
+            self._link(child["id"], root["id"])
+        grandchild = factories.Dataset()
+        self._link(grandchild["id"], children[0]["id"])
+
+        descendants = call_action("relationship_traverse", entity_id=root["id"])
+
+        assert {rel["object_id"] for rel in descendants if rel["depth"] == 1} == {
+            child["id"] for child in children
+        }
+        assert [
+            (rel["subject_id"], rel["object_id"])
+            for rel in descendants
+            if rel["depth"] == 2
+        ] == [(children[0]["id"], grandchild["id"])]
+
+    def test_cycle(self):
+        first, second, third = (factories.Dataset() for _ in range(3))
+        self._link(first["id"], second["id"])
+        self._link(second["id"], third["id"])
+        self._link(third["id"], first["id"])
+
+        ancestors = call_action(
+            "relationship_traverse",
+            entity_id=first["id"],
+            direction="ancestors",
+            max_depth=20,
+        )
+
+        assert [
+            (rel["subject_id"], rel["object_id"], rel["depth"], rel["cycle"])
+            for rel in ancestors
+        ] == [
+            (first["id"], second["id"], 1, False),
+            (second["id"], third["id"], 2, False),
+            (third["id"], first["id"], 3, True),
+        ]
+
+    def test_shared_ancestors(self):
+        # every group of a level is a child of both groups of the next level
+        levels = [[factories.Group() for _ in range(2)] for _ in range(12)]
+        for children, parents in zip(levels, levels[1:]):
+            for child in children:
+                for parent in parents:
+                    self._link(child["id"], parent["id"])
+
+        ancestors = call_action(
+            "relationship_traverse",
+            entity_id=levels[0][0]["id"],
+            direction="ancestors",
+            max_depth=20,
+        )
+
+        assert len(ancestors) == 2 + 2 * 2 * 10
+        assert not any(rel["cycle"] for rel in ancestors)
+        assert {rel["object_id"] for rel in ancestors if rel["depth"] == 11} == {
+            group["id"] for group in levels[-1]
+        }
+
+    def test_all_directions(self):
+        parent, child, sibling = (factories.Dataset() for _ in range(3))
+        self._link(child["id"], parent["id"])
+        self._link(sibling["id"], parent["id"])
+
+        result = call_action(
+            "relationship_traverse", entity_id=child["id"], direction="all"
+        )
+
+        # descendants of ancestors are not followed
+        assert [(rel["object_id"], rel["relation_type"]) for rel in result] == [
+            (parent["id"], "child_of"),
+        ]
+
+
+def _relate(subject_id: str, object_id: str, relation_type: str = "related_to"):
+    call_action(
+        "relationship_relation_create",
+        subject_id=subject_id,
+        object_id=object_id,
+        relation_type=relation_type,
+    )
+
+
+def _chain(path: list[dict[str, Any]]) -> list[tuple[str, str, str]]:
+    return [(rel["subject_id"], rel["object_id"], rel["relation_type"]) for rel in path]
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestPath:
+    def test_shortest_chain(self):
+        first, second, third, fourth = (factories.Dataset() for _ in range(4))
+        _relate(first["id"], second["id"])
+        _relate(second["id"], third["id"])
+        _relate(third["id"], fourth["name"])
+        # shortcut
+        _relate(fourth["id"], second["name"], "child_of")
+
+        path = call_action(
+            "relationship_path",
+            subject_id=first["name"],
+            object_id=fourth["id"],
+        )
+
+        assert _chain(path) == [
+            (first["id"], second["id"], "related_to"),
+            (second["id"], fourth["id"], "parent_of"),
+        ]
+
+    def test_relation_type(self):
+        first, second, third = (factories.Dataset() for _ in range(3))
+        _relate(first["id"], second["id"], "child_of")
+        _relate(second["id"], third["id"], "child_of")
+        _relate(first["id"], third["id"])
+
+        path = call_action(
+            "relationship_path",
+            subject_id=first["id"],
+            object_id=third["id"],
+            relation_type="child_of",
+        )
+
+        assert _chain(path) == [
+            (first["id"], second["id"], "child_of"),
+            (second["id"], third["id"], "child_of"),
+        ]
+
+    def test_max_depth(self, sql_statements):
+        chain = [factories.Dataset() for _ in range(6)]
+        for subject, object in zip(chain, chain[1:]):
+            _relate(subject["id"], object["id"])
+
+        sql_statements.clear()
+        assert (
+            call_action(
+                "relationship_path",
+                subject_id=chain[0]["id"],
+                object_id=chain[-1]["id"],
+                max_depth=4,
+            )
+            is None
+        )
+
+        # a single query per level, alternating between both ends
+        relation_queries = [
+            stmt for stmt in sql_statements if "relationship_relationship" in stmt
+        ]
+        assert len(relation_queries) == 4
+
+        path = call_action(
+            "relationship_path",
+            subject_id=chain[0]["id"],
+            object_id=chain[-1]["id"],
+        )
+        assert len(path) == 5
+
+    def test_same_entity(self):
+        dataset = factories.Dataset()
+
+        assert (
+            call_action(
+                "relationship_path",
+                subject_id=dataset["id"],
+                object_id=dataset["name"],
+            )
+            == []
+        )
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestNeighbourhood:
+    def test_hops(self):
+        center = factories.Dataset()
+        near = [factories.Dataset() for _ in range(3)]
+        far = factories.Dataset()
+        for dataset in near:
+            _relate(center["id"], dataset["id"])
+        _relate(near[0]["id"], far["id"], "parent_of")
+        _relate(far["id"], factories.Dataset()["id"])
+
+        result = call_action(
+            "relationship_neighbourhood",
+            entity_id=center["name"],
+        )
+
+        assert result["nodes"][0] == {"id": center["id"], "depth": 0}
+        assert {node["id"] for node in result["nodes"] if node["depth"] == 1} == {
+            dataset["id"] for dataset in near
+        }
+        assert [node["id"] for node in result["nodes"] if node["depth"] == 2] == [
+            far["id"],
+        ]
+        # reverse relations are not repeated
+        assert len(result["edges"]) == 4
+        assert (near[0]["id"], far["id"], "parent_of") in _chain(result["edges"])
+        assert not result["truncated"]
+
+    def test_caps(self):
+        center = factories.Dataset()
+        for _ in range(5):
+            _relate(center["id"], factories.Dataset()["id"])
+
+        result = call_action(
+            "relationship_neighbourhood",
+            entity_id=center["id"],
+            max_nodes=3,
+        )
+        assert len(result["nodes"]) == 3
+        assert len(result["edges"]) == 2
+        assert result["truncated"]
+
+        result = call_action(
+            "relationship_neighbourhood",
+            entity_id=center["id"],
+            max_edges=1,
+        )
+        assert len(result["edges"]) == 1
+        assert result["truncated"]
+
 
 @pytest.mark.usefixtures("clean_db")
 def test_keep_relation_after_dataset_patch():
@@ -571,3 +1325,340 @@ def test_keep_relation_after_dataset_patch():
 
     assert relation_straight is not None
     assert relation_reverse is not None
+
+
+@pytest.mark.usefixtures("clean_db")
+@pytest.mark.ckan_config("ckanext.relationship.canonical_ids", True)
+class TestCanonicalIds:
+    def test_relation_created_by_name_stores_ids(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        result = call_action(
+            "relationship_relation_create",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["name"],
+            object_id=object_dataset["name"],
+            relation_type="related_to",
+        )
+
+        assert result[0]["subject_id"] == subject_dataset["id"]
+        assert result[0]["object_id"] == object_dataset["id"]
+        assert result[1]["subject_id"] == object_dataset["id"]
+        assert result[1]["object_id"] == subject_dataset["id"]
+
+    def test_relation_can_be_listed_by_name(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        call_action(
+            "relationship_relation_create",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["id"],
+            object_id=object_dataset["id"],
+            relation_type="related_to",
+        )
+
+        result = call_action(
+            "relationship_relations_ids_list",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["name"],
+            object_entity="package",
+            object_type="dataset",
+        )
+
+        assert result == [object_dataset["id"]]
+
+    def test_relation_delete_by_name(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        call_action(
+            "relationship_relation_create",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["id"],
+            object_id=object_dataset["id"],
+            relation_type="related_to",
+        )
+
+        result = call_action(
+            "relationship_relation_delete",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["name"],
+            object_id=object_dataset["name"],
+        )
+
+        assert len(result) == 2
+        assert not Relationship.by_subject_id(subject_dataset["id"])
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRenameEntity:
+    def test_relations_created_by_name_survive_rename(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        call_action(
+            "relationship_relation_create",
+            {"ignore_auth": True},
+            subject_id=subject_dataset["name"],
+            object_id=object_dataset["name"],
+            relation_type="related_to",
+        )
+
+        call_action(
+            "package_patch",
+            {"ignore_auth": True},
+            id=subject_dataset["id"],
+            name="renamed-dataset",
+        )
+
+        relation = Relationship.by_object_id(
+            subject_dataset["id"],
+            object_dataset["id"],
+            "related_to",
+        )
+        assert relation is not None
+        assert relation.subject_id == subject_dataset["id"]
+
+        reverse_relation = Relationship.by_object_id(
+            object_dataset["id"],
+            subject_dataset["id"],
+            "related_to",
+        )
+        assert reverse_relation is not None
+        assert reverse_relation.object_id == subject_dataset["id"]
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRelatedEntityChoices:
+    def _all_pages(self, user: str, **data_dict):
+        results = []
+        after = None
+        while True:
+            if after:
+                data_dict["after"] = after
+            page = call_action(
+                "relationship_related_entity_choices", {"user": user}, **data_dict
+            )
+            results.extend(page["results"])
+            after = page["next"]
+            if not after:
+                return results
+
+    def test_pages_are_sorted_by_title(self):
+        user = factories.Sysadmin()
+        datasets = [factories.Dataset(title=f"Dataset {idx}") for idx in range(5)]
+        factories.Dataset(
+            type="package-with-relationship",
+            owner_org=factories.Organization()["id"],
+        )
+
+        page = call_action(
+            "relationship_related_entity_choices",
+            {"user": user["name"]},
+            entity="package",
+            entity_type="dataset",
+            limit=2,
+        )
+        assert [item["id"] for item in page["results"]] == [
+            datasets[0]["id"],
+            datasets[1]["id"],
+        ]
+        assert page["next"]
+
+        assert [
+            item["title"]
+            for item in self._all_pages(
+                user["name"], entity="package", entity_type="dataset", limit=2
+            )
+        ] == [dataset["title"] for dataset in datasets]
+
+    def test_search_and_current_entity(self):
+        user = factories.Sysadmin()
+        current = factories.Group(title="Water quality")
+        matching = factories.Group(title="Water 100%")
+        factories.Group(title="Air quality")
+
+        assert self._all_pages(
+            user["name"],
+            entity="group",
+            entity_type="group",
+            q="WATER",
+            current_entity_id=current["id"],
+        ) == [{"id": matching["id"], "name": matching["name"], "title": "Water 100%"}]
+
+    def test_private_datasets_of_other_organizations_are_hidden(self):
+        user = factories.User()
+        own_org = factories.Organization(
+            users=[{"name": user["name"], "capacity": "member"}]
+        )
+        visible = factories.Dataset(owner_org=own_org["id"], private=True)
+        public = factories.Dataset()
+        factories.Dataset(owner_org=factories.Organization()["id"], private=True)
+
+        assert {
+            item["id"]
+            for item in self._all_pages(
+                user["name"], entity="package", entity_type="dataset"
+            )
+        } == {visible["id"], public["id"]}
+
+    def test_updatable_only_pages_are_full(self):
+        user = factories.User()
+        org = factories.Organization(
+            users=[{"name": user["name"], "capacity": "editor"}]
+        )
+        other_org = factories.Organization()
+        editable = []
+        for idx in range(3):
+            factories.Dataset(title=f"{idx} other", owner_org=other_org["id"])
+            editable.append(
+                factories.Dataset(title=f"{idx} own", owner_org=org["id"])["id"]
+            )
+
+        page = call_action(
+            "relationship_related_entity_choices",
+            {"user": user["name"]},
+            entity="package",
+            entity_type="dataset",
+            updatable_only=True,
+            limit=2,
+        )
+        assert [item["id"] for item in page["results"]] == editable[:2]
+
+        assert [
+            item["id"]
+            for item in self._all_pages(
+                user["name"],
+                entity="package",
+                entity_type="dataset",
+                updatable_only=True,
+                limit=2,
+            )
+        ] == editable
+
+    def test_get_request(self, app):
+        dataset = factories.Dataset()
+
+        resp = app.get(
+            "/api/action/relationship_related_entity_choices",
+            query_string={"entity": "package", "entity_type": "dataset"},
+        )
+
+        assert [item["id"] for item in resp.json["result"]["results"]] == [
+            dataset["id"]
+        ]
+
+    def test_invalid_cursor(self):
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_related_entity_choices",
+                entity="package",
+                entity_type="dataset",
+                after="invalid",
+            )
+
+    @pytest.mark.parametrize("values", [[1, 2], [{}, "x"], ["x", None]])
+    def test_cursor_values_must_be_strings(self, values: list[Any]):
+        cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_related_entity_choices",
+                entity="package",
+                entity_type="dataset",
+                after=cursor,
+            )
+
+    def test_limit_must_be_positive(self):
+        with pytest.raises(tk.ValidationError):
+            call_action(
+                "relationship_related_entity_choices",
+                entity="package",
+                entity_type="dataset",
+                limit=0,
+            )
+
+
+@pytest.mark.usefixtures("clean_db", "with_plugins")
+class TestAutocomplete:
+    url = "/api/2/util/relationships/autocomplete"
+
+    def test_updatable_only_pages_are_full(self, app):
+        user = factories.User()
+        token = factories.APIToken(user=user["name"])
+        org = factories.Organization(
+            users=[{"name": user["name"], "capacity": "editor"}]
+        )
+        other_org = factories.Organization()
+        current = factories.Dataset(owner_org=org["id"])
+        editable = set()
+        for _ in range(3):
+            factories.Dataset(owner_org=other_org["id"])
+            editable.add(factories.Dataset(owner_org=org["id"])["id"])
+
+        names = set()
+        for offset in range(0, 4, 2):
+            resp = app.get(
+                self.url,
+                query_string={
+                    "incomplete": "",
+                    "current_entity_id": current["id"],
+                    "updatable_only": "true",
+                    "limit": 2,
+                    "offset": offset,
+                },
+                headers={"Authorization": token["token"]},
+            )
+            names.update(item["name"] for item in resp.json["ResultSet"]["Result"])
+            if not offset:
+                assert len(resp.json["ResultSet"]["Result"]) == 2
+
+        assert names == editable
+
+    def test_invalid_limit(self, app):
+        resp = app.get(
+            self.url,
+            query_string={"current_entity_id": "x", "limit": "-1"},
+            status=400,
+        )
+        assert "limit" in resp.json["error"]
+
+    def test_repeated_request_is_not_modified(self, app):
+        current = factories.Dataset()
+        factories.Dataset()
+        query = {"incomplete": "", "current_entity_id": current["id"]}
+
+        resp = app.get(self.url, query_string=query)
+        assert resp.headers["ETag"]
+        assert "private" in resp.headers["Cache-Control"]
+
+        resp = app.get(
+            self.url,
+            query_string=query,
+            headers={"If-None-Match": resp.headers["ETag"]},
+            status=304,
+        )
+        assert not resp.data
+
+    def test_responses_are_cached(self, app):
+        cache.autocomplete_backend(30).clear()
+        current = factories.Dataset()
+        factories.Dataset()
+        query = {"incomplete": "", "current_entity_id": current["id"]}
+
+        first = app.get(self.url, query_string=query)
+        factories.Dataset()
+
+        assert app.get(self.url, query_string=query).json == first.json
+
+    @pytest.mark.ckan_config("ckanext.relationship.autocomplete.cache_ttl", 0)
+    def test_cache_can_be_disabled(self, app):
+        current = factories.Dataset()
+        query = {"incomplete": "", "current_entity_id": current["id"]}
+
+        first = app.get(self.url, query_string=query)
+        assert "no-cache" in first.headers["Cache-Control"]
+        factories.Dataset()
+
+        assert app.get(self.url, query_string=query).json != first.json
@@ -0,0 +1,142 @@
+import fakeredis
+import pytest
+
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.relationship import cache
+from ckanext.relationship.model.relationship import Relationship
+
+
+class TestMemoryBackend:
+    def test_values_expire(self, monkeypatch):
+        backend = cache.MemoryBackend(ttl=10, max_size=10)
+        monkeypatch.setattr(cache.time, "monotonic", lambda: 100)
+        backend.set_many({"a": "1"}, "v")
+
+        assert backend.get_many(["a", "b"], "v") == {"a": "1"}
+
+        monkeypatch.setattr(cache.time, "monotonic", lambda: 110)
+        assert backend.get_many(["a"], "v") == {}
+
+    def test_least_recently_used_is_evicted(self):
+        backend = cache.MemoryBackend(ttl=10, max_size=2)
+        backend.set_many({"a": "1", "b": "2"}, "v")
+        backend.get_many(["a"], "v")
+        backend.set_many({"c": "3"}, "v")
+
+        assert backend.get_many(["a", "b", "c"], "v") == {"a": "1", "c": "3"}
+
+    def test_invalidate_drops_all_variants(self):
+        backend = cache.MemoryBackend(ttl=10, max_size=10)
+        backend.set_many({"a": "1", "b": "2"}, "first")
+        backend.set_many({"a": "3"}, "second")
+        backend.invalidate(["a"])
+
+        assert backend.get_many(["a", "b"], "first") == {"b": "2"}
+        assert backend.get_many(["a"], "second") == {}
+
+
+class TestRedisBackend:
+    def test_values_are_shared(self):
+        conn = fakeredis.FakeStrictRedis()
+        cache.RedisBackend(ttl=10, conn=conn).set_many({"a": "1"}, "v")
+
+        assert cache.RedisBackend(ttl=10, conn=conn).get_many(["a", "b"], "v") == {
+            "a": "1"
+        }
+
+    def test_invalidate_drops_all_variants(self):
+        backend = cache.RedisBackend(ttl=10, conn=fakeredis.FakeStrictRedis())
+        backend.set_many({"a": "1", "b": "2"}, "first")
+        backend.set_many({"a": "3"}, "second")
+        backend.invalidate(["a"])
+
+        assert backend.get_many(["a", "b"], "first") == {"b": "2"}
+        assert backend.get_many(["a"], "second") == {}
+
+    def test_values_expire(self):
+        conn = fakeredis.FakeStrictRedis()
+        cache.RedisBackend(ttl=10, conn=conn).set_many({"a": "1"}, "v")
+
+        assert 0 < conn.ttl(next(iter(conn.keys()))) <= 10
+
+
+@pytest.mark.usefixtures("clean_db")
+@pytest.mark.ckan_config("ckanext.relationship.cache.backend", "memory")
+class TestCachedRelations:
+    @pytest.fixture(autouse=True)
+    def _clear_cache(self):
+        cache.backend().clear()
+
+    def test_relations_are_cached(self, sql_statements):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+        call_action(
+            "relationship_relation_create",
+            subject_id=subject_dataset["id"],
+            object_id=object_dataset["id"],
+            relation_type="related_to",
+        )
+
+        expected = call_action(
+            "relationship_relations_list", subject_id=subject_dataset["id"]
+        )
+        sql_statements.clear()
+
+        assert (
+            call_action("relationship_relations_list", subject_id=subject_dataset["id"])
+            == expected
+        )
+        assert not sql_statements
+
+    @pytest.mark.parametrize("endpoint", ["subject", "object"])
+    def test_create_invalidates_both_endpoints(self, endpoint):
+        datasets = {"subject": factories.Dataset(), "object": factories.Dataset()}
+        entity_id = datasets[endpoint]["id"]
+        assert not Relationship.by_subject_id(entity_id)
+
+        call_action(
+            "relationship_relation_create",
+            subject_id=datasets["subject"]["id"],
+            object_id=datasets["object"]["name"],
+            relation_type="child_of",
+        )
+
+        assert len(Relationship.by_subject_id(entity_id)) == 1
+
+    @pytest.mark.parametrize("endpoint", ["subject", "object"])
+    def test_delete_invalidates_both_endpoints(self, endpoint):
+        datasets = {"subject": factories.Dataset(), "object": factories.Dataset()}
+        entity_id = datasets[endpoint]["id"]
+        call_action(
+            "relationship_relation_create",
+            subject_id=datasets["subject"]["id"],
+            object_id=datasets["object"]["id"],
+            relation_type="related_to",
+        )
+        assert call_action("relationship_relations_ids_list", subject_id=entity_id)
+
+        call_action(
+            "relationship_relation_delete",
+            subject_id=datasets["subject"]["id"],
+            object_id=datasets["object"]["id"],
+            relation_type="related_to",
+        )
+
+        assert not call_action("relationship_relations_ids_list", subject_id=entity_id)
+
+    def test_dataset_deletion_invalidates_related_entities(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+        call_action(
+            "relationship_relation_create",
+            subject_id=subject_dataset["id"],
+            object_id=object_dataset["id"],
+            relation_type="related_to",
+        )
+        assert Relationship.by_subject_id(object_dataset["id"])
+
+        call_action("package_delete", id=subject_dataset["id"])
+
+        assert not Relationship.by_subject_id(object_dataset["id"])
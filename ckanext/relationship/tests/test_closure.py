@@ -0,0 +1,140 @@
+import pytest
+
+from ckan import model
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.relationship.model import closure
+
+
+def _link(child: str, parent: str):
+    call_action(
+        "relationship_relation_create",
+        subject_id=child,
+        object_id=parent,
+        relation_type="child_of",
+    )
+
+
+def _hierarchy(entity_id: str, direction: str = "descendants", **kwargs):
+    return [
+        (entity["id"], entity["depth"])
+        for entity in call_action(
+            "relationship_hierarchy",
+            entity_id=entity_id,
+            direction=direction,
+            **kwargs,
+        )
+    ]
+
+
+@pytest.fixture()
+def tree():
+    """Programme with two collections, the first one has two datasets, one of
+    them is also directly under the programme.
+    """
+    programme = factories.Group()
+    first, second = factories.Group(), factories.Group()
+    datasets = [factories.Dataset(), factories.Dataset()]
+
+    _link(first["id"], programme["id"])
+    _link(second["name"], programme["name"])
+    for dataset in datasets:
+        _link(dataset["id"], first["id"])
+    _link(datasets[0]["id"], programme["id"])
+
+    return programme, first, second, datasets
+
+
+@pytest.mark.usefixtures("clean_db")
+@pytest.mark.ckan_config("ckanext.relationship.closure_table", True)
+class TestClosure:
+    def test_maintained_on_create(self, tree):
+        programme, first, second, datasets = tree
+
+        assert sorted(_hierarchy(programme["id"])) == sorted(
+            [
+                (first["id"], 1),
+                (second["id"], 1),
+                (datasets[0]["id"], 1),
+                (datasets[1]["id"], 2),
+            ]
+        )
+        assert _hierarchy(datasets[1]["name"], "ancestors") == [
+            (first["id"], 1),
+            (programme["id"], 2),
+        ]
+
+    def test_maintained_on_delete(self, tree):
+        programme, first, _second, datasets = tree
+
+        call_action(
+            "relationship_relation_delete",
+            subject_id=first["id"],
+            object_id=programme["id"],
+        )
+
+        assert _hierarchy(datasets[1]["id"], "ancestors") == [(first["id"], 1)]
+        assert _hierarchy(datasets[0]["id"], "ancestors") == sorted(
+            [(first["id"], 1), (programme["id"], 1)]
+        )
+
+    def test_single_lookup(self, tree, sql_statements):
+        programme, *_ = tree
+
+        sql_statements.clear()
+        _hierarchy(programme["id"], max_depth=1)
+
+        assert not [stmt for stmt in sql_statements if "RECURSIVE" in stmt]
+        assert [stmt for stmt in sql_statements if "relationship_closure" in stmt]
+
+    def test_rebuild(self, tree):
+        programme, *_ = tree
+        expected = sorted(_hierarchy(programme["id"]))
+
+        model.Session.execute(closure.Closure.__table__.delete())
+        assert _hierarchy(programme["id"]) == []
+
+        for _ in closure.rebuild(batch_size=2):
+            model.Session.commit()
+
+        assert sorted(_hierarchy(programme["id"])) == expected
+
+    def test_same_as_recursive_query(self, tree, ckan_config, monkeypatch):
+        programme, *_ = tree
+        stored = sorted(_hierarchy(programme["id"]))
+
+        monkeypatch.setitem(ckan_config, "ckanext.relationship.closure_table", False)
+        assert sorted(_hierarchy(programme["id"])) == stored
+
+    @pytest.mark.parametrize("enabled", [True, False])
+    def test_max_depth(self, tree, ckan_config, monkeypatch, enabled):
+        programme, first, second, datasets = tree
+        monkeypatch.setitem(ckan_config, "ckanext.relationship.closure_table", enabled)
+
+        assert _hierarchy(programme["id"], max_depth=0) == []
+        assert sorted(_hierarchy(programme["id"], max_depth=1)) == sorted(
+            [(first["id"], 1), (second["id"], 1), (datasets[0]["id"], 1)]
+        )
+
+    def test_shared_ancestors(self):
+        # every group of a level is a child of both groups of the next level
+        levels = [[factories.Group() for _ in range(2)] for _ in range(12)]
+        for children, parents in zip(levels, levels[1:]):
+            for child in children:
+                for parent in parents:
+                    _link(child["id"], parent["id"])
+
+        assert sorted(_hierarchy(levels[0][0]["id"], "ancestors")) == sorted(
+            (group["id"], depth)
+            for depth, level in enumerate(levels[1:], 1)
+            for group in level
+        )
+
+    def test_cycle(self):
+        first, second = factories.Dataset(), factories.Dataset()
+        _link(first["id"], second["id"])
+        _link(second["id"], first["id"])
+
+        assert _hierarchy(first["id"]) == [(second["id"], 1)]
+        assert _hierarchy(first["id"], "ancestors") == [(second["id"], 1)]
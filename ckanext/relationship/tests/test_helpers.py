@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+import ckan.plugins.toolkit as tk
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.relationship import helpers, utils
+from ckanext.relationship.helpers import (
+    relationship_get_current_relations_list,
+    relationship_get_selected_entities,
+    relationship_get_selected_json,
+)
+
+
+@pytest.mark.usefixtures("clean_db", "clean_index")
+class TestGetSelectedEntities:
+    def test_packages(self):
+        first = factories.Dataset(title="b")
+        second = factories.Dataset(title="A")
+        factories.Dataset()
+
+        assert relationship_get_selected_entities(
+            "package", "dataset", [first["id"], second["name"], "nonexistent"]
+        ) == [
+            {"id": second["id"], "name": second["name"], "title": "A"},
+            {"id": first["id"], "name": first["name"], "title": "b"},
+        ]
+
+    def test_groups(self):
+        first = factories.Group(title="b")
+        second = factories.Group(title="A")
+        factories.Group()
+
+        assert relationship_get_selected_entities(
+            "group", "group", [first["id"], second["name"]]
+        ) == [
+            {"id": second["id"], "name": second["name"], "title": "A"},
+            {"id": first["id"], "name": first["name"], "title": "b"},
+        ]
+
+    def test_type_must_match(self):
+        organization = factories.Organization()
+
+        assert (
+            relationship_get_selected_entities("group", "group", [organization["id"]])
+            == []
+        )
+
+    def test_nothing_selected(self):
+        assert relationship_get_selected_entities("package", "dataset", []) == []
+
+
+@pytest.mark.usefixtures("clean_db", "clean_index")
+class TestGetSelectedJson:
+    def test_selection_order_is_kept(self):
+        first = factories.Dataset(title="A")
+        second = factories.Dataset(title="")
+        factories.Dataset()
+
+        assert json.loads(
+            relationship_get_selected_json(
+                [second["name"], "nonexistent", first["id"], second["name"]]
+            )
+        ) == [
+            {"name": second["name"], "title": second["name"]},
+            {"name": first["id"], "title": "A"},
+        ]
+
+    def test_comma_separated_selection(self):
+        first = factories.Dataset()
+        second = factories.Dataset()
+
+        assert [
+            item["name"]
+            for item in json.loads(
+                relationship_get_selected_json(f"{second['id']},{first['id']}")
+            )
+        ] == [second["id"], first["id"]]
+
+    def test_single_search(self, monkeypatch):
+        datasets = [factories.Dataset()["id"] for _ in range(150)]
+        search = tk.get_action("package_search")
+        calls = []
+
+        def counted_search(context, data_dict):
+            calls.append(data_dict)
+            return search(context, data_dict)
+
+        monkeypatch.setattr(helpers.tk, "get_action", lambda name: counted_search)
+
+        assert len(json.loads(relationship_get_selected_json(datasets))) == 150
+        assert len(calls) == 1
+
+    def test_nothing_selected(self):
+        assert relationship_get_selected_json(None) == "[]"
+
+
+@pytest.mark.usefixtures("clean_db", "with_request_context")
+class TestGetCurrentRelationsList:
+    @pytest.fixture()
+    def subject(self):
+        subject = factories.Dataset(
+            type="package-with-relationship",
+            owner_org=factories.Organization()["id"],
+        )
+        self.related = factories.Dataset(type="package-with-relationship")
+        self.group = factories.Group()
+        for object_id, relation_type in [
+            (self.related["name"], "related_to"),
+            (self.group["id"], "child_of"),
+        ]:
+            call_action(
+                "relationship_relation_create",
+                subject_id=subject["id"],
+                object_id=object_id,
+                relation_type=relation_type,
+            )
+
+        return {key: subject[key] for key in ("id", "name", "type")}
+
+    def _field(self, name: str) -> dict:
+        return next(
+            field
+            for field in utils.get_relation_fields("package-with-relationship").values()
+            if field["field_name"] == name
+        )
+
+    def test_relations_of_all_fields_are_fetched_once(self, subject, sql_statements):
+        sql_statements.clear()
+
+        assert relationship_get_current_relations_list(
+            self._field("related_packages"), subject
+        ) == [self.related["name"]]
+        assert relationship_get_current_relations_list(
+            self._field("parent_groups"), subject
+        ) == [self.group["id"]]
+
+        relation_queries = [
+            stmt for stmt in sql_statements if "FROM relationship_relationship" in stmt
+        ]
+        assert len(relation_queries) == 1, sql_statements
+
+    def test_values_from_package_show_are_used(self, subject, sql_statements):
+        subject["related_packages"] = ["from-package-show"]
+        sql_statements.clear()
+
+        assert relationship_get_current_relations_list(
+            self._field("related_packages"), subject
+        ) == ["from-package-show"]
+        assert not sql_statements
+
+    def test_new_entity(self):
+        assert (
+            relationship_get_current_relations_list(self._field("related_packages"), {})
+            == []
+        )
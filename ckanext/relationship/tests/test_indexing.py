@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+import sqlalchemy as sa
+
+from ckan import model
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.relationship import indexing
+from ckanext.relationship.model.relationship import Relationship
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRebuildLater:
+    @pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "batched")
+    def test_batched_rebuild_is_deduplicated(self, monkeypatch):
+        rebuild_entities = mock.Mock()
+        monkeypatch.setattr(indexing, "rebuild_entities", rebuild_entities)
+
+        indexing.rebuild_later("first", "second")
+        indexing.rebuild_later("second", "third")
+        rebuild_entities.assert_not_called()
+
+        model.Session.commit()
+        rebuild_entities.assert_called_once_with(["first", "second", "third"])
+
+    @pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "batched")
+    def test_rollback_discards_queue(self, monkeypatch):
+        rebuild_entities = mock.Mock()
+        monkeypatch.setattr(indexing, "rebuild_entities", rebuild_entities)
+
+        indexing.rebuild_later("first")
+        model.Session.rollback()
+        model.Session.commit()
+
+        rebuild_entities.assert_not_called()
+
+    @pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "batched")
+    def test_batched_rebuild_sees_committed_relations(self, monkeypatch):
+        subject, dataset = factories.Dataset(), factories.Dataset()
+        stored: list[int] = []
+
+        def rebuild_entities(entity_ids: list[str]):
+            with model.meta.engine.connect() as conn:
+                stored.append(
+                    conn.execute(
+                        sa.select(sa.func.count()).select_from(
+                            Relationship.__table__,
+                        ),
+                    ).scalar_one(),
+                )
+
+        monkeypatch.setattr(indexing, "rebuild_entities", rebuild_entities)
+        Relationship.create_bulk(
+            [
+                {
+                    "subject_id": subject["id"],
+                    "object_id": dataset["id"],
+                    "relation_type": "related_to",
+                },
+            ],
+        )
+        indexing.rebuild_later(subject["id"], dataset["id"])
+        model.Session.commit()
+
+        assert stored == [2]
+
+    @pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "async")
+    def test_async_rebuild_is_enqueued(self, monkeypatch):
+        enqueue_job = mock.Mock()
+        monkeypatch.setattr(indexing.tk, "enqueue_job", enqueue_job)
+
+        indexing.rebuild_later("first", "first")
+        model.Session.commit()
+
+        enqueue_job.assert_called_once()
+        assert enqueue_job.call_args[0][1] == [["first"]]
+
+    @pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "sync")
+    def test_sync_rebuild(self, monkeypatch):
+        rebuild = mock.Mock()
+        monkeypatch.setattr(indexing, "rebuild", rebuild)
+
+        indexing.rebuild_later("first", "second")
+
+        assert rebuild.call_args_list == [mock.call("first"), mock.call("second")]
+
+
+@pytest.mark.usefixtures("clean_db")
+@pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "batched")
+def test_related_datasets_are_reindexed_once_per_update(monkeypatch):
+    organization = factories.Organization()
+    subject_dataset = factories.Dataset(
+        type="package-with-relationship", owner_org=organization["id"]
+    )
+    related = [
+        factories.Dataset(
+            type="package-with-relationship", owner_org=organization["id"]
+        )["id"]
+        for _ in range(3)
+    ]
+
+    rebuild_entities = mock.Mock()
+    monkeypatch.setattr(indexing, "rebuild_entities", rebuild_entities)
+
+    call_action(
+        "package_patch",
+        {"ignore_auth": True},
+        id=subject_dataset["id"],
+        related_packages=related,
+    )
+
+    rebuild_entities.assert_called_once()
+    assert set(rebuild_entities.call_args[0][0]) == {*related, subject_dataset["id"]}
+
+
+@pytest.mark.usefixtures("clean_db", "clean_index")
+def test_rebuild_reads_relations_once(sql_statements):
+    organization = factories.Organization()
+    datasets = [
+        factories.Dataset(
+            type="package-with-relationship", owner_org=organization["id"]
+        )
+        for _ in range(3)
+    ]
+
+    sql_statements.clear()
+    indexing.rebuild_entities(dataset["name"] for dataset in datasets)
+
+    relation_queries = [
+        stmt for stmt in sql_statements if "relationship_relationship" in stmt
+    ]
+    assert len(relation_queries) == 1
+
+
+def _link(child: str, parent: str):
+    call_action(
+        "relationship_relation_create",
+        {"ignore_auth": True},
+        subject_id=child,
+        object_id=parent,
+        relation_type="child_of",
+    )
+
+
+@pytest.fixture()
+def groups():
+    """Chain of groups, every group is a child of the previous one."""
+    chain = [factories.Group() for _ in range(3)]
+    for parent, child in zip(chain, chain[1:]):
+        _link(child["id"], parent["id"])
+    return chain
+
+
+@pytest.mark.usefixtures("clean_db", "clean_index")
+@pytest.mark.ckan_config("ckanext.relationship.index_hierarchy_depth", 2)
+class TestHierarchyIndex:
+    def _indexed_under(self, ancestor_id: str) -> list[str]:
+        return [
+            pkg["id"]
+            for pkg in call_action(
+                "package_search",
+                fq=f"vocab_relationship_ancestors:{ancestor_id}",
+            )["results"]
+        ]
+
+    def test_ancestors_are_indexed_up_to_depth(self, groups):
+        root, middle, leaf = groups
+        dataset = factories.Dataset(
+            type="package-with-relationship",
+            owner_org=factories.Organization()["id"],
+        )
+        call_action(
+            "package_patch",
+            {"ignore_auth": True},
+            id=dataset["id"],
+            parent_groups=[leaf["id"]],
+        )
+
+        assert self._indexed_under(leaf["id"]) == [dataset["id"]]
+        assert self._indexed_under(middle["id"]) == [dataset["id"]]
+        assert self._indexed_under(root["id"]) == []
+
+    def test_hierarchy_is_prefetched_in_batch(self, groups):
+        _root, middle, leaf = groups
+        datasets = [factories.Dataset()["id"] for _ in range(3)]
+        for dataset_id in datasets:
+            _link(dataset_id, leaf["id"])
+
+        with indexing.prefetch_relations(datasets):
+            for dataset_id in datasets:
+                assert indexing.hierarchy_of(dataset_id) == {
+                    "child_of": [leaf["id"], middle["id"]],
+                    "parent_of": [],
+                }
+
+    @pytest.mark.ckan_config("ckanext.relationship.search_rebuild_mode", "batched")
+    def test_subtree_is_reindexed_when_edge_changes(self, groups, monkeypatch):
+        root, middle, leaf = groups
+        dataset = factories.Dataset()
+        _link(dataset["id"], leaf["id"])
+        other = factories.Group()
+
+        rebuild_entities = mock.Mock()
+        monkeypatch.setattr(indexing, "rebuild_entities", rebuild_entities)
+        _link(middle["id"], other["id"])
+
+        rebuild_entities.assert_called_once()
+        assert set(rebuild_entities.call_args[0][0]) == {
+            middle["id"],
+            leaf["id"],
+            dataset["id"],
+            other["id"],
+        }
+        assert root["id"] not in rebuild_entities.call_args[0][0]
@@ -0,0 +1,221 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from ckan import model
+from ckan.cli.cli import ckan as ckan_cli
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.relationship.model.relationship import (
+    Relationship,
+    entity_ids_by_names,
+    entity_names_by_ids,
+)
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestRelationshipConstraints:
+    def test_duplicated_relation_is_rejected(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        for _ in range(2):
+            model.Session.add(
+                Relationship(
+                    subject_id=subject_dataset["id"],
+                    object_id=object_dataset["id"],
+                    relation_type="related_to",
+                )
+            )
+
+        with pytest.raises(IntegrityError):
+            model.Session.commit()
+        model.Session.rollback()
+
+    def test_same_entities_with_different_relation_types(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        for relation_type in ("related_to", "child_of"):
+            model.Session.add(
+                Relationship(
+                    subject_id=subject_dataset["id"],
+                    object_id=object_dataset["id"],
+                    relation_type=relation_type,
+                )
+            )
+        model.Session.commit()
+
+        assert len(Relationship.by_subject_id(subject_dataset["id"])) == 2
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestCanonicalize:
+    def test_names_are_replaced_with_ids(self):
+        dataset = factories.Dataset()
+        group = factories.Group()
+
+        model.Session.add(
+            Relationship(
+                subject_id=dataset["name"],
+                object_id=group["name"],
+                relation_type="child_of",
+            )
+        )
+        model.Session.commit()
+
+        assert Relationship.canonicalize(100) == 1
+        model.Session.commit()
+        assert Relationship.canonicalize(100) == 0
+
+        relation = model.Session.query(Relationship).one()
+        assert relation.subject_id == dataset["id"]
+        assert relation.object_id == group["id"]
+
+    def test_duplicates_are_removed(self):
+        subject_dataset = factories.Dataset()
+        object_dataset = factories.Dataset()
+
+        model.Session.add_all(
+            [
+                Relationship(
+                    subject_id=subject_dataset["name"],
+                    object_id=object_dataset["id"],
+                    relation_type="related_to",
+                ),
+                Relationship(
+                    subject_id=subject_dataset["id"],
+                    object_id=object_dataset["id"],
+                    relation_type="related_to",
+                ),
+            ]
+        )
+        model.Session.commit()
+
+        Relationship.canonicalize(100)
+        model.Session.commit()
+
+        relation = model.Session.query(Relationship).one()
+        assert relation.subject_id == subject_dataset["id"]
+
+    def test_names_equal_to_ids_are_kept(self):
+        dataset = factories.Dataset()
+        dataset = call_action("package_patch", id=dataset["id"], name=dataset["id"])
+        other = factories.Dataset()
+
+        model.Session.add(
+            Relationship(
+                subject_id=dataset["id"],
+                object_id=other["name"],
+                relation_type="related_to",
+            )
+        )
+        model.Session.commit()
+
+        assert Relationship.canonicalize(100) == 1
+        model.Session.commit()
+        assert Relationship.canonicalize(100) == 0
+
+        relation = model.Session.query(Relationship).one()
+        assert relation.subject_id == dataset["id"]
+        assert relation.object_id == other["id"]
+
+    def test_batches(self, cli):
+        subject_dataset = factories.Dataset()
+        for _ in range(3):
+            model.Session.add(
+                Relationship(
+                    subject_id=subject_dataset["name"],
+                    object_id=factories.Dataset()["id"],
+                    relation_type="related_to",
+                )
+            )
+        model.Session.commit()
+
+        result = cli.invoke(
+            ckan_cli, ["relationship", "canonicalize-ids", "--batch-size", "2"]
+        )
+
+        assert not result.exit_code, result.output
+        assert {rel.subject_id for rel in model.Session.query(Relationship)} == {
+            subject_dataset["id"]
+        }
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestEntityResolvers:
+    def test_names_by_ids(self):
+        dataset = factories.Dataset()
+        organization = factories.Organization()
+        group = factories.Group()
+
+        assert entity_names_by_ids(
+            [dataset["id"], organization["id"], group["id"], "nonexistent"]
+        ) == {
+            dataset["id"]: dataset["name"],
+            organization["id"]: organization["name"],
+            group["id"]: group["name"],
+        }
+
+    def test_names_are_not_resolved_as_ids(self):
+        dataset = factories.Dataset()
+
+        assert entity_names_by_ids([dataset["name"]]) == {}
+
+    def test_ids_by_names(self):
+        dataset = factories.Dataset()
+        group = factories.Group()
+
+        assert entity_ids_by_names([dataset["name"], group["id"]]) == {
+            dataset["name"]: dataset["id"],
+            group["id"]: group["id"],
+        }
+
+    def test_package_takes_precedence_over_group(self):
+        dataset = factories.Dataset()
+        factories.Group(name=dataset["name"])
+
+        assert entity_ids_by_names([dataset["name"]]) == {
+            dataset["name"]: dataset["id"],
+        }
+
+    def test_results_are_memoized(self, monkeypatch):
+        dataset = factories.Dataset()
+        entity_names_by_ids([dataset["id"]])
+
+        monkeypatch.setattr(model.Session, "execute", None)
+        assert entity_names_by_ids([dataset["id"]]) == {
+            dataset["id"]: dataset["name"],
+        }
+
+
+@pytest.mark.usefixtures("clean_db")
+class TestBySubjectIds:
+    def test_relations_are_grouped(self):
+        first = factories.Dataset()
+        second = factories.Dataset()
+        group = factories.Group()
+
+        model.Session.add_all(
+            [
+                Relationship(
+                    subject_id=first["id"],
+                    object_id=second["id"],
+                    relation_type="related_to",
+                ),
+                Relationship(
+                    subject_id=first["name"],
+                    object_id=group["name"],
+                    relation_type="child_of",
+                ),
+            ]
+        )
+        model.Session.commit()
+
+        assert Relationship.by_subject_ids([first["id"], second["id"]]) == {
+            first["id"]: {
+                ("package", "dataset", "related_to"): [second["id"]],
+                ("group", "group", "child_of"): [group["name"]],
+            },
+            second["id"]: {},
+        }
@@ -0,0 +1,265 @@
+import pytest
+
+from ckan import model
+from ckan.tests import factories
+from ckan.tests.helpers import call_action
+
+from ckanext.relationship import snapshot
+from ckanext.relationship.model import change_log
+from ckanext.relationship.model.graph import traverse
+from ckanext.relationship.model.relationship import Relationship
+
+
+def _relate(subject_id: str, object_id: str, relation_type: str = "related_to"):
+    call_action(
+        "relationship_relation_create",
+        subject_id=subject_id,
+        object_id=object_id,
+        relation_type=relation_type,
+    )
+
+
+@pytest.fixture()
+def _change_log(clean_db):
+    change_log.install()
+    model.Session.commit()
+
+
+@pytest.fixture()
+def _reset_snapshot():
+    """Do not reuse the snapshot of relations loaded by another test."""
+    snapshot.reset()
+    yield
+    snapshot.reset()
+
+
+@pytest.mark.usefixtures("_change_log", "_reset_snapshot")
+@pytest.mark.ckan_config("ckanext.relationship.snapshot.enabled", True)
+class TestSnapshot:
+    def test_lookups_are_served_from_memory(self, sql_statements):
+        subject = factories.Dataset()
+        group = factories.Group()
+        objects = [factories.Dataset() for _ in range(3)]
+        for dataset in objects:
+            _relate(subject["id"], dataset["name"])
+        _relate(subject["id"], group["id"], "child_of")
+
+        assert snapshot.current()
+        sql_statements.clear()
+
+        ids = call_action(
+            "relationship_relations_ids_list",
+            subject_id=subject["id"],
+            object_entity="package",
+        )
+        relations = call_action(
+            "relationship_relations_list",
+            subject_id=subject["name"],
+            relation_type="child_of",
+        )
+        counts = call_action("relationship_relations_count", subject_id=subject["id"])
+
+        assert not [stmt for stmt in sql_statements if "relationship_" in stmt]
+        assert sorted(ids) == sorted(dataset["name"] for dataset in objects)
+        assert [rel["object_id"] for rel in relations] == [group["id"]]
+        assert counts["count"] == 4
+        assert {
+            (item["object_entity"], item["relation_type"], item["count"])
+            for item in counts["counts"]
+        } == {("package", "related_to", 3), ("group", "child_of", 1)}
+
+    def test_paginated_list(self):
+        subject = factories.Dataset()
+        for _ in range(5):
+            _relate(subject["id"], factories.Dataset()["id"])
+
+        page = call_action(
+            "relationship_relations_list",
+            subject_id=subject["id"],
+            limit=2,
+            order_by="object_id",
+        )
+        following = call_action(
+            "relationship_relations_list",
+            subject_id=subject["id"],
+            limit=10,
+            order_by="object_id",
+            cursor=page["next"],
+        )
+
+        assert page["count"] == 5
+        object_ids = [rel["object_id"] for rel in page["results"]] + [
+            rel["object_id"] for rel in following["results"]
+        ]
+        assert object_ids == sorted(
+            Relationship.object_ids_by_subject_id(subject["id"]),
+        )
+        assert following["next"] is None
+
+    def test_changes_are_visible_after_commit(self):
+        subject, first, second = (factories.Dataset() for _ in range(3))
+        _relate(subject["id"], first["id"])
+
+        ids_list = "relationship_relations_ids_list"
+        assert call_action(ids_list, subject_id=subject["id"]) == [first["id"]]
+
+        _relate(subject["id"], second["id"])
+        call_action(
+            "relationship_relation_delete",
+            subject_id=subject["id"],
+            object_id=first["id"],
+        )
+
+        assert call_action(ids_list, subject_id=subject["id"]) == [second["id"]]
+
+    def test_not_used_within_transaction_that_changed_relations(self):
+        subject, dataset = factories.Dataset(), factories.Dataset()
+        assert snapshot.current()
+
+        Relationship.create_bulk(
+            [
+                {
+                    "subject_id": subject["id"],
+                    "object_id": dataset["id"],
+                    "relation_type": "related_to",
+                },
+            ],
+        )
+
+        assert snapshot.current() is None
+        model.Session.commit()
+        assert snapshot.current()
+
+    def test_dropped_when_change_log_is_disabled(self):
+        subject, dataset = factories.Dataset(), factories.Dataset()
+        loaded = snapshot.current()
+        assert loaded
+
+        change_log.uninstall()
+        model.Session.commit()
+        _relate(subject["id"], dataset["id"])
+        loaded.expire()
+
+        assert snapshot.current() is None
+        assert call_action(
+            "relationship_relations_ids_list",
+            subject_id=subject["id"],
+        ) == [dataset["id"]]
+
+    def test_traverse_matches_database(self):
+        first, second, third = (factories.Group() for _ in range(3))
+        dataset = factories.Dataset()
+        _relate(dataset["id"], first["name"], "child_of")
+        _relate(first["id"], second["id"], "child_of")
+        _relate(second["id"], third["name"], "child_of")
+        _relate(third["id"], first["id"], "child_of")
+
+        for direction in ("ancestors", "descendants", "all"):
+            result = call_action(
+                "relationship_traverse",
+                entity_id=dataset["id"],
+                direction=direction,
+                max_depth=10,
+            )
+            expected = traverse(
+                dataset["id"],
+                {
+                    "ancestors": ["child_of"],
+                    "descendants": ["parent_of"],
+                    "all": ["child_of", "parent_of"],
+                }[direction],
+                10,
+            )
+            assert result == expected
+
+
+@pytest.mark.usefixtures("clean_db", "_reset_snapshot")
+@pytest.mark.ckan_config("ckanext.relationship.snapshot.enabled", True)
+def test_not_used_without_change_log():
+    assert snapshot.current() is None
+
+
+@pytest.mark.usefixtures("_change_log")
+class TestConsistency:
+    def test_refresh_applies_changes(self):
+        subject, first, second = (factories.Dataset() for _ in range(3))
+        _relate(subject["id"], first["id"])
+        _relate(subject["id"], second["name"], "child_of")
+        engine = snapshot.Snapshot.load()
+
+        call_action(
+            "relationship_relation_delete",
+            subject_id=subject["id"],
+            object_id=first["id"],
+        )
+        _relate(first["id"], second["id"])
+        Relationship.rename_entity(second["name"], second["id"])
+        model.Session.commit()
+
+        assert snapshot.check(engine)[0]
+        engine.refresh()
+        assert snapshot.check(engine) == ([], [])
+        assert engine.object_ids(subject["id"]) == [second["id"]]
+
+        # changes are read once again on the next refresh
+        engine.refresh()
+        assert snapshot.check(engine) == ([], [])
+
+    def test_refresh_applies_updates(self):
+        subject, dataset = factories.Dataset(), factories.Dataset()
+        _relate(subject["id"], dataset["id"])
+        engine = snapshot.Snapshot.load()
+
+        relation = (
+            model.Session.query(Relationship).filter_by(subject_id=subject["id"]).one()
+        )
+        relation.extras = {"source": "harvester"}
+        model.Session.commit()
+
+        engine.refresh()
+        assert [rel["extras"] for rel in engine.relations(subject["id"])] == [
+            {"source": "harvester"},
+        ]
+
+        # changes are read once again on the next refresh
+        engine.refresh()
+        assert len(engine.relations(subject["id"])) == 1
+
+    def test_refresh_applies_changes_of_long_transactions(self):
+        subject, dataset = factories.Dataset(), factories.Dataset()
+
+        with model.Session.get_bind().connect() as conn:
+            transaction = conn.begin()
+            conn.execute(
+                Relationship.__table__.insert().values(
+                    subject_id=subject["id"],
+                    object_id=dataset["id"],
+                    relation_type="related_to",
+                ),
+            )
+            engine = snapshot.Snapshot.load()
+            engine.refresh()
+            transaction.commit()
+
+        assert snapshot.check(engine)[0]
+        engine.refresh()
+        assert snapshot.check(engine) == ([], [])
+
+    def test_check_reports_differences(self):
+        subject, dataset = factories.Dataset(), factories.Dataset()
+        engine = snapshot.Snapshot.load()
+
+        created = Relationship.create_bulk(
+            [
+                {
+                    "subject_id": subject["id"],
+                    "object_id": dataset["id"],
+                    "relation_type": "related_to",
+                },
+            ],
+        )
+        model.Session.commit()
+
+        missing, unexpected = snapshot.check(engine)
+        assert sorted(missing) == sorted(rel.id for rel in created)
+        assert unexpected == []
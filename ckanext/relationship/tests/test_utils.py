@@ -1,7 +1,13 @@
+import re
+
 import pytest
 
+from ckan import authz, model
+from ckan.logic.auth import update as update_auth
 from ckan.tests import factories
+from ckan.tests.helpers import call_action
 
+from ckanext.relationship import utils
 from ckanext.relationship.utils import entity_name_by_id
 
 
@@ -21,3 +27,147 @@ class TestEntityNameById:
 
     def test_entity_name_by_id_when_no_entity_exists(self):
         assert entity_name_by_id("nonexistent") is None
+
+
+@pytest.mark.usefixtures("with_plugins")
+class TestRelationFields:
+    def test_fields_are_indexed(self):
+        fields = utils.get_relation_fields("package-with-relationship")
+
+        assert {key: field["field_name"] for key, field in fields.items()} == {
+            ("package", "package-with-relationship", "related_to"): "related_packages",
+            ("group", "group", "child_of"): "parent_groups",
+        }
+
+    def test_unknown_type(self):
+        assert utils.get_relation_fields("not-a-type") == {}
+        assert utils.get_relation_field("not-a-type", "package", "dataset", "x") == {}
+
+    def test_index_is_reused(self):
+        fields = utils.get_relation_fields("package-with-relationship")
+
+        assert utils.get_relation_fields("package-with-relationship") is fields
+
+    def test_index_is_rebuilt_when_schema_changes(self, monkeypatch):
+        fields = utils.get_relation_fields("package-with-relationship")
+        schema = dict(
+            utils.sch.scheming_get_schema("dataset", "package-with-relationship"),
+            dataset_fields=[],
+        )
+        monkeypatch.setattr(
+            utils.sch, "scheming_get_schema", lambda entity, pkg_type: schema
+        )
+
+        assert utils.get_relation_fields("package-with-relationship") == {}
+        assert fields
+
+
+class TestBulkUpdateCheckSupported:
+    @pytest.mark.parametrize(
+        ("entity", "auth_function"),
+        [
+            ("package", update_auth.package_update),
+            ("organization", update_auth.organization_update),
+            ("group", update_auth.group_update),
+        ],
+    )
+    def test_core_auth_functions(self, entity, auth_function):
+        assert utils._auth_function(f"{entity}_update") is auth_function
+        assert utils.bulk_update_check_supported(entity)
+
+    def test_overridden_auth_function(self, monkeypatch):
+        def package_update(context, data_dict):
+            return {"success": True}
+
+        assert "package_update" in authz.auth_functions_list()
+        monkeypatch.setitem(
+            authz._AuthFunctions._functions, "package_update", package_update
+        )
+
+        assert utils._auth_function("package_update") is package_update
+        assert not utils.bulk_update_check_supported("package")
+
+
+def _per_item(entity: str, user, ids):
+    return {
+        entity_id
+        for entity_id in ids
+        if authz.is_authorized_boolean(
+            f"{entity}_update", {"model": model, "user": user}, {"id": entity_id}
+        )
+    }
+
+
+@pytest.mark.usefixtures("clean_db")
+@pytest.mark.ckan_config("ckan.auth.allow_dataset_collaborators", True)
+class TestUpdatableIds:
+    def test_packages_match_per_item_checks(self):
+        editor = factories.User()
+        member = factories.User()
+        collaborator = factories.User()
+        sysadmin = factories.Sysadmin()
+
+        org = factories.Organization(
+            users=[
+                {"name": editor["name"], "capacity": "editor"},
+                {"name": member["name"], "capacity": "member"},
+            ]
+        )
+        own = factories.Dataset(owner_org=org["id"])
+        other = factories.Dataset(owner_org=factories.Organization()["id"])
+        shared = factories.Dataset(owner_org=factories.Organization()["id"])
+        call_action(
+            "package_collaborator_create",
+            id=shared["id"],
+            user_id=collaborator["id"],
+            capacity="editor",
+        )
+        ids = [own["id"], other["id"], shared["id"]]
+
+        for user in (editor, member, collaborator, sysadmin):
+            assert utils.updatable_ids("package", user["name"], ids) == _per_item(
+                "package", user["name"], ids
+            ), user["name"]
+
+        assert utils.updatable_ids("package", editor["name"], ids) == {own["id"]}
+        assert utils.updatable_ids("package", collaborator["name"], ids) == {
+            shared["id"]
+        }
+        assert utils.updatable_ids("package", "", ids) == _per_item("package", "", ids)
+
+    @pytest.mark.parametrize(
+        ("entity", "factory"),
+        [("organization", factories.Organization), ("group", factories.Group)],
+    )
+    def test_groups_match_per_item_checks(self, entity, factory):
+        admin = factories.User()
+        editor = factories.User()
+        own = factory(
+            users=[
+                {"name": admin["name"], "capacity": "admin"},
+                {"name": editor["name"], "capacity": "editor"},
+            ]
+        )
+        other = factory()
+        ids = [own["id"], other["id"]]
+
+        for user in (admin, editor):
+            assert utils.updatable_ids(entity, user["name"], ids) == _per_item(
+                entity, user["name"], ids
+            )
+        assert utils.updatable_ids(entity, admin["name"], ids) == {own["id"]}
+
+    def test_single_query(self, sql_statements):
+        user = factories.User()
+        org = factories.Organization(
+            users=[{"name": user["name"], "capacity": "editor"}]
+        )
+        ids = [factories.Dataset(owner_org=org["id"])["id"] for _ in range(5)]
+
+        sql_statements.clear()
+        assert utils.updatable_ids("package", user["name"], ids) == set(ids)
+
+        package_queries = [
+            stmt for stmt in sql_statements if re.search(r"FROM package\b(?!_)", stmt)
+        ]
+        assert len(package_queries) == 1, package_queries
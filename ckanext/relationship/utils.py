@@ -1,32 +1,69 @@
 from __future__ import annotations
 
-from typing import Any, cast
-import ckan.plugins.toolkit as tk
-from ckan.logic import NotFound
+from typing import Any, Iterable, NamedTuple, Tuple, cast
+
+import sqlalchemy as sa
+
+from ckan import authz, model
+from ckan.lib.search.query import solr_literal
+from ckan.logic.auth import update as update_auth
+from ckan.types import Context
 
 import ckanext.scheming.helpers as sch
 
+from ckanext.relationship.model.relationship import entity_names_by_ids
 
-def get_relations_info(pkg_type: str) -> list[tuple[str, str, str]]:
-    """Return information about relation (related_entity, related_entity_type,
-    relation_type) of specified package type (pkg_type) from schema.
+RelationKey = Tuple[str, str, str]
 
-    Returns:
-        List of tuples of related entities: entity, entity_type, relation_type.
+# dataset type -> (schema the index was built from, relation fields by key)
+_relation_fields: dict[
+    str, tuple[dict[str, Any], dict[RelationKey, dict[str, Any]]]
+] = {}
+
+
+def get_relation_fields(pkg_type: str) -> dict[RelationKey, dict[str, Any]]:
+    """Return relation fields of specified package type (pkg_type) indexed by
+    (related_entity, related_entity_type, relation_type).
+
+    The index is built once per package type and rebuilt when ckanext-scheming
+    reloads the schema.
     """
     schema = cast("dict[str, Any] | None", sch.scheming_get_schema("dataset", pkg_type))
     if not schema:
-        return []
+        return {}
 
-    return [
-        (
+    cached = _relation_fields.get(pkg_type)
+    if cached and cached[0] is schema:
+        return cached[1]
+
+    fields: dict[RelationKey, dict[str, Any]] = {}
+    for field in schema["dataset_fields"]:
+        if "relationship_related_entity" not in field.get("validators", ""):
+            continue
+        key = (
             field["related_entity"],
             field["related_entity_type"],
             field["relation_type"],
         )
-        for field in schema["dataset_fields"]
-        if "relationship_related_entity" in field.get("validators", "")
-    ]
+        fields.setdefault(key, field)
+
+    _relation_fields[pkg_type] = (schema, fields)
+    return fields
+
+
+def clear_relation_fields():
+    """Drop indexed relation fields of all package types."""
+    _relation_fields.clear()
+
+
+def get_relations_info(pkg_type: str) -> list[RelationKey]:
+    """Return information about relation (related_entity, related_entity_type,
+    relation_type) of specified package type (pkg_type) from schema.
+
+    Returns:
+        List of tuples of related entities: entity, entity_type, relation_type.
+    """
+    return list(get_relation_fields(pkg_type))
 
 
 def get_relation_field(
@@ -34,35 +71,215 @@ def get_relation_field(
     object_entity: str,
     object_entity_type: str,
     relation_type: str,
-) -> dict[str, str]:
+) -> dict[str, Any]:
     """Return field dict for specified package type (pkg_type) describes relation
     with specified entity (object_entity, object_entity_type) and type of relation
     (relation_type).
     """
-    schema = cast("dict[str, Any] | None", sch.scheming_get_schema("dataset", pkg_type))
-    if not schema:
-        return {}
-    for field in schema["dataset_fields"]:
-        if (
-            field.get("related_entity") == object_entity
-            and field.get("related_entity_type") == object_entity_type
-            and field.get("relation_type") == relation_type
-        ):
-            return field
-    return {}
+    return get_relation_fields(pkg_type).get(
+        (object_entity, object_entity_type, relation_type), {}
+    )
 
 
 def entity_name_by_id(entity_id: str) -> str | None:
     """Retrieves the name of an entity given its ID.
     The entity can be a package, organization, or group.
+
+    Only the name column is read from the database, and results are memoized
+    until the end of the current transaction.
+    """
+    return entity_names_by_ids([entity_id]).get(entity_id)
+
+
+class UpdatableScope(NamedTuple):
+    """Entities that the user can update, computed once for many candidates.
+
+    Attributes:
+        groups: IDs of organizations and groups the user can update.
+        owner_orgs: IDs of organizations whose datasets the user can update.
+        collaborations: IDs of datasets the user can update as a collaborator.
+        unowned: whether the user can update datasets without organization.
+    """
+
+    groups: set[str]
+    owner_orgs: set[str]
+    collaborations: set[str]
+    unowned: bool
+
+
+def bulk_update_check_supported(entity: str) -> bool:
+    """Check whether update permission for the entity can be computed in bulk.
+
+    Bulk checks reproduce the core auth functions. If a plugin overrides
+    `<entity>_update` auth function, candidates must be checked one by one.
     """
-    actions = ["package_show", "organization_show", "group_show"]
-
-    for action in actions:
-        try:
-            entity = tk.get_action(action)({"ignore_auth": True}, {"id": entity_id})
-            if entity:
-                return entity.get("name")
-        except NotFound:
-            pass
-    return None
+    core = {
+        "package": update_auth.package_update,
+        "organization": update_auth.organization_update,
+        "group": update_auth.group_update,
+    }
+    return _auth_function(f"{entity}_update") is core.get(entity)
+
+
+def _auth_function(name: str) -> Any:
+    """Return the auth function registered under the name.
+
+    CKAN has no public lookup for registered auth functions, only
+    `authz.auth_functions_list` with their names, so the private registry is
+    read here. Tests cover it in case CKAN internals change.
+    """
+    return authz._AuthFunctions.get(name)  # pyright: ignore[reportPrivateUsage]
+
+
+def updatable_scope(user: str | None) -> UpdatableScope | None:
+    """Return entities the user can update, or None if the user is sysadmin.
+
+    Reproduces package_update, organization_update and group_update auth
+    functions of CKAN using a few queries instead of checking every entity.
+    """
+    if authz.is_sysadmin(user):
+        return None
+
+    user_obj = model.User.get(user) if user else None
+    user_id = user_obj.id if user_obj else None
+
+    if user_id:
+        unowned = all(
+            authz.check_config_permission(p)
+            for p in ("create_dataset_if_not_in_organization", "create_unowned_dataset")
+        ) or authz.has_user_permission_for_some_org(user, "create_dataset")
+    else:
+        unowned = all(
+            authz.check_config_permission(p)
+            for p in (
+                "anon_create_dataset",
+                "create_dataset_if_not_in_organization",
+                "create_unowned_dataset",
+            )
+        )
+
+    collaborations: set[str] = set()
+    if user_id and authz.check_config_permission("allow_dataset_collaborators"):
+        collaborations = {
+            package_id
+            for (package_id,) in model.Session.query(
+                model.PackageMember.package_id,
+            ).filter(
+                model.PackageMember.user_id == user_id,
+                model.PackageMember.capacity.in_(["admin", "editor"]),
+            )
+        }
+
+    return UpdatableScope(
+        groups=_group_ids_with_permission(user_id, "update"),
+        owner_orgs=_group_ids_with_permission(user_id, "update_dataset"),
+        collaborations=collaborations,
+        unowned=unowned,
+    )
+
+
+def _group_ids_with_permission(user_id: str | None, permission: str) -> set[str]:
+    """Return IDs of groups and organizations where the user has permission,
+    including sub-groups of groups where the role cascades to them.
+    """
+    roles = authz.get_roles_with_permission(permission)
+    if not user_id or not roles:
+        return set()
+
+    cascading = cast(
+        "list[str]",
+        authz.check_config_permission("roles_that_cascade_to_sub_groups"),
+    )
+
+    group_ids: set[str] = set()
+    q = (
+        model.Session.query(model.Member.capacity, model.Group)
+        .join(model.Group, model.Member.group_id == model.Group.id)
+        .filter(
+            model.Member.table_name == "user",
+            model.Member.table_id == user_id,
+            model.Member.state == "active",
+            model.Member.capacity.in_(roles),
+        )
+    )
+    for capacity, group in q:
+        group_ids.add(group.id)
+        if capacity in cascading:
+            group_ids.update(
+                child[0]
+                for child in group.get_children_group_hierarchy(
+                    type=group.type,
+                )
+            )
+
+    return group_ids
+
+
+def updatable_condition(entity: str, scope: UpdatableScope) -> Any:
+    """Return SQL condition matching entities that can be updated."""
+    if entity != "package":
+        return model.Group.id.in_(scope.groups)
+
+    conditions = [
+        model.Package.owner_org.in_(scope.owner_orgs),
+        model.Package.id.in_(scope.collaborations),
+    ]
+    if scope.unowned:
+        conditions.append(
+            sa.or_(model.Package.owner_org.is_(None), model.Package.owner_org == ""),
+        )
+    return sa.or_(*conditions)
+
+
+def updatable_fq(scope: UpdatableScope) -> str | None:
+    """Return Solr filter query matching datasets that can be updated, or None
+    if none of them can be updated.
+    """
+    clauses: list[str] = []
+    if scope.owner_orgs:
+        clauses.append(
+            "owner_org:({})".format(" OR ".join(map(solr_literal, scope.owner_orgs))),
+        )
+    if scope.collaborations:
+        clauses.append(
+            "id:({})".format(" OR ".join(map(solr_literal, scope.collaborations))),
+        )
+    if scope.unowned:
+        clauses.append("(*:* -owner_org:[* TO *])")
+
+    if not clauses:
+        return None
+    return "+({})".format(" OR ".join(clauses))
+
+
+def updatable_ids(entity: str, user: str | None, ids: Iterable[str]) -> set[str]:
+    """Return IDs of entities (package, organization or group) that the user
+    can update, checking all of them with a single query.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+
+    if not bulk_update_check_supported(entity):
+        return {
+            entity_id
+            for entity_id in ids
+            if authz.is_authorized_boolean(
+                f"{entity}_update",
+                cast(Context, {"model": model, "session": model.Session, "user": user}),
+                {"id": entity_id},
+            )
+        }
+
+    scope = updatable_scope(user)
+    if scope is None:
+        return set(ids)
+
+    entity_class = model.Package if entity == "package" else model.Group
+    return {
+        entity_id
+        for (entity_id,) in model.Session.query(entity_class.id).filter(
+            entity_class.id.in_(ids),
+            updatable_condition(entity, scope),
+        )
+    }
@@ -1,7 +1,17 @@
-from flask import Blueprint
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Iterator
+
+from flask import Blueprint, Response, jsonify, make_response, stream_with_context
 
 import ckan.plugins.toolkit as tk
 
+from ckanext.relationship import cache, config
+from ckanext.relationship.logic import schema
+from ckanext.relationship.model.relationship import Relationship, iter_relations
+
 
 def get_blueprints():
     return [
@@ -15,17 +25,82 @@ relationships = Blueprint("relationships", __name__)
 @relationships.route("/api/2/util/relationships/autocomplete")
 def relationships_autocomplete():
     request_args = tk.request.args
-    return tk.get_action("relationship_autocomplete")(
+    data_dict = {
+        "incomplete": request_args.get("incomplete"),
+        "current_entity_id": request_args.get("current_entity_id"),
+        "entity_type": request_args.get("entity_type", "dataset"),
+        "updatable_only": tk.asbool(request_args.get("updatable_only")),
+        "owned_only": tk.asbool(request_args.get("owned_only")),
+        "check_sysadmin": tk.asbool(request_args.get("check_sysadmin")),
+        "format_autocomplete_helper": request_args.get(
+            "format_autocomplete_helper",
+        ),
+        "limit": request_args.get("limit", 100),
+        "offset": request_args.get("offset", 0),
+    }
+
+    ttl = config.autocomplete_cache_ttl()
+    # results depend on permissions, so every user gets own entries
+    key = cache.variant_key("autocomplete", tk.current_user.name, data_dict)
+    store = cache.autocomplete_backend(ttl) if ttl > 0 else None
+
+    body = store.get_many([key], "autocomplete").get(key) if store else None
+    if body is None:
+        try:
+            result = tk.get_action("relationship_autocomplete")({}, data_dict)
+        except tk.ValidationError as e:
+            return jsonify({"error": e.error_dict}), 400
+
+        body = result.get_data(as_text=True)
+        if store:
+            store.set_many({key: body}, "autocomplete")
+
+    response = make_response(body)
+    response.mimetype = "application/json"
+    response.set_etag(hashlib.sha256(body.encode()).hexdigest())
+    response.cache_control.private = True
+    if ttl > 0:
+        response.cache_control.max_age = ttl
+    else:
+        response.cache_control.no_cache = True
+
+    return response.make_conditional(tk.request)
+
+
+@relationships.route("/api/2/util/relationships/export")
+def relationships_export():
+    """Stream all relations of the subject as JSON lines.
+
+    Accepts the same filters and `order_by` as relationship_relations_list.
+    Relations are read in batches, so the export of a subject with many
+    relations neither loads them into memory nor builds ORM entities.
+    """
+    data_dict, errors = tk.navl_validate(
+        dict(tk.request.args),
+        schema.relations_list(),
         {},
-        {
-            "incomplete": request_args.get("incomplete"),
-            "current_entity_id": request_args.get("current_entity_id"),
-            "entity_type": request_args.get("entity_type", "dataset"),
-            "updatable_only": tk.asbool(request_args.get("updatable_only")),
-            "owned_only": tk.asbool(request_args.get("owned_only")),
-            "check_sysadmin": tk.asbool(request_args.get("check_sysadmin")),
-            "format_autocomplete_helper": request_args.get(
-                "format_autocomplete_helper",
-            ),
-        },
+    )
+    if errors:
+        return jsonify({"error": errors}), 400
+
+    try:
+        tk.check_access("relationship_relations_list", {}, data_dict)
+    except tk.NotAuthorized:
+        return jsonify({"error": tk._("Not authorized")}), 403
+
+    object_entity = data_dict.get("object_entity")
+    stmt = Relationship.subject_select(
+        data_dict["subject_id"],
+        "group" if object_entity == "organization" else object_entity,
+        data_dict.get("object_type"),
+        data_dict.get("relation_type"),
+    )
+
+    def lines(relations: Iterator[dict[str, Any]]) -> Iterator[str]:
+        for relation in relations:
+            yield json.dumps(relation) + "\n"
+
+    return Response(
+        stream_with_context(lines(iter_relations(stmt, data_dict["order_by"]))),
+        mimetype="application/x-ndjson",
     )